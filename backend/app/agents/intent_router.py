@@ -0,0 +1,152 @@
+import logging
+import os
+import re
+from collections import Counter, deque
+from typing import Any, Dict, NamedTuple, Optional
+
+from app.models.task import TaskPriority, TaskStatus
+from app.services.date_resolver import find_date_phrase, resolve_range
+
+logger = logging.getLogger(__name__)
+
+# Decisions at or above this confidence skip the LLM
+INTENT_ROUTER_THRESHOLD = float(os.getenv("INTENT_ROUTER_THRESHOLD", "0.85"))
+
+_PRIORITY_WORDS = "|".join(priority.value for priority in TaskPriority)
+_STATUS_WORDS = {"pending": "pending", "open": "pending", "in progress": "in_progress",
+                 "completed": "completed", "done": "completed", "finished": "completed"}
+
+_LIST = re.compile(r"^(?:show|list|display|view|get|see|what are)(?: me)?(?: all)?(?: of)?(?: my| the)? tasks?$|^(?:my )?tasks$", re.IGNORECASE)
+_FILTER_PRIORITY = re.compile(rf"^(?:show|list|display|get|find|what are)?(?: me)?(?: all)?(?: my| the)? ?(?P<priority>{_PRIORITY_WORDS})(?: priority)? tasks?$", re.IGNORECASE)
+_FILTER_STATUS = re.compile(r"^(?:show|list|display|get|find|what are)?(?: me)?(?: all)?(?: my| the)? ?(?P<status>" + "|".join(_STATUS_WORDS) + r") tasks?$", re.IGNORECASE)
+_FILTER_DUE = re.compile(r"^(?:show|list|display|get|find|what)?(?: me)?(?: all)?(?: my| the)? ?tasks? (?:are )?due (?P<due>.+)$", re.IGNORECASE)
+_DELETE_ID = re.compile(r"^(?:delete|remove) (?:task )?#?(?P<id>\d+)$", re.IGNORECASE)
+_DELETE_TITLE = re.compile(r"^(?:delete|remove) (?:the )?(?P<title>.+?)(?: task)?$", re.IGNORECASE)
+_COMPLETE_ID = re.compile(r"^(?:mark|complete|finish|close) (?:task )?#?(?P<id>\d+)(?: as (?:done|complete|completed))?$", re.IGNORECASE)
+_COMPLETE_TITLE = re.compile(r"^mark (?:the )?(?P<title>.+?)(?: task)? as (?:done|complete|completed)$", re.IGNORECASE)
+_SEARCH = re.compile(r"^(?:what|which|find|search|show)(?: me)?(?: all)?(?: my| the)? tasks? (?:are |is )?(?:about|related to|regarding|mentioning|for) (?:the )?(?P<query>.+?)\??$", re.IGNORECASE)
+_NEXT = re.compile(r"^(?:what|which tasks?) should i (?:do|work on|tackle|focus on|start(?: with)?)(?: next| first| now| today)?\??$|^what(?:'s| is)? next\??$|^(?:show|list|get|what are)(?: me)?(?: my)? (?:next|top) tasks?\??$", re.IGNORECASE)
+_CREATE = re.compile(r"^(?:add|create|new)(?: a)?(?: new)? task(?: to| called| named|:)? (?P<title>.+)$", re.IGNORECASE)
+
+_PRIORITY_HINT = re.compile(r"\b(?:urgent|asap|important|high|low) ?(?:priority)?\b", re.IGNORECASE)
+# Signs the message carries more than one instruction or needs reasoning
+_COMPOUND = re.compile(r"\band\b|\bthen\b|;|\?|\bif\b|\bwhich\b", re.IGNORECASE)
+
+
+class RouteDecision(NamedTuple):
+    intent: str
+    confidence: float
+    tool: Optional[str] = None
+    args: Dict[str, Any] = {}
+
+
+def _normalize(text: str) -> str:
+    return " ".join(text.strip().rstrip(".!").split())
+
+
+class IntentRouter:
+    """Rule-based intent classifier placed in front of the LLM agent.
+
+    Unambiguous commands are scored with high confidence and mapped straight to
+    a task tool call; anything below the threshold goes to the model. Every
+    decision is recorded so the threshold can be tuned from /api/chat/metrics.
+    """
+
+    def __init__(self, threshold: float = INTENT_ROUTER_THRESHOLD, history: int = 500):
+        self.threshold = threshold
+        self.routed: Counter = Counter()
+        self.intents: Counter = Counter()
+        self._latency_ms = {"local": 0.0, "llm": 0.0}
+        self._recent: deque = deque(maxlen=history)
+
+    def classify(self, user_input: str) -> RouteDecision:
+        text = _normalize(user_input)
+        compound = bool(_COMPOUND.search(text))
+
+        if _LIST.match(text):
+            return RouteDecision("list_tasks", 0.97, "list_tasks", {})
+
+        match = _FILTER_PRIORITY.match(text)
+        if match:
+            return RouteDecision("filter_tasks", 0.95, "filter_tasks", {"priority": match.group("priority").lower()})
+
+        match = _FILTER_STATUS.match(text)
+        if match:
+            return RouteDecision("filter_tasks", 0.93, "filter_tasks", {"status": _STATUS_WORDS[match.group("status").lower()]})
+
+        match = _FILTER_DUE.match(text)
+        if match and resolve_range(match.group("due")):
+            return RouteDecision("filter_tasks", 0.9, "filter_tasks", {"due": match.group("due")})
+
+        if _NEXT.match(text):
+            return RouteDecision("next_tasks", 0.93, "next_tasks", {})
+
+        match = _SEARCH.match(text)
+        if match:
+            return RouteDecision("search_tasks", 0.9, "search_tasks", {"query": match.group("query")})
+
+        match = _DELETE_ID.match(text)
+        if match:
+            return RouteDecision("delete_task", 0.97, "delete_task", {"identifier": match.group("id")})
+
+        match = _COMPLETE_ID.match(text)
+        if match:
+            args = {"identifier": match.group("id"), "status": TaskStatus.COMPLETED.value}
+            return RouteDecision("complete_task", 0.96, "update_task", args)
+
+        match = _COMPLETE_TITLE.match(text)
+        if match:
+            args = {"identifier": match.group("title"), "status": TaskStatus.COMPLETED.value}
+            return RouteDecision("complete_task", 0.7 if compound else 0.88, "update_task", args)
+
+        match = _CREATE.match(text)
+        if match:
+            title = match.group("title")
+            # Dates and priorities inside free text are left for the model to pull out
+            needs_model = compound or find_date_phrase(title) or _PRIORITY_HINT.search(title)
+            return RouteDecision("create_task", 0.6 if needs_model else 0.88, "create_task", {"title": title})
+
+        match = _DELETE_TITLE.match(text)
+        if match:
+            # Titles are matched exactly, so a free-text delete is only a guess
+            return RouteDecision("delete_task", 0.6 if compound else 0.8, "delete_task", {"identifier": match.group("title")})
+
+        return RouteDecision("unknown", 0.0)
+
+    def is_confident(self, decision: RouteDecision) -> bool:
+        return decision.tool is not None and decision.confidence >= self.threshold
+
+    def record(self, decision: RouteDecision, route: str, latency_ms: float) -> None:
+        """Record where a message went and how long it took"""
+        self.routed[route] += 1
+        self.intents[decision.intent] += 1
+        # Moving average per route, used to estimate the time saved
+        previous = self._latency_ms[route]
+        self._latency_ms[route] = latency_ms if not previous else 0.9 * previous + 0.1 * latency_ms
+        self._recent.append({
+            "intent": decision.intent,
+            "confidence": decision.confidence,
+            "route": route,
+            "latency_ms": round(latency_ms, 1),
+        })
+        logger.info(f"Intent route={route} intent={decision.intent} confidence={decision.confidence:.2f} latency_ms={latency_ms:.1f}")
+
+    def metrics(self) -> Dict[str, Any]:
+        local_ms, llm_ms = self._latency_ms["local"], self._latency_ms["llm"]
+        saved = self.routed["local"] * (llm_ms - local_ms) if llm_ms else None
+        # Confidence histogram of recent decisions, per route, in 0.1 buckets
+        histogram: Counter = Counter()
+        for entry in self._recent:
+            histogram[f"{entry['route']}:{int(entry['confidence'] * 10) / 10:.1f}"] += 1
+        return {
+            "threshold": self.threshold,
+            "routed": dict(self.routed),
+            "intents": dict(self.intents),
+            "avg_latency_ms": {"local": round(local_ms, 1), "llm": round(llm_ms, 1)},
+            "estimated_saved_ms": round(saved, 1) if saved is not None else None,
+            "confidence_histogram": dict(sorted(histogram.items())),
+        }
+
+
+# Global router instance
+intent_router = IntentRouter()
@@ -0,0 +1,248 @@
+import asyncio
+import logging
+import os
+import random
+import time
+from collections import Counter, deque
+from typing import Any, Dict, Optional
+
+from app.services.telemetry import span
+
+logger = logging.getLogger(__name__)
+
+# Total time a single model call may take, hedges and retries included
+LLM_DEADLINE_SECONDS = float(os.getenv("LLM_DEADLINE_SECONDS", "20"))
+# A second, parallel attempt starts once the first is slower than this percentile
+LLM_HEDGE_PERCENTILE = float(os.getenv("LLM_HEDGE_PERCENTILE", "95"))
+# At most this share of calls may be hedged, so a slow provider isn't sent double load
+LLM_HEDGE_BUDGET = float(os.getenv("LLM_HEDGE_BUDGET", "0.1"))
+LLM_MAX_ATTEMPTS = int(os.getenv("LLM_MAX_ATTEMPTS", "3"))
+LLM_BACKOFF_BASE_SECONDS = float(os.getenv("LLM_BACKOFF_BASE_SECONDS", "0.5"))
+LLM_BACKOFF_MAX_SECONDS = float(os.getenv("LLM_BACKOFF_MAX_SECONDS", "4"))
+# Consecutive failed calls that open the breaker, and how long it stays open
+LLM_BREAKER_FAILURES = int(os.getenv("LLM_BREAKER_FAILURES", "5"))
+LLM_BREAKER_COOLDOWN_SECONDS = float(os.getenv("LLM_BREAKER_COOLDOWN_SECONDS", "30"))
+
+# Latency samples needed before hedging kicks in
+MIN_HEDGE_SAMPLES = 20
+
+_RETRYABLE_NAMES = {
+    "ResourceExhausted", "ServiceUnavailable", "DeadlineExceeded", "InternalServerError",
+    "TooManyRequests", "GatewayTimeout", "BadGateway", "ServerError",
+}
+_RETRYABLE_CODES = {408, 429, 500, 502, 503, 504}
+_RETRYABLE_HINTS = ("429", "500", "503", "504", "unavailable", "overloaded", "rate limit", "resource exhausted", "deadline")
+
+
+class LLMUnavailable(Exception):
+    """The model could not answer in time; callers fall back to the rule-based path"""
+
+    def __init__(self, reason: str):
+        super().__init__(reason)
+        self.reason = reason
+
+
+def is_retryable(error: BaseException) -> bool:
+    """Timeouts, rate limits and 5xx responses, by type, status code or message"""
+    if isinstance(error, (asyncio.TimeoutError, TimeoutError, ConnectionError)):
+        return True
+    if any(cls.__name__ in _RETRYABLE_NAMES for cls in type(error).__mro__):
+        return True
+    for attr in ("code", "status_code", "status"):
+        code = getattr(error, attr, None)
+        code = code() if callable(code) else code
+        if isinstance(code, int) and code in _RETRYABLE_CODES:
+            return True
+    message = str(error).lower()
+    return any(hint in message for hint in _RETRYABLE_HINTS)
+
+
+class CircuitBreaker:
+    """Closed -> open after `failures` consecutive failed calls; after `cooldown`
+    seconds one probe call is let through (half-open) and its outcome decides
+    whether the breaker closes again."""
+
+    def __init__(self, failures: int = LLM_BREAKER_FAILURES, cooldown: float = LLM_BREAKER_COOLDOWN_SECONDS):
+        self.failures = failures
+        self.cooldown = cooldown
+        self.state = "closed"
+        self.consecutive_failures = 0
+        self.opened = 0
+        self._opened_at = 0.0
+        self._probing = False
+
+    def allow(self) -> bool:
+        if self.state == "closed":
+            return True
+        if self.state == "open" and time.monotonic() - self._opened_at >= self.cooldown:
+            self.state = "half_open"
+        if self.state == "half_open" and not self._probing:
+            self._probing = True
+            return True
+        return False
+
+    def record_success(self) -> None:
+        if self.state != "closed":
+            logger.info("LLM circuit breaker closed")
+        self.state = "closed"
+        self.consecutive_failures = 0
+        self._probing = False
+
+    def record_failure(self) -> None:
+        self.consecutive_failures += 1
+        self._probing = False
+        if self.state == "half_open" or self.consecutive_failures >= self.failures:
+            if self.state != "open":
+                self.opened += 1
+                logger.warning(f"LLM circuit breaker open for {self.cooldown:g}s after {self.consecutive_failures} failure(s)")
+            self.state = "open"
+            self._opened_at = time.monotonic()
+
+    def release(self) -> None:
+        """A probe ended without telling us anything (e.g. the caller was cancelled)"""
+        self._probing = False
+
+
+class ResilientLLM:
+    """Wraps model calls with a deadline, hedging, jittered retries and a circuit breaker.
+
+    Each attempt that runs longer than the recent LLM_HEDGE_PERCENTILE latency
+    gets a twin; the first to answer wins and the other is cancelled. Retryable
+    errors are retried with full-jitter backoff inside the call's deadline.
+    When calls keep failing the breaker opens and `ainvoke` raises
+    LLMUnavailable immediately, so the agents answer from their rule-based
+    path instead of waiting on a degraded provider.
+    """
+
+    def __init__(
+        self,
+        deadline: float = LLM_DEADLINE_SECONDS,
+        hedge_percentile: float = LLM_HEDGE_PERCENTILE,
+        hedge_budget: float = LLM_HEDGE_BUDGET,
+        max_attempts: int = LLM_MAX_ATTEMPTS,
+        breaker: Optional[CircuitBreaker] = None,
+        history: int = 500,
+    ):
+        self.deadline = deadline
+        self.hedge_percentile = hedge_percentile
+        self.hedge_budget = hedge_budget
+        self.max_attempts = max(1, max_attempts)
+        self.breaker = breaker or CircuitBreaker()
+        self.counts: Counter = Counter()
+        self._latencies: deque = deque(maxlen=history)
+
+    def _percentile(self, percentile: float) -> Optional[float]:
+        if not self._latencies:
+            return None
+        ordered = sorted(self._latencies)
+        return ordered[min(len(ordered) - 1, int(len(ordered) * percentile / 100))]
+
+    def _hedge_delay(self) -> Optional[float]:
+        if len(self._latencies) < MIN_HEDGE_SAMPLES:
+            return None
+        if self.counts["hedged"] >= self.hedge_budget * self.counts["calls"]:
+            return None
+        return self._percentile(self.hedge_percentile)
+
+    async def _attempt(self, runnable: Any, payload: Any) -> Any:
+        with span("llm.attempt"):
+            started = time.monotonic()
+            result = await runnable.ainvoke(payload)
+            self._latencies.append(time.monotonic() - started)
+            return result
+
+    async def _hedged(self, runnable: Any, payload: Any) -> Any:
+        """One attempt, plus a second one if the first outlives the hedge delay"""
+        first = asyncio.ensure_future(self._attempt(runnable, payload))
+        pending = {first}
+        try:
+            hedge_delay = self._hedge_delay()
+            if hedge_delay is not None:
+                done, _ = await asyncio.wait(pending, timeout=hedge_delay)
+                if not done:
+                    self.counts["hedged"] += 1
+                    pending.add(asyncio.ensure_future(self._attempt(runnable, payload)))
+
+            error: Optional[BaseException] = None
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        if task is not first:
+                            self.counts["hedge_wins"] += 1
+                        return task.result()
+                    error = task.exception()
+            raise error
+        finally:
+            for task in pending:
+                task.cancel()
+
+    async def _call(self, runnable: Any, payload: Any) -> Any:
+        for attempt in range(self.max_attempts):
+            try:
+                return await self._hedged(runnable, payload)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                if not is_retryable(e) or attempt + 1 == self.max_attempts:
+                    raise
+                self.counts["retries"] += 1
+                backoff = min(LLM_BACKOFF_MAX_SECONDS, LLM_BACKOFF_BASE_SECONDS * 2 ** attempt)
+                logger.warning(f"LLM attempt {attempt + 1} failed ({e}); retrying")
+                await asyncio.sleep(random.uniform(0, backoff))
+
+    async def ainvoke(self, runnable: Any, payload: Any) -> Any:
+        """`runnable.ainvoke(payload)` within the deadline; raises LLMUnavailable
+        when the breaker is open or the call times out or keeps failing"""
+        if not self.breaker.allow():
+            self.counts["rejected"] += 1
+            raise LLMUnavailable("circuit open")
+        self.counts["calls"] += 1
+        try:
+            with span("llm", breaker=self.breaker.state):
+                result = await asyncio.wait_for(self._call(runnable, payload), self.deadline)
+        except asyncio.TimeoutError:
+            self.counts["timeouts"] += 1
+            self.breaker.record_failure()
+            raise LLMUnavailable(f"no answer within {self.deadline:g}s")
+        except asyncio.CancelledError:
+            self.breaker.release()
+            raise
+        except Exception as e:
+            if not is_retryable(e):
+                # The request itself was bad; the provider is fine
+                self.breaker.release()
+                raise
+            self.counts["failures"] += 1
+            self.breaker.record_failure()
+            raise LLMUnavailable(str(e)) from e
+        self.breaker.record_success()
+        return result
+
+    def record_fallback(self) -> None:
+        """An agent answered from its rule-based path because the model was unavailable"""
+        self.counts["fallbacks"] += 1
+
+    def metrics(self) -> Dict[str, Any]:
+        def ms(percentile: float) -> Optional[float]:
+            value = self._percentile(percentile)
+            return round(value * 1000, 1) if value is not None else None
+
+        return {
+            "breaker": self.breaker.state,
+            "breaker_opened": self.breaker.opened,
+            "consecutive_failures": self.breaker.consecutive_failures,
+            "calls": self.counts["calls"],
+            "hedged": self.counts["hedged"],
+            "hedge_wins": self.counts["hedge_wins"],
+            "retries": self.counts["retries"],
+            "timeouts": self.counts["timeouts"],
+            "failures": self.counts["failures"],
+            "rejected": self.counts["rejected"],
+            "fallbacks": self.counts["fallbacks"],
+            "latency_ms": {"p50": ms(50), "p95": ms(95), "p99": ms(99)},
+        }
+
+
+# Shared by both agents: they call the same provider, so they share its health
+llm_guard = ResilientLLM()
@@ -1,3 +1,4 @@
+import logging
 import os
 import re
 import uuid
@@ -7,7 +8,13 @@ from app.services.task_service import TaskService
 from app.schemas.task import TaskCreate, TaskUpdate, TaskFilter
 from app.models.task import TaskStatus, TaskPriority
 from app.database.connection import AsyncSessionLocal
-from datetime import datetime, timedelta
+from app.services.date_resolver import find_date_phrase, resolve_date
+from app.services.task_dedup import DuplicateTaskError
+from app.services.task_ranking import task_ranker
+from app.agents.llm_resilience import LLMUnavailable, llm_guard
+from datetime import datetime
+
+logger = logging.getLogger(__name__)
 
 
 class SimpleTaskAgent:
@@ -15,7 +22,9 @@ class SimpleTaskAgent:
         self.llm = ChatGoogleGenerativeAI(
             model="gemini-1.5-flash",
             api_key=os.getenv("GOOGLE_API_KEY"),
-            temperature=0.1
+            temperature=0.1,
+            # Retries, hedging and deadlines are handled by llm_guard
+            max_retries=0
         )
 
     async def chat(self, user_input: str, conversation_id: str = None) -> Dict[str, Any]:
@@ -38,7 +47,7 @@ class SimpleTaskAgent:
                     priority = self._extract_priority(user_input)
                     due_date = self._extract_due_date(user_input)
                     
-                    print(f"DEBUG: Extracted title='{title}', description='{description}'")
+                    logger.debug(f"Extracted title='{title}', description='{description}'")
 
                     if title:
                         task_data = TaskCreate(
@@ -47,16 +56,40 @@ class SimpleTaskAgent:
                             priority=priority,
                             due_date=due_date
                         )
-                        task = await task_service.create_task(task_data)
-                        tasks_affected = [task.to_dict()]
-                        action_type = "Create Task"
-                        if description:
-                            response_text = f"Perfect! I've created the task '{title}' with description '{description}' for you. It's now in your task list!"
-                        else:
-                            response_text = f"Perfect! I've created the task '{title}' for you. It's now in your task list!"
+                        try:
+                            task = await task_service.create_task(task_data)
+                        except DuplicateTaskError as e:
+                            task = None
+                            response_text = f"You already have a similar task: '{e.match.title}'. I didn't add another one."
+                        if task is not None:
+                            tasks_affected = [task.to_dict()]
+                            action_type = "Create Task"
+                            if task.duplicate_of == task.id:
+                                action_type = "Update Task"
+                                response_text = f"You already have the task '{task.title}', so I've merged the details into it."
+                            elif task.duplicate_of:
+                                response_text = f"I've created the task '{title}', but it looks a lot like task #{task.duplicate_of}. You may want to delete one of them."
+                            elif description:
+                                response_text = f"Perfect! I've created the task '{title}' with description '{description}' for you. It's now in your task list!"
+                            else:
+                                response_text = f"Perfect! I've created the task '{title}' for you. It's now in your task list!"
                     else:
                         response_text = "I'd be happy to create a task for you! Could you tell me what you'd like to add?"
 
+                # What to do next, ranked without the LLM
+                elif any(keyword in user_lower for keyword in ["do next", "work on next", "what's next", "what next", "next task", "top task", "should i do", "should i work on"]):
+                    ranked = await task_service.get_next_tasks(3)
+                    tasks_affected = [task.to_dict() for task, _ in ranked]
+                    action_type = "Next Tasks"
+                    if not ranked:
+                        response_text = "You have no open tasks. Nice work!"
+                    else:
+                        first = ranked[0][0]
+                        reasons = task_ranker.reasons(first)
+                        response_text = f"Start with '{first.title}'" + (f" ({', '.join(reasons)})." if reasons else ".")
+                        if len(ranked) > 1:
+                            response_text += " After that: " + ", ".join(f"'{task.title}'" for task, _ in ranked[1:]) + "."
+
                 # Task Listing
                 elif any(keyword in user_lower for keyword in ["show tasks", "list tasks", "my tasks", "what tasks"]):
                     tasks = await task_service.get_tasks()
@@ -120,12 +153,18 @@ Respond conversationally and helpfully. Here are some examples of what you can h
 - Listing tasks: "Show me my tasks" 
 - Completing tasks: "Mark the grocery task as done"
 - Filtering tasks: "Show me high priority tasks"
+- Picking what to do next: "What should I do next?"
 - Deleting tasks: "Delete the meeting task"
 
 Keep responses friendly and concise."""
 
-                    response = self.llm.invoke(prompt)
-                    response_text = response.content if hasattr(response, 'content') else "Hello! I'm your task management assistant. Try asking me to create a task!"
+                    try:
+                        response = await llm_guard.ainvoke(self.llm, prompt)
+                        response_text = response.content if hasattr(response, 'content') else "Hello! I'm your task management assistant. Try asking me to create a task!"
+                    except LLMUnavailable:
+                        llm_guard.record_fallback()
+                        response_text = ("Hello! I'm your task management assistant. Try 'Add a task to buy groceries', "
+                                         "'Show me my tasks' or 'Mark the grocery task as done'.")
 
                 return {
                     "response": response_text,
@@ -135,7 +174,7 @@ Keep responses friendly and concise."""
                 }
 
         except Exception as e:
-            print(f"Simple agent error: {str(e)}")
+            logger.exception(f"Simple agent error: {str(e)}")
             return {
                 "response": "I encountered an error. Please try again.",
                 "conversation_id": conversation_id,
@@ -241,23 +280,7 @@ Keep responses friendly and concise."""
 
     def _extract_due_date(self, text: str) -> datetime:
         """Extract due date from user input"""
-        text_lower = text.lower()
-        now = datetime.now()
-        
-        if "today" in text_lower:
-            return now.replace(hour=23, minute=59, second=59, microsecond=0)
-        elif "tomorrow" in text_lower:
-            return (now + timedelta(days=1)).replace(hour=23, minute=59, second=59, microsecond=0)
-        elif "next week" in text_lower:
-            return (now + timedelta(days=7)).replace(hour=23, minute=59, second=59, microsecond=0)
-        elif "friday" in text_lower:
-            # Find next Friday
-            days_ahead = 4 - now.weekday()  # Friday is 4
-            if days_ahead <= 0:
-                days_ahead += 7
-            return (now + timedelta(days=days_ahead)).replace(hour=23, minute=59, second=59, microsecond=0)
-        
-        return None
+        return resolve_date(find_date_phrase(text))
 
     def _extract_task_reference(self, text: str) -> str:
         """Extract task reference for updates/deletions"""
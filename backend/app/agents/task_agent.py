@@ -1,12 +1,25 @@
+import logging
 import os
-from typing import Dict, Any, List
+import time
+from typing import Dict, Any, List, Optional
 from langchain_google_genai import ChatGoogleGenerativeAI
 from langchain_core.messages import HumanMessage, SystemMessage, AIMessage
 import uuid
 import json
 import asyncio
 
-from app.tools.task_tools import create_task, update_task, delete_task, list_tasks, filter_tasks
+from app.tools.task_tools import (
+    create_task, update_task, delete_task, list_tasks, filter_tasks, search_tasks,
+    add_dependency, get_task_tree, ready_tasks, next_tasks
+)
+from app.agents.intent_router import intent_router, RouteDecision
+from app.agents.llm_resilience import LLMUnavailable, llm_guard
+from app.services.telemetry import span
+
+logger = logging.getLogger(__name__)
+
+# Tools that only read; a low-confidence guess at one of these is safe to run
+READ_ONLY_TOOLS = {"list_tasks", "filter_tasks", "search_tasks", "get_task_tree", "ready_tasks", "next_tasks"}
 
 
 class TaskManagementAgent:
@@ -15,11 +28,16 @@ class TaskManagementAgent:
         self.llm = ChatGoogleGenerativeAI(
             model="gemini-1.5-flash",
             api_key=os.getenv("GOOGLE_API_KEY"),
-            temperature=0.1
+            temperature=0.1,
+            # Retries, hedging and deadlines are handled by llm_guard
+            max_retries=0
         )
         
         # Available tools
-        self.tools = [create_task, update_task, delete_task, list_tasks, filter_tasks]
+        self.tools = [
+            create_task, update_task, delete_task, list_tasks, filter_tasks, search_tasks,
+            add_dependency, get_task_tree, ready_tasks, next_tasks
+        ]
         self.llm_with_tools = self.llm.bind_tools(self.tools)
     
     async def chat(self, user_input: str, conversation_id: str = None) -> Dict[str, Any]:
@@ -28,6 +46,13 @@ class TaskManagementAgent:
             conversation_id = str(uuid.uuid4())
         
         try:
+            # Unambiguous commands go straight to the tools
+            with span("intent") as current:
+                decision = intent_router.classify(user_input)
+                current.set(intent=decision.intent, confidence=decision.confidence)
+            if intent_router.is_confident(decision):
+                return await self._run_local(decision, conversation_id)
+
             # System prompt
             system_prompt = """You are a helpful AI assistant for task management. You can help users:
 
@@ -36,6 +61,10 @@ class TaskManagementAgent:
 3. Delete tasks by ID or title
 4. List all tasks
 5. Filter tasks by status, priority, due date, or search terms
+6. Find tasks about a topic, even when the exact words differ
+7. Break tasks into subtasks, record which task blocks which, and say what is ready to work on
+8. Create repeating tasks and change or complete single occurrences of them
+9. Recommend what to do next, ranked by priority, due date and how overdue or old tasks are
 
 IMPORTANT GUIDELINES:
 - ALWAYS be proactive and create tasks immediately when users request them
@@ -43,11 +72,11 @@ IMPORTANT GUIDELINES:
 - Extract the task title from natural language (e.g., "Add a task to buy groceries" → title: "buy groceries")
 - Don't ask for clarification unless absolutely necessary
 - Be conversational and confirm actions after completion
-- For dates, accept various formats and convert to ISO format
+- For dates, pass the user's wording straight to the tools (e.g. due_date="tomorrow at 3pm", due="this week"); the tools resolve relative dates, so don't compute them yourself
 - When listing or filtering tasks, provide a clear summary
 - If a user wants to mark a task as complete, update its status to "completed"
 
-Current date context: Use reasonable defaults for dates when users say "today", "tomorrow", "next week", etc.
+Date phrases like "today", "tomorrow", "next friday", "in 3 days" and "this week" are understood by the tools as-is.
 
 Examples of user intents and IMMEDIATE actions:
 - "Add a task to buy groceries" → IMMEDIATELY call create_task(title="buy groceries", priority="medium")
@@ -55,7 +84,15 @@ Examples of user intents and IMMEDIATE actions:
 - "Mark the groceries task as done" → update_task (status=completed)  
 - "Show me all high priority tasks" → filter_tasks (priority=high)
 - "Delete the meeting task" → delete_task
-- "What tasks are due tomorrow?" → filter_tasks with date range
+- "What tasks are due tomorrow?" → filter_tasks(due="tomorrow")
+- "What tasks are about the quarterly report?" → search_tasks(query="quarterly report")
+- "Add a subtask 'book venue' to the offsite task" → create_task(title="book venue", parent="offsite")
+- "I can't send invites until the venue is booked" → add_dependency(task="send invites", blocked_by="book venue")
+- "Show me the offsite task and its subtasks" → get_task_tree(identifier="offsite")
+- "What can I work on now?" → ready_tasks()
+- "What should I do next?" → next_tasks()
+- "Water the plants every Monday" → create_task(title="water the plants", repeat="every monday")
+- "I watered the plants today" → update_task(identifier="water the plants", occurrence="today", status="completed")
 
 ALWAYS use tools to perform actual task operations. Be proactive and take action immediately."""
 
@@ -66,7 +103,11 @@ ALWAYS use tools to perform actual task operations. Be proactive and take action
             ]
             
             # Get AI response with tools
-            response = self.llm_with_tools.invoke(messages)
+            started = time.perf_counter()
+            try:
+                response = await llm_guard.ainvoke(self.llm_with_tools, messages)
+            except LLMUnavailable as e:
+                return await self._fallback(decision, conversation_id, e)
             
             tasks_affected = []
             action_type = "chat"
@@ -75,61 +116,26 @@ ALWAYS use tools to perform actual task operations. Be proactive and take action
             if hasattr(response, 'tool_calls') and response.tool_calls:
                 for tool_call in response.tool_calls:
                     tool_name = tool_call['name']
-                    tool_args = tool_call['args']
                     action_type = tool_name.replace('_', ' ').title()
-                    
-                    # Find and execute the tool
-                    for tool in self.tools:
-                        if tool.name == tool_name:
-                            try:
-                                # Execute the tool
-                                tool_result = await tool.ainvoke(tool_args)
-                                
-                                # Parse tool result
-                                if isinstance(tool_result, dict):
-                                    if tool_result.get('success') and 'task' in tool_result:
-                                        tasks_affected.append(tool_result['task'])
-                                    elif tool_result.get('success') and 'tasks' in tool_result:
-                                        tasks_affected.extend(tool_result['tasks'])
-                                elif isinstance(tool_result, str):
-                                    try:
-                                        parsed_result = json.loads(tool_result)
-                                        if parsed_result.get('success') and 'task' in parsed_result:
-                                            tasks_affected.append(parsed_result['task'])
-                                        elif parsed_result.get('success') and 'tasks' in parsed_result:
-                                            tasks_affected.extend(parsed_result['tasks'])
-                                    except json.JSONDecodeError:
-                                        pass
-                                        
-                            except Exception as tool_error:
-                                print(f"Tool execution error: {tool_error}")
-                            break
+                    tool_result = await self._execute_tool(tool_name, tool_call['args'])
+                    if tool_result is None:
+                        return self._tool_failed(tool_name, conversation_id)
+                    if tool_result.get('error'):
+                        # Report the failure itself, not the model's text, which may claim success
+                        return self._tool_error(tool_result['error'], conversation_id, tasks_affected)
+                    tasks_affected.extend(self._collect_tasks(tool_result))
                 
                 # Generate final response after tool execution
                 if tasks_affected:
-                    if action_type == "Create Task":
-                        response_text = f"Perfect! I've created the task '{tasks_affected[0].get('title', 'New Task')}' for you. It's now in your task list!"
-                    elif action_type == "List Tasks":
-                        count = len(tasks_affected)
-                        if count == 0:
-                            response_text = "You don't have any tasks yet. Feel free to create some by saying something like 'Add a task to [your task here]'."
-                        else:
-                            response_text = f"Here are your {count} task(s). You can see them in the task list on the right!"
-                    elif action_type == "Update Task":
-                        response_text = f"Great! I've updated the task '{tasks_affected[0].get('title', 'Task')}' for you."
-                    elif action_type == "Delete Task":
-                        response_text = "Task deleted successfully! It's been removed from your list."
-                    elif action_type == "Filter Tasks":
-                        count = len(tasks_affected)
-                        response_text = f"Found {count} task(s) matching your criteria. Check the task list to see them!"
-                    else:
-                        response_text = response.content if hasattr(response, 'content') else "Task operation completed successfully!"
+                    fallback = response.content if hasattr(response, 'content') else "Task operation completed successfully!"
+                    response_text = self._summarize(action_type, tasks_affected, fallback)
                 else:
                     response_text = response.content if hasattr(response, 'content') else "I've processed your request!"
             else:
                 # No tools called, just return the AI response
                 response_text = response.content if hasattr(response, 'content') else "Hello! I'm your task management assistant. Try asking me to create a task like 'Add a task to buy groceries' or 'Show me my tasks'."
             
+            intent_router.record(decision, "llm", (time.perf_counter() - started) * 1000)
             return {
                 "response": response_text,
                 "conversation_id": conversation_id,
@@ -138,7 +144,7 @@ ALWAYS use tools to perform actual task operations. Be proactive and take action
             }
             
         except Exception as e:
-            print(f"Agent error: {str(e)}")
+            logger.exception(f"Agent error: {str(e)}")
             return {
                 "response": f"I encountered an error: {str(e)}. Please try again.",
                 "conversation_id": conversation_id,
@@ -146,6 +152,135 @@ ALWAYS use tools to perform actual task operations. Be proactive and take action
                 "action_type": "error"
             }
 
+    async def _run_local(self, decision: RouteDecision, conversation_id: str) -> Dict[str, Any]:
+        """Answer a confidently classified command without calling the LLM"""
+        started = time.perf_counter()
+        tool_result = await self._execute_tool(decision.tool, decision.args)
+        if tool_result is None:
+            return self._tool_failed(decision.tool, conversation_id)
+        if tool_result.get('error'):
+            intent_router.record(decision, "local", (time.perf_counter() - started) * 1000)
+            return self._tool_error(tool_result['error'], conversation_id)
+        tasks_affected = self._collect_tasks(tool_result)
+        action_type = decision.tool.replace('_', ' ').title()
+        fallback = tool_result.get('message', "Task operation completed successfully!")
+        response_text = self._summarize(action_type, tasks_affected, fallback)
+
+        intent_router.record(decision, "local", (time.perf_counter() - started) * 1000)
+        return {
+            "response": response_text,
+            "conversation_id": conversation_id,
+            "tasks_affected": tasks_affected,
+            "action_type": action_type
+        }
+
+    async def _fallback(self, decision: RouteDecision, conversation_id: str, error: LLMUnavailable) -> Dict[str, Any]:
+        """Best-effort answer while the model is unavailable: the router's guess
+        when it only reads or is confident, otherwise a hint to use a plain command.
+        A low-confidence write (e.g. a delete by free-text title) is never run."""
+        llm_guard.record_fallback()
+        logger.warning(f"LLM unavailable ({error.reason}); answering from the rule-based path")
+        if decision.tool in READ_ONLY_TOOLS or intent_router.is_confident(decision):
+            return await self._run_local(decision, conversation_id)
+        return {
+            "response": "I'm having trouble reaching the language model right now. Simple commands still work, "
+                        "e.g. 'show my tasks', 'add task buy groceries' or 'complete task 3'.",
+            "conversation_id": conversation_id,
+            "tasks_affected": [],
+            "action_type": "chat"
+        }
+
+    @staticmethod
+    def _tool_failed(tool_name: str, conversation_id: str) -> Dict[str, Any]:
+        """The tool raised or returned nothing usable, so nothing can be reported as done"""
+        return {
+            "response": f"I couldn't complete that ({tool_name.replace('_', ' ')} failed). Please try again.",
+            "conversation_id": conversation_id,
+            "tasks_affected": [],
+            "action_type": "error"
+        }
+
+    @staticmethod
+    def _tool_error(error: str, conversation_id: str, tasks_affected: Optional[List[Dict[str, Any]]] = None) -> Dict[str, Any]:
+        """A tool reported {"error": ...}; tasks changed by earlier tool calls are still listed"""
+        return {
+            "response": error,
+            "conversation_id": conversation_id,
+            "tasks_affected": tasks_affected or [],
+            "action_type": "error"
+        }
+
+    async def _execute_tool(self, tool_name: str, tool_args: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        """Run a tool by name and return its result as a dict"""
+        for tool in self.tools:
+            if tool.name == tool_name:
+                with span("tool", tool=tool_name):
+                    try:
+                        tool_result = await tool.ainvoke(tool_args)
+                        if isinstance(tool_result, str):
+                            tool_result = json.loads(tool_result)
+                        return tool_result if isinstance(tool_result, dict) else None
+                    except json.JSONDecodeError:
+                        return None
+                    except Exception as tool_error:
+                        logger.error(f"Tool execution error in {tool_name}: {tool_error}")
+                        return None
+        return None
+
+    @staticmethod
+    def _collect_tasks(tool_result: Optional[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        if not tool_result or not tool_result.get('success'):
+            return []
+        if 'task' in tool_result:
+            return [tool_result['task']]
+        return list(tool_result.get('tasks', []))
+
+    @staticmethod
+    def _summarize(action_type: str, tasks_affected: List[Dict[str, Any]], fallback: str) -> str:
+        if action_type == "Create Task" and tasks_affected and tasks_affected[0].get('duplicate_of'):
+            task = tasks_affected[0]
+            if task['duplicate_of'] == task['id']:
+                return f"You already have the task '{task['title']}', so I've merged the details into it."
+            return f"I've created the task '{task['title']}', but it looks a lot like task #{task['duplicate_of']}. You may want to delete one of them."
+        elif action_type == "Create Task" and tasks_affected:
+            return f"Perfect! I've created the task '{tasks_affected[0].get('title', 'New Task')}' for you. It's now in your task list!"
+        elif action_type == "List Tasks":
+            count = len(tasks_affected)
+            if count == 0:
+                return "You don't have any tasks yet. Feel free to create some by saying something like 'Add a task to [your task here]'."
+            return f"Here are your {count} task(s). You can see them in the task list on the right!"
+        elif action_type == "Update Task" and tasks_affected:
+            return f"Great! I've updated the task '{tasks_affected[0].get('title', 'Task')}' for you."
+        elif action_type == "Delete Task":
+            return "Task deleted successfully! It's been removed from your list."
+        elif action_type == "Search Tasks":
+            count = len(tasks_affected)
+            if count == 0:
+                return "I couldn't find any tasks about that."
+            return f"Found {count} related task(s), best match first. Check the task list to see them!"
+        elif action_type == "Add Dependency" and len(tasks_affected) == 2:
+            return f"Got it: '{tasks_affected[0].get('title')}' now waits for '{tasks_affected[1].get('title')}' to be completed."
+        elif action_type == "Get Task Tree" and tasks_affected:
+            return f"Here is '{tasks_affected[0].get('title')}' with its {len(tasks_affected) - 1} subtask(s)."
+        elif action_type == "Ready Tasks":
+            count = len(tasks_affected)
+            if count == 0:
+                return "Nothing is ready right now: every open task is waiting on something else."
+            return f"{count} task(s) are ready to work on, most urgent first. Check the task list to see them!"
+        elif action_type == "Next Tasks":
+            if not tasks_affected:
+                return "You have no open tasks. Nice work!"
+            first = tasks_affected[0]
+            reasons = first.get('reasons') or []
+            text = f"Start with '{first.get('title')}'" + (f" ({', '.join(reasons)})." if reasons else ".")
+            if len(tasks_affected) > 1:
+                text += " After that: " + ", ".join(f"'{task.get('title')}'" for task in tasks_affected[1:]) + "."
+            return text
+        elif action_type == "Filter Tasks":
+            count = len(tasks_affected)
+            return f"Found {count} task(s) matching your criteria. Check the task list to see them!"
+        return fallback
+
 
 # Global agent instance
 task_agent = TaskManagementAgent()
\ No newline at end of file
@@ -1,29 +1,95 @@
-from fastapi import APIRouter, HTTPException
-from app.schemas.task import ChatMessage, ChatResponse
+from fastapi import APIRouter, HTTPException, Query, Request
+from fastapi.responses import StreamingResponse
+from typing import Optional
+from app.schemas.task import ChatMessage, ChatResponse, ChatBatchRequest, ChatBatchItem, ChatJobResponse
 from app.agents.simple_agent import simple_agent
+from app.agents.task_agent import task_agent
+from app.agents.intent_router import intent_router
+from app.agents.llm_resilience import llm_guard
+from app.services.admission import chat_admission, RateLimited, Overloaded
+from app.services.chat_jobs import chat_jobs
+from app.services.telemetry import span, trace, metrics as logging_metrics
+from app.services.idempotency import fingerprint, idempotency_cache
+from app.api.idempotency import IDEMPOTENCY_KEY_HEADER, run_idempotent
+from app.database.connection import client_key, replica_router
+import asyncio
 import logging
+import os
 
 router = APIRouter()
 logger = logging.getLogger(__name__)
 
+# Agent serving /api/chat: "simple" (keyword rules) or "task" (intent router,
+# then Gemini tool calling). Intent routing metrics only fill up with "task".
+CHAT_AGENT = os.getenv("CHAT_AGENT", "simple")
+chat_agent = task_agent if CHAT_AGENT == "task" else simple_agent
 
-@router.post("/chat", response_model=ChatResponse)
-async def chat_with_agent(message: ChatMessage):
-    """Chat with the task management agent"""
-    try:
-        logger.info(f"Received chat message: {message.message}")
-        
-        response = await simple_agent.chat(
-            user_input=message.message,
-            conversation_id=message.conversation_id
-        )
-        
+
+def _to_chat_response(response: dict) -> ChatResponse:
+    with span("response", tasks=len(response.get("tasks_affected", []))):
         return ChatResponse(
             response=response["response"],
             tasks_affected=response.get("tasks_affected", []),
             action_type=response.get("action_type", "chat"),
             conversation_id=response["conversation_id"]
         )
+
+
+async def _run_agent(message: ChatMessage) -> dict:
+    with span("agent", conversation_id=message.conversation_id) as current:
+        response = await chat_agent.chat(
+            user_input=message.message,
+            conversation_id=message.conversation_id
+        )
+        current.set(action_type=response.get("action_type"))
+        return response
+
+
+def _client_id(request: Request) -> str:
+    return client_key(request)
+
+
+def _priority(request: Request) -> str:
+    # The header can lower a request's priority; only trusted clients can raise it
+    return chat_admission.priority_for(_client_id(request), request.headers.get("X-Request-Priority"))
+
+
+def _check_rate(request: Request, conversation_id: Optional[str], cost: float = 1) -> None:
+    try:
+        chat_admission.check_rate(_client_id(request), conversation_id, cost)
+    except RateLimited as e:
+        raise HTTPException(status_code=429, detail=str(e), headers={"Retry-After": str(e.retry_after)})
+
+
+@router.post("/chat", response_model=ChatResponse)
+async def chat_with_agent(
+    message: ChatMessage,
+    request: Request,
+    idempotency_key: Optional[str] = IDEMPOTENCY_KEY_HEADER
+):
+    """Chat with the task management agent"""
+    async def chat():
+        # Replayed retries skip the rate limit, admission and the agent
+        _check_rate(request, message.conversation_id)
+        try:
+            async with chat_admission.slot(_priority(request)):
+                response = await _chat(message)
+        except Overloaded as e:
+            raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": str(e.retry_after)})
+        # The agent may have written; keep this client's next reads on the primary
+        replica_router.pin(_client_id(request))
+        return response if idempotency_key is None else response.model_dump(mode="json")
+
+    return await run_idempotent(request, idempotency_key, fingerprint(message.model_dump(mode="json")), chat)
+
+
+async def _chat(message: ChatMessage) -> ChatResponse:
+    try:
+        logger.debug(f"Received chat message: {message.message}", extra={"chars": len(message.message)})
+        
+        response = await _run_agent(message)
+        
+        return _to_chat_response(response)
         
     except Exception as e:
         logger.error(f"Error in chat endpoint: {str(e)}")
@@ -33,7 +99,87 @@ async def chat_with_agent(message: ChatMessage):
         )
 
 
+async def _run_batch_item(index: int, message: ChatMessage) -> ChatBatchItem:
+    try:
+        # The batch was admitted as a whole: items queue behind interactive chat
+        # for the shared LLM slots but are not shed
+        async with chat_admission.slot("low", sheddable=False):
+            response = await _run_agent(message)
+        return ChatBatchItem(index=index, result=_to_chat_response(response))
+    except Exception as e:
+        logger.error(f"Error in chat batch item {index}: {str(e)}")
+        return ChatBatchItem(index=index, error=str(e))
+
+
+@router.post("/chat/batch")
+async def chat_batch(batch: ChatBatchRequest, request: Request):
+    """Run many chat messages concurrently, streaming one NDJSON line per finished item"""
+    _check_rate(request, None, cost=len(batch.messages))
+    logger.info(f"Received chat batch of {len(batch.messages)} message(s)")
+
+    async def stream_results():
+        pending = [
+            asyncio.create_task(_run_batch_item(index, message))
+            for index, message in enumerate(batch.messages)
+        ]
+        try:
+            for finished in asyncio.as_completed(pending):
+                item = await finished
+                replica_router.pin(_client_id(request))
+                yield item.model_dump_json() + "\n"
+        finally:
+            # Client went away: stop the items that have not run yet
+            for task in pending:
+                task.cancel()
+
+    return StreamingResponse(stream_results(), media_type="application/x-ndjson")
+
+
+async def run_chat_job(message: ChatMessage) -> dict:
+    """Chat job handler run by the chat job worker pool"""
+    # Jobs run outside the submitting request, so each gets its own trace
+    with trace("chat job"):
+        async with chat_admission.slot("normal"):
+            response = await _run_agent(message)
+        return _to_chat_response(response).model_dump(mode="json")
+
+
+@router.post("/chat/jobs", response_model=ChatJobResponse, status_code=202)
+async def submit_chat_job(message: ChatMessage, request: Request):
+    """Queue a chat message and return a job id to poll or subscribe to on /ws"""
+    _check_rate(request, message.conversation_id)
+    try:
+        job = chat_jobs.submit(message)
+    except asyncio.QueueFull:
+        raise HTTPException(status_code=503, detail="Chat job queue is full", headers={"Retry-After": "5"})
+    return job.to_dict()
+
+
+@router.get("/chat/jobs/{job_id}", response_model=ChatJobResponse)
+async def get_chat_job(job_id: str, wait: float = Query(0, ge=0, le=60)):
+    """Get a chat job; with wait > 0, long-poll until it finishes or the wait expires"""
+    job = chat_jobs.get(job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Chat job not found")
+    if wait:
+        await chat_jobs.wait(job, wait)
+    return job.to_dict()
+
+
+@router.get("/chat/metrics")
+async def chat_metrics():
+    """Admission control, chat job, intent routing, LLM call, logging and idempotency counters"""
+    return {
+        **chat_admission.metrics(),
+        "jobs": chat_jobs.metrics(),
+        "routing": intent_router.metrics(),
+        "llm": llm_guard.metrics(),
+        "logging": logging_metrics(),
+        "idempotency": idempotency_cache.metrics(),
+    }
+
+
 @router.get("/chat/health")
 async def chat_health():
     """Health check for chat functionality"""
-    return {"status": "healthy", "agent": "ready"}
\ No newline at end of file
+    return {"status": "healthy", "agent": "ready"}
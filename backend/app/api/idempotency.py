@@ -0,0 +1,37 @@
+from typing import Any, Awaitable, Callable, Optional
+
+from fastapi import Header, HTTPException, Request
+from fastapi.responses import JSONResponse
+
+from app.database.connection import client_key
+from app.services.idempotency import (
+    MAX_KEY_LENGTH, IdempotencyConflict, IdempotencyInProgress, idempotency_cache
+)
+
+IDEMPOTENCY_KEY_HEADER = Header(
+    None, alias="Idempotency-Key", max_length=MAX_KEY_LENGTH,
+    description="Retries with the same key replay the first response instead of running again",
+)
+
+
+async def run_idempotent(
+    request: Request,
+    key: Optional[str],
+    request_fingerprint: str,
+    handler: Callable[[], Awaitable[Any]],
+):
+    """Run `handler` once per Idempotency-Key, replaying its stored JSON response to retries.
+
+    Keys are scoped to the endpoint and client. Without a key the handler
+    just runs and its result is returned as-is.
+    """
+    if key is None:
+        return await handler()
+    scoped = idempotency_cache.scoped_key(request.url.path, client_key(request), key)
+    try:
+        response, replayed = await idempotency_cache.execute(scoped, request_fingerprint, handler)
+    except IdempotencyConflict as e:
+        raise HTTPException(status_code=422, detail=str(e))
+    except IdempotencyInProgress as e:
+        raise HTTPException(status_code=409, detail=str(e), headers={"Retry-After": str(e.retry_after)})
+    return JSONResponse(content=response, headers={"Idempotent-Replayed": "true" if replayed else "false"})
@@ -1,40 +1,164 @@
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Query, Request
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse, StreamingResponse
 from sqlalchemy.ext.asyncio import AsyncSession
-from typing import List
+from typing import List, Optional
+from datetime import datetime
 
-from app.database.connection import get_async_session
-from app.services.task_service import TaskService
-from app.schemas.task import TaskCreate, TaskUpdate, TaskResponse, TaskFilter
+from app.database.connection import get_async_session, get_read_session
+from app.services.task_service import TaskService, parse_fields
+from app.services.task_dedup import DuplicateTaskError
+from app.services.task_graph import TaskGraphError
+from app.services.task_search import task_search
+from app.services.task_ranking import task_ranker
+from app.services.task_stats import task_stats
+from app.services.task_changes import task_change_log
+from app.services.idempotency import fingerprint
+from app.services.task_transfer import FORMATS, export_tasks, import_tasks
+from app.api.idempotency import IDEMPOTENCY_KEY_HEADER, run_idempotent
+from app.schemas.task import (
+    TaskCreate, TaskUpdate, TaskResponse, TaskFilter, TaskStatsResponse, TaskSearchResult, TaskRankResult,
+    TaskTreeNode, DependencyCreate, TaskChangesResponse
+)
 
 router = APIRouter()
 
+FIELDS_DESCRIPTION = "Comma-separated task fields to return (id is always included)"
+
+
+def _parse_fields(fields: Optional[str]) -> Optional[List[str]]:
+    try:
+        return parse_fields(fields)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+
+def _task_list_response(tasks: list, fields: Optional[List[str]]):
+    # Projected rows are partial, so they bypass TaskResponse validation
+    if fields:
+        return JSONResponse(content=jsonable_encoder(tasks))
+    return tasks
+
 
 @router.get("/tasks", response_model=List[TaskResponse])
 async def get_tasks(
     skip: int = 0,
     limit: int = 100,
-    db: AsyncSession = Depends(get_async_session)
+    include_archived: bool = False,
+    fields: Optional[str] = Query(None, description=FIELDS_DESCRIPTION),
+    db: AsyncSession = Depends(get_read_session)
 ):
     """Get all tasks with pagination"""
+    projection = _parse_fields(fields)
     task_service = TaskService(db)
-    tasks = await task_service.get_tasks(skip=skip, limit=limit)
-    return tasks
+    tasks = await task_service.get_tasks(
+        skip=skip, limit=limit, include_archived=include_archived, fields=projection
+    )
+    return _task_list_response(tasks, projection)
 
 
 @router.post("/tasks", response_model=TaskResponse)
 async def create_task_endpoint(
     task: TaskCreate,
+    request: Request,
+    on_duplicate: Optional[str] = Query(None, pattern="^(warn|merge|reject)$", description="Near-duplicate policy (default from DUPLICATE_POLICY)"),
+    idempotency_key: Optional[str] = IDEMPOTENCY_KEY_HEADER,
     db: AsyncSession = Depends(get_async_session)
 ):
     """Create a new task"""
-    task_service = TaskService(db)
-    return await task_service.create_task(task)
+    async def create():
+        task_service = TaskService(db)
+        try:
+            created = await task_service.create_task(task, on_duplicate=on_duplicate)
+        except DuplicateTaskError as e:
+            raise HTTPException(status_code=409, detail={"message": str(e), "duplicate_of": e.match.task_id})
+        except ValueError as e:
+            # Bad parent or recurrence rule
+            raise HTTPException(status_code=400, detail=str(e))
+        if idempotency_key is None:
+            return created
+        return TaskResponse.model_validate(created).model_dump(mode="json")
+
+    return await run_idempotent(request, idempotency_key, fingerprint(task.model_dump(mode="json"), on_duplicate), create)
+
+
+@router.get("/tasks/stats", response_model=TaskStatsResponse)
+async def get_task_stats():
+    """Task counts by status and priority, plus overdue and due today"""
+    return task_stats.snapshot()
+
+
+@router.get("/tasks/search", response_model=List[TaskSearchResult])
+async def search_tasks_endpoint(
+    q: str = Query(..., min_length=1, description="What the tasks are about"),
+    limit: int = Query(10, ge=1, le=100),
+    db: AsyncSession = Depends(get_read_session)
+):
+    """Semantic search over task titles and descriptions, best match first"""
+    matches = task_search.search(q, limit)
+    scores = dict(matches)
+    tasks = await TaskService(db).get_tasks_by_ids([task_id for task_id, _ in matches])
+    return [{**task.to_dict(), "score": scores[task.id]} for task in tasks]
+
+
+@router.get("/tasks/changes", response_model=TaskChangesResponse)
+async def get_task_changes(
+    since: Optional[int] = Query(None, ge=0, description="next_since from the previous call; omit to get the current position"),
+    limit: int = Query(500, ge=1, le=5000),
+    db: AsyncSession = Depends(get_read_session)
+):
+    """Tasks created, updated or deleted since a change-log position"""
+    return await task_change_log.changes(db, since, limit)
+
+
+@router.get("/tasks/ready", response_model=List[TaskResponse])
+async def get_ready_tasks(
+    limit: int = Query(20, ge=1, le=500),
+    db: AsyncSession = Depends(get_read_session)
+):
+    """Open tasks not waiting on any open blocker or subtask, most urgent first"""
+    return await TaskService(db).get_ready_tasks(limit)
+
+
+@router.get("/tasks/next", response_model=List[TaskRankResult])
+async def get_next_tasks(
+    limit: int = Query(5, ge=1, le=100),
+    ready_only: bool = Query(False, description="Skip tasks still waiting on an open blocker or subtask"),
+    db: AsyncSession = Depends(get_read_session)
+):
+    """Open tasks to do next, ranked by priority, due date, overdue status and age"""
+    ranked = await TaskService(db).get_next_tasks(limit, ready_only)
+    return [{**task.to_dict(), "score": score, "reasons": task_ranker.reasons(task)} for task, score in ranked]
+
+
+@router.get("/tasks/export")
+async def export_tasks_endpoint(
+    fmt: str = Query("ndjson", alias="format", pattern="^(ndjson|csv)$"),
+    include_archived: bool = False
+):
+    """Stream every task as NDJSON or CSV"""
+    return StreamingResponse(
+        export_tasks(fmt, include_archived),
+        media_type=FORMATS[fmt],
+        headers={"Content-Disposition": f'attachment; filename="tasks.{fmt}"'}
+    )
+
+
+@router.post("/tasks/import")
+async def import_tasks_endpoint(
+    request: Request,
+    fmt: str = Query(None, alias="format", pattern="^(ndjson|csv)$")
+):
+    """Import tasks from an NDJSON or CSV request body, reporting errors per row"""
+    if fmt is None:
+        fmt = "csv" if request.headers.get("content-type", "").startswith("text/csv") else "ndjson"
+    return await import_tasks(fmt, request.stream())
 
 
 @router.get("/tasks/{task_id}", response_model=TaskResponse)
 async def get_task(
     task_id: int,
-    db: AsyncSession = Depends(get_async_session)
+    db: AsyncSession = Depends(get_read_session)
 ):
     """Get a task by ID"""
     task_service = TaskService(db)
@@ -52,7 +176,10 @@ async def update_task_endpoint(
 ):
     """Update a task by ID"""
     task_service = TaskService(db)
-    task = await task_service.update_task(task_id, task_update)
+    try:
+        task = await task_service.update_task(task_id, task_update)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     if not task:
         raise HTTPException(status_code=404, detail="Task not found")
     return task
@@ -74,12 +201,14 @@ async def delete_task_endpoint(
 @router.post("/tasks/filter", response_model=List[TaskResponse])
 async def filter_tasks_endpoint(
     task_filter: TaskFilter,
-    db: AsyncSession = Depends(get_async_session)
+    fields: Optional[str] = Query(None, description=FIELDS_DESCRIPTION),
+    db: AsyncSession = Depends(get_read_session)
 ):
     """Filter tasks based on criteria"""
+    projection = _parse_fields(fields)
     task_service = TaskService(db)
-    tasks = await task_service.filter_tasks(task_filter)
-    return tasks
+    tasks = await task_service.filter_tasks(task_filter, fields=projection)
+    return _task_list_response(tasks, projection)
 
 
 @router.patch("/tasks/{task_id}/toggle")
@@ -92,4 +221,85 @@ async def toggle_task_status(
     task = await task_service.toggle_task_status(task_id)
     if not task:
         raise HTTPException(status_code=404, detail="Task not found")
-    return {"message": f"Task status updated to {task.status.value}", "task": task.to_dict()}
\ No newline at end of file
+    return {"message": f"Task status updated to {task.status.value}", "task": task.to_dict()}
+
+
+@router.get("/tasks/{task_id}/tree", response_model=TaskTreeNode)
+async def get_task_tree(
+    task_id: int,
+    db: AsyncSession = Depends(get_read_session)
+):
+    """A task with all of its subtasks, nested"""
+    tree = await TaskService(db).get_task_tree(task_id)
+    if not tree:
+        raise HTTPException(status_code=404, detail="Task not found")
+    return tree
+
+
+@router.get("/tasks/{task_id}/dependencies", response_model=List[TaskResponse])
+async def get_task_dependencies(
+    task_id: int,
+    direction: str = Query("blocked_by", pattern="^(blocked_by|blocks)$", description="Tasks this one waits on, or tasks waiting on it"),
+    db: AsyncSession = Depends(get_read_session)
+):
+    """All tasks a task transitively depends on, or that depend on it"""
+    return await TaskService(db).get_dependency_closure(task_id, direction)
+
+
+@router.post("/tasks/{task_id}/dependencies")
+async def add_task_dependency(
+    task_id: int,
+    dependency: DependencyCreate,
+    db: AsyncSession = Depends(get_async_session)
+):
+    """Mark a task as blocked by another task"""
+    try:
+        added = await TaskService(db).add_dependency(task_id, dependency.blocked_by_id)
+    except TaskGraphError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    if not added:
+        raise HTTPException(status_code=404, detail="Task not found")
+    return {"message": f"Task {task_id} is now blocked by task {dependency.blocked_by_id}"}
+
+
+@router.delete("/tasks/{task_id}/dependencies/{blocked_by_id}")
+async def remove_task_dependency(
+    task_id: int,
+    blocked_by_id: int,
+    db: AsyncSession = Depends(get_async_session)
+):
+    """Remove a dependency between two tasks"""
+    removed = await TaskService(db).remove_dependency(task_id, blocked_by_id)
+    if not removed:
+        raise HTTPException(status_code=404, detail="Dependency not found")
+    return {"message": "Dependency removed"}
+
+
+@router.put("/tasks/{task_id}/occurrences/{occurrence_date}", response_model=TaskResponse)
+async def update_occurrence_endpoint(
+    task_id: int,
+    occurrence_date: datetime,
+    task_update: TaskUpdate,
+    db: AsyncSession = Depends(get_async_session)
+):
+    """Update one occurrence of a recurring task; it is saved as its own task"""
+    try:
+        task = await TaskService(db).update_occurrence(task_id, occurrence_date, task_update)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if not task:
+        raise HTTPException(status_code=404, detail="Occurrence not found")
+    return task
+
+
+@router.patch("/tasks/{task_id}/occurrences/{occurrence_date}/toggle")
+async def toggle_occurrence_status(
+    task_id: int,
+    occurrence_date: datetime,
+    db: AsyncSession = Depends(get_async_session)
+):
+    """Toggle one occurrence of a recurring task between pending and completed"""
+    task = await TaskService(db).toggle_occurrence_status(task_id, occurrence_date)
+    if not task:
+        raise HTTPException(status_code=404, detail="Occurrence not found")
+    return {"message": f"Task status updated to {task.status.value}", "task": task.to_dict()}
@@ -1,15 +1,30 @@
 from fastapi import FastAPI, WebSocket, WebSocketDisconnect
 from fastapi.middleware.cors import CORSMiddleware
 from contextlib import asynccontextmanager
+import asyncio
 import json
 import logging
+import os
 
-from app.database.connection import init_db
+from app.database.connection import init_db, replica_router
+from app.middleware.compression import CompressionMiddleware
+from app.middleware.tracing import TracingMiddleware, TRACE_HEADER
 from app.api.tasks import router as tasks_router
-from app.api.chat import router as chat_router
-
-# Configure logging
-logging.basicConfig(level=logging.INFO)
+from app.api.chat import router as chat_router, run_chat_job
+from app.services.task_stats import task_stats
+from app.services.task_search import task_search
+from app.services.task_dedup import duplicate_index
+from app.services.task_snapshot import task_snapshot
+from app.services.task_graph import task_graph
+from app.services.reminder_scheduler import reminder_scheduler
+from app.services.task_archive import task_archiver
+from app.services.task_changes import task_change_log
+from app.services.chat_jobs import chat_jobs
+from app.services.idempotency import idempotency_cache
+from app.services.telemetry import configure_logging, shutdown_logging
+
+# Queue-backed structured logging; see app/services/telemetry.py
+configure_logging()
 logger = logging.getLogger(__name__)
 
 
@@ -18,9 +33,31 @@ async def lifespan(app: FastAPI):
     # Startup
     logger.info("Starting up...")
     await init_db()
+    stats_reconciler = asyncio.create_task(task_stats.run_reconciler())
+    reminders = asyncio.create_task(reminder_scheduler.run(manager.broadcast))
+    archiver = asyncio.create_task(task_archiver.run())
+    change_compactor = asyncio.create_task(task_change_log.run())
+    job_workers = asyncio.create_task(chat_jobs.run(run_chat_job))
+    idempotency_purger = asyncio.create_task(idempotency_cache.run())
+    search_loader = asyncio.create_task(task_search.load())
+    duplicate_loader = asyncio.create_task(duplicate_index.load())
+    graph_loader = asyncio.create_task(task_graph.load())
+    snapshot_saver = asyncio.create_task(task_snapshot.run())
     yield
     # Shutdown
     logger.info("Shutting down...")
+    stats_reconciler.cancel()
+    reminders.cancel()
+    archiver.cancel()
+    change_compactor.cancel()
+    job_workers.cancel()
+    idempotency_purger.cancel()
+    search_loader.cancel()
+    duplicate_loader.cancel()
+    graph_loader.cancel()
+    snapshot_saver.cancel()
+    task_snapshot.save()
+    shutdown_logging()
 
 
 app = FastAPI(
@@ -37,8 +74,18 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=[TRACE_HEADER],
 )
 
+# Compress responses for clients that accept br/gzip
+app.add_middleware(
+    CompressionMiddleware,
+    minimum_size=int(os.getenv("COMPRESSION_MIN_SIZE", "1024")),
+)
+
+# Outermost, so the trace covers compression and CORS too
+app.add_middleware(TracingMiddleware)
+
 # Include routers
 app.include_router(tasks_router, prefix="/api", tags=["tasks"])
 app.include_router(chat_router, prefix="/api", tags=["chat"])
@@ -51,7 +98,7 @@ async def root():
 
 @app.get("/health")
 async def health_check():
-    return {"status": "healthy"}
+    return {"status": "healthy", "database": replica_router.metrics()}
 
 
 # WebSocket connection manager for real-time updates
@@ -80,6 +127,23 @@ class ConnectionManager:
 manager = ConnectionManager()
 
 
+async def handle_ws_command(data: str, websocket: WebSocket) -> bool:
+    """Handle JSON commands sent over /ws; returns False for anything else"""
+    try:
+        command = json.loads(data)
+    except json.JSONDecodeError:
+        return False
+    if not isinstance(command, dict):
+        return False
+
+    if command.get("type") == "subscribe_job":
+        job_id = str(command.get("job_id"))
+        if not await chat_jobs.subscribe(job_id, websocket.send_text):
+            await websocket.send_text(json.dumps({"type": "error", "detail": f"Chat job not found: {job_id}"}))
+        return True
+    return False
+
+
 @app.websocket("/ws")
 async def websocket_endpoint(websocket: WebSocket):
     await manager.connect(websocket)
@@ -87,7 +151,9 @@ async def websocket_endpoint(websocket: WebSocket):
         while True:
             data = await websocket.receive_text()
             # Handle incoming WebSocket messages
-            logger.info(f"Received WebSocket data: {data}")
+            logger.debug(f"Received WebSocket data: {data}")
+            if await handle_ws_command(data, websocket):
+                continue
             # Echo back for now - will be replaced with agent logic
             await manager.send_personal_message(f"Echo: {data}", websocket)
     except WebSocketDisconnect:
@@ -0,0 +1,32 @@
+from starlette.datastructures import Headers, MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from app.services.telemetry import trace
+
+TRACE_HEADER = "X-Trace-Id"
+
+
+class TracingMiddleware:
+    """Runs each HTTP request inside a trace.
+
+    A valid incoming X-Trace-Id is reused so a client can follow its own
+    request; either way the id is returned in the X-Trace-Id response header.
+    """
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        incoming = Headers(scope=scope).get(TRACE_HEADER)
+        with trace(f"{scope['method']} {scope['path']}", trace_id=incoming) as root:
+            async def send_with_trace_id(message: Message) -> None:
+                if message["type"] == "http.response.start":
+                    MutableHeaders(scope=message).append(TRACE_HEADER, root.trace.trace_id)
+                    root.set(status=message["status"])
+                await send(message)
+
+            await self.app(scope, receive, send_with_trace_id)
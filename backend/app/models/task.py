@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, DateTime, Enum, Text
+from sqlalchemy import BigInteger, Column, Integer, String, DateTime, Enum, Text, ForeignKey, Index
 from sqlalchemy.sql import func
 from datetime import datetime
 from enum import Enum as PyEnum
@@ -19,15 +19,25 @@ class TaskPriority(PyEnum):
     URGENT = "urgent"
 
 
-class Task(Base):
-    __tablename__ = "tasks"
+class ChangeOp(PyEnum):
+    UPSERT = "upsert"
+    DELETE = "delete"
+
+
+class TaskColumns:
+    """Columns and helpers shared by the hot and archived task tables"""
 
-    id = Column(Integer, primary_key=True, index=True, autoincrement=True)
     title = Column(String(255), nullable=False, index=True)
     description = Column(Text, nullable=True)
     status = Column(Enum(TaskStatus), default=TaskStatus.PENDING, nullable=False)
     due_date = Column(DateTime, nullable=True)
     priority = Column(Enum(TaskPriority), default=TaskPriority.MEDIUM, nullable=False)
+    parent_id = Column(Integer, nullable=True)
+    # RRULE subset (see app.services.recurrence); due_date is the first occurrence
+    recurrence = Column(String(255), nullable=True)
+    # Set on occurrences of a recurring task that were completed or edited
+    series_id = Column(Integer, nullable=True)
+    occurrence_date = Column(DateTime, nullable=True)
     created_at = Column(DateTime(timezone=True), server_default=func.now(), nullable=False)
     updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now(), nullable=False)
 
@@ -42,6 +52,78 @@ class Task(Base):
             "status": self.status.value if self.status else None,
             "due_date": self.due_date.isoformat() if self.due_date else None,
             "priority": self.priority.value if self.priority else None,
+            "parent_id": self.parent_id,
+            "recurrence": self.recurrence,
+            "series_id": self.series_id,
+            "occurrence_date": self.occurrence_date.isoformat() if self.occurrence_date else None,
             "created_at": self.created_at.isoformat() if self.created_at else None,
             "updated_at": self.updated_at.isoformat() if self.updated_at else None,
-        }
\ No newline at end of file
+        }
+
+
+class Task(TaskColumns, Base):
+    __tablename__ = "tasks"
+
+    id = Column(Integer, primary_key=True, index=True, autoincrement=True)
+    # Subtasks point at their parent; only the hot table enforces it
+    parent_id = Column(Integer, ForeignKey("tasks.id"), nullable=True, index=True)
+    recurrence = Column(String(255), nullable=True, index=True)
+
+    # One saved row per occurrence; series rows keep no FK so history outlives the series
+    __table_args__ = (Index("ix_tasks_series_occurrence", "series_id", "occurrence_date", unique=True),)
+
+    # Not a column: set by TaskService.create_task when a near-duplicate was found
+    duplicate_of = None
+
+
+class ArchivedTask(TaskColumns, Base):
+    """Completed tasks moved out of the hot table by the archiver"""
+    __tablename__ = "tasks_archive"
+
+    id = Column(Integer, primary_key=True, autoincrement=False)
+    archived_at = Column(DateTime(timezone=True), server_default=func.now(), nullable=False, index=True)
+
+    __table_args__ = (Index("ix_tasks_archive_series_occurrence", "series_id", "occurrence_date"),)
+
+
+class TaskDependency(Base):
+    """Edge "task_id is blocked by blocked_by_id" between two tasks"""
+    __tablename__ = "task_dependencies"
+
+    task_id = Column(Integer, ForeignKey("tasks.id", ondelete="CASCADE"), primary_key=True)
+    blocked_by_id = Column(Integer, ForeignKey("tasks.id", ondelete="CASCADE"), primary_key=True, index=True)
+    created_at = Column(DateTime(timezone=True), server_default=func.now(), nullable=False)
+
+
+class TaskChange(Base):
+    """Append-only log of task writes, one row per written task, for delta sync"""
+    __tablename__ = "task_changes"
+
+    # BIGSERIAL on PostgreSQL; SQLite only autoincrements INTEGER primary keys
+    seq = Column(BigInteger().with_variant(Integer, "sqlite"), primary_key=True, autoincrement=True)
+    task_id = Column(Integer, nullable=False)
+    op = Column(Enum(ChangeOp), nullable=False)
+    changed_at = Column(DateTime(timezone=True), server_default=func.now(), nullable=False, index=True)
+
+    __table_args__ = (Index("ix_task_changes_task_seq", "task_id", "seq"),)
+
+
+class TaskChangeFloor(Base):
+    """Single row: highest sequence number whose tombstones have been pruned"""
+    __tablename__ = "task_change_floor"
+
+    id = Column(Integer, primary_key=True)
+    seq = Column(BigInteger, nullable=False, default=0)
+
+
+class IdempotencyRecord(Base):
+    """Stored response for an Idempotency-Key; `response` is NULL while the first request runs"""
+    __tablename__ = "idempotency_keys"
+
+    # sha256 of endpoint, client and key
+    key = Column(String(64), primary_key=True)
+    fingerprint = Column(String(64), nullable=False)
+    response = Column(Text, nullable=True)
+    created_at = Column(DateTime(timezone=True), server_default=func.now(), nullable=False)
+    # Claim lease while running, then the replay TTL
+    expires_at = Column(DateTime(timezone=True), nullable=False, index=True)
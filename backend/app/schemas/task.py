@@ -1,5 +1,5 @@
 from pydantic import BaseModel, Field
-from typing import Optional
+from typing import Dict, List, Literal, Optional
 from datetime import datetime
 from app.models.task import TaskStatus, TaskPriority
 
@@ -10,6 +10,8 @@ class TaskBase(BaseModel):
     status: Optional[TaskStatus] = Field(TaskStatus.PENDING, description="Task status")
     due_date: Optional[datetime] = Field(None, description="Task due date")
     priority: Optional[TaskPriority] = Field(TaskPriority.MEDIUM, description="Task priority")
+    parent_id: Optional[int] = Field(None, description="Parent task, for subtasks")
+    recurrence: Optional[str] = Field(None, description="Repeat rule: RRULE such as 'FREQ=WEEKLY;BYDAY=MO' or a phrase like 'every monday'")
 
 
 class TaskCreate(TaskBase):
@@ -22,12 +24,17 @@ class TaskUpdate(BaseModel):
     status: Optional[TaskStatus] = None
     due_date: Optional[datetime] = None
     priority: Optional[TaskPriority] = None
+    parent_id: Optional[int] = None
+    recurrence: Optional[str] = None
 
 
 class TaskResponse(TaskBase):
     id: int
     created_at: datetime
     updated_at: datetime
+    duplicate_of: Optional[int] = Field(None, description="Existing task this one looks like a duplicate of (on create only)")
+    series_id: Optional[int] = Field(None, description="Recurring task this is an occurrence of")
+    occurrence_date: Optional[datetime] = Field(None, description="Scheduled date of the occurrence within its series")
 
     class Config:
         from_attributes = True
@@ -39,6 +46,51 @@ class TaskFilter(BaseModel):
     due_date_before: Optional[datetime] = None
     due_date_after: Optional[datetime] = None
     search: Optional[str] = None
+    parent_id: Optional[int] = Field(None, description="Only direct subtasks of this task")
+    include_archived: bool = Field(False, description="Also search archived completed tasks")
+    sort_by: Literal["created_at", "updated_at", "due_date", "priority"] = Field("created_at", description="Sort key; tasks without a due date sort last")
+    descending: bool = Field(True, description="Sort direction")
+    limit: Optional[int] = Field(None, ge=1, le=10000, description="Maximum number of tasks to return")
+
+
+class TaskSearchResult(TaskResponse):
+    score: float = Field(..., description="Cosine similarity to the query")
+
+
+class TaskRankResult(TaskResponse):
+    score: float = Field(..., description="Weighted priority, due-date, overdue and age score; higher is more pressing")
+    reasons: List[str] = Field(default_factory=list, description="Why the task ranks high, e.g. 'overdue by 2 days'")
+
+
+class TaskTreeNode(TaskResponse):
+    children: List["TaskTreeNode"] = Field(default_factory=list, description="Direct subtasks")
+
+
+class DependencyCreate(BaseModel):
+    blocked_by_id: int = Field(..., description="Task that must be completed first")
+
+
+class TaskChangeEntry(BaseModel):
+    seq: int
+    op: Literal["upsert", "delete"]
+    task_id: int
+    task: Optional[TaskResponse] = Field(None, description="Current state of the task (upserts only)")
+
+
+class TaskChangesResponse(BaseModel):
+    changes: List[TaskChangeEntry] = Field(default_factory=list, description="Latest change per task, oldest first")
+    next_since: int = Field(..., description="Pass as `since` on the next call")
+    has_more: bool = False
+    reset: bool = Field(False, description="`since` predates compacted history: reload the task list, then continue from next_since")
+
+
+class TaskStatsResponse(BaseModel):
+    total: int
+    by_status: Dict[str, int]
+    by_priority: Dict[str, int]
+    overdue: int = Field(..., description="Open tasks whose due date has passed")
+    due_today: int = Field(..., description="Open tasks due later today")
+    reconciled_at: Optional[datetime] = None
 
 
 # Chat-related schemas
@@ -51,4 +103,23 @@ class ChatResponse(BaseModel):
     response: str
     tasks_affected: Optional[list[TaskResponse]] = None
     action_type: Optional[str] = None  # create, update, delete, list, filter
-    conversation_id: str
\ No newline at end of file
+    conversation_id: str
+
+
+class ChatBatchRequest(BaseModel):
+    messages: List[ChatMessage] = Field(..., min_length=1, max_length=100, description="Messages to process")
+
+
+class ChatBatchItem(BaseModel):
+    index: int = Field(..., description="Position of the message in the request")
+    result: Optional[ChatResponse] = None
+    error: Optional[str] = None
+
+
+class ChatJobResponse(BaseModel):
+    job_id: str
+    status: str  # queued, running, succeeded, failed
+    result: Optional[ChatResponse] = None
+    error: Optional[str] = None
+    created_at: datetime
+    finished_at: Optional[datetime] = None
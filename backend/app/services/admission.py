@@ -0,0 +1,209 @@
+import asyncio
+import heapq
+import math
+import os
+import time
+from collections import Counter, OrderedDict
+from contextlib import asynccontextmanager
+from itertools import count
+from typing import Any, Dict, List, Optional
+
+# Maximum number of agent calls in flight across all chat requests
+LLM_CONCURRENCY = int(os.getenv("LLM_CONCURRENCY", "4"))
+CHAT_MAX_QUEUE = int(os.getenv("CHAT_MAX_QUEUE", "32"))
+CHAT_QUEUE_TIMEOUT = float(os.getenv("CHAT_QUEUE_TIMEOUT_SECONDS", "30"))
+# Token buckets: sustained requests per second and burst size
+CHAT_CLIENT_RATE = float(os.getenv("CHAT_CLIENT_RATE", "1"))
+CHAT_CLIENT_BURST = float(os.getenv("CHAT_CLIENT_BURST", "10"))
+CHAT_CONVERSATION_RATE = float(os.getenv("CHAT_CONVERSATION_RATE", "0.5"))
+CHAT_CONVERSATION_BURST = float(os.getenv("CHAT_CONVERSATION_BURST", "5"))
+# Client keys (IP addresses) allowed to ask for "high" priority; everyone else gets at most "normal"
+CHAT_TRUSTED_CLIENTS = {client.strip() for client in os.getenv("CHAT_TRUSTED_CLIENTS", "").split(",") if client.strip()}
+
+# Lower rank is served first
+PRIORITIES = {"high": 0, "normal": 1, "low": 2}
+
+MAX_TRACKED_BUCKETS = 10000
+
+
+class RateLimited(Exception):
+    """The caller exceeded its token bucket (HTTP 429)"""
+
+    def __init__(self, retry_after: int):
+        super().__init__(f"Rate limit exceeded, retry after {retry_after}s")
+        self.retry_after = retry_after
+
+
+class Overloaded(Exception):
+    """The wait queue is full or the wait took too long (HTTP 503)"""
+
+    def __init__(self, retry_after: int):
+        super().__init__(f"Server busy, retry after {retry_after}s")
+        self.retry_after = retry_after
+
+
+class TokenBucket:
+    __slots__ = ("rate", "capacity", "tokens", "updated")
+
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+
+    def take(self, cost: float = 1) -> float:
+        """Take `cost` tokens (at most a full bucket); returns 0 on success or the seconds until they are available"""
+        cost = min(cost, self.capacity)
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        if self.tokens >= cost:
+            self.tokens -= cost
+            return 0.0
+        return (cost - self.tokens) / self.rate
+
+
+class AdmissionController:
+    """Rate limits, a concurrency cap and a bounded priority wait queue for agent calls"""
+
+    def __init__(
+        self,
+        max_concurrency: int = LLM_CONCURRENCY,
+        max_queue: int = CHAT_MAX_QUEUE,
+        queue_timeout: float = CHAT_QUEUE_TIMEOUT,
+    ):
+        self.max_concurrency = max_concurrency
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self.in_flight = 0
+        self.admitted = 0
+        self.shed: Counter = Counter()
+        self._waiters: List[list] = []
+        self._counter = count()
+        self._buckets: "OrderedDict[str, TokenBucket]" = OrderedDict()
+        self._service_time = 5.0
+
+    def _bucket(self, key: str, rate: float, burst: float) -> TokenBucket:
+        bucket = self._buckets.get(key)
+        if bucket is None:
+            bucket = self._buckets[key] = TokenBucket(rate, burst)
+            if len(self._buckets) > MAX_TRACKED_BUCKETS:
+                self._buckets.popitem(last=False)
+        else:
+            self._buckets.move_to_end(key)
+        return bucket
+
+    def check_rate(self, client_id: str, conversation_id: Optional[str] = None, cost: float = 1) -> None:
+        """Charge the client and conversation buckets, raising RateLimited when empty.
+
+        A batch is charged once with `cost` = its item count, capped at a full bucket.
+        """
+        buckets = [self._bucket(f"client:{client_id}", CHAT_CLIENT_RATE, CHAT_CLIENT_BURST)]
+        if conversation_id:
+            buckets.append(
+                self._bucket(f"conversation:{conversation_id}", CHAT_CONVERSATION_RATE, CHAT_CONVERSATION_BURST)
+            )
+        for bucket in buckets:
+            wait = bucket.take(cost)
+            if wait:
+                self.shed["rate_limited"] += 1
+                raise RateLimited(max(1, math.ceil(wait)))
+
+    @staticmethod
+    def priority_for(client_id: str, requested: Optional[str]) -> str:
+        """Clamp a client's requested priority: "high" only for CHAT_TRUSTED_CLIENTS"""
+        requested = (requested or "normal").lower()
+        if requested == "high":
+            return "high" if client_id in CHAT_TRUSTED_CLIENTS else "normal"
+        return requested if requested in PRIORITIES else "normal"
+
+    def _queued(self) -> int:
+        """Waiters that count against max_queue (batch items do not)"""
+        return sum(1 for entry in self._waiters if entry[3])
+
+    def _retry_after(self) -> int:
+        backlog = (len(self._waiters) + 1) / self.max_concurrency
+        return max(1, math.ceil(self._service_time * backlog))
+
+    async def acquire(self, priority: str = "normal", sheddable: bool = True) -> None:
+        """Wait for an agent slot.
+
+        Non-sheddable waiters (items of an already admitted batch) wait until a
+        slot frees up: they are never timed out or evicted and do not take
+        room in the bounded queue, but are still served in priority order.
+        """
+        if self.in_flight < self.max_concurrency:
+            self.in_flight += 1
+            self.admitted += 1
+            return
+
+        rank = PRIORITIES.get(priority, PRIORITIES["normal"])
+        if sheddable and self._queued() >= self.max_queue:
+            # A full queue sheds its lowest-priority waiter in favour of a better one
+            worst = max((entry for entry in self._waiters if entry[3]), default=None)
+            if worst is None or worst[0] <= rank:
+                self.shed["queue_full"] += 1
+                raise Overloaded(self._retry_after())
+            self._discard(worst)
+            self.shed["evicted"] += 1
+            worst[2].set_exception(Overloaded(self._retry_after()))
+
+        future = asyncio.get_running_loop().create_future()
+        entry = [rank, next(self._counter), future, sheddable]
+        heapq.heappush(self._waiters, entry)
+        try:
+            await asyncio.wait_for(future, self.queue_timeout if sheddable else None)
+        except asyncio.TimeoutError:
+            self._discard(entry)
+            self.shed["queue_timeout"] += 1
+            raise Overloaded(self._retry_after())
+        except asyncio.CancelledError:
+            if future.done() and not future.cancelled():
+                # The slot was handed over just as we were cancelled
+                self.release()
+            else:
+                self._discard(entry)
+            raise
+        self.admitted += 1
+
+    def _discard(self, entry: list) -> None:
+        if entry in self._waiters:
+            self._waiters.remove(entry)
+            heapq.heapify(self._waiters)
+
+    def release(self) -> None:
+        """Hand the slot to the best waiter, or free it"""
+        while self._waiters:
+            future = heapq.heappop(self._waiters)[2]
+            if not future.done():
+                future.set_result(None)
+                return
+        self.in_flight -= 1
+
+    @asynccontextmanager
+    async def slot(self, priority: str = "normal", sheddable: bool = True):
+        """Hold one agent slot for the duration of the block"""
+        await self.acquire(priority, sheddable)
+        started = time.monotonic()
+        try:
+            yield
+        finally:
+            # Moving average of agent call time feeds the Retry-After estimate
+            self._service_time = 0.9 * self._service_time + 0.1 * (time.monotonic() - started)
+            self.release()
+
+    def metrics(self) -> Dict[str, Any]:
+        return {
+            "in_flight": self.in_flight,
+            "max_concurrency": self.max_concurrency,
+            "queue_depth": self._queued(),
+            "batch_waiting": len(self._waiters) - self._queued(),
+            "max_queue": self.max_queue,
+            "admitted": self.admitted,
+            "shed": dict(self.shed),
+            "avg_service_seconds": round(self._service_time, 3),
+        }
+
+
+# Global admission controller for chat requests
+chat_admission = AdmissionController()
@@ -0,0 +1,139 @@
+import asyncio
+import json
+import logging
+import os
+import time
+import uuid
+from datetime import datetime
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+from app.schemas.task import ChatMessage
+
+logger = logging.getLogger(__name__)
+
+CHAT_JOB_WORKERS = int(os.getenv("CHAT_JOB_WORKERS", "4"))
+CHAT_JOB_QUEUE_SIZE = int(os.getenv("CHAT_JOB_QUEUE_SIZE", "1000"))
+# Finished jobs are dropped this many seconds after completion
+CHAT_JOB_TTL = float(os.getenv("CHAT_JOB_TTL_SECONDS", "600"))
+
+JobHandler = Callable[[ChatMessage], Awaitable[Any]]
+JobSubscriber = Callable[[str], Awaitable[None]]
+
+
+def _json_default(value: Any) -> str:
+    return value.isoformat() if isinstance(value, datetime) else str(value)
+
+
+class ChatJob:
+    def __init__(self, message: ChatMessage):
+        self.id = str(uuid.uuid4())
+        self.message = message
+        self.status = "queued"
+        self.result: Any = None
+        self.error: Optional[str] = None
+        self.created_at = datetime.now()
+        self.finished_at: Optional[datetime] = None
+        self.expires_at: Optional[float] = None
+        self.done = asyncio.Event()
+        self.subscribers: List[JobSubscriber] = []
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "job_id": self.id,
+            "status": self.status,
+            "result": self.result,
+            "error": self.error,
+            "created_at": self.created_at,
+            "finished_at": self.finished_at,
+        }
+
+
+class ChatJobManager:
+    """In-process chat job queue served by a fixed pool of async workers"""
+
+    def __init__(self, workers: int = CHAT_JOB_WORKERS, queue_size: int = CHAT_JOB_QUEUE_SIZE, ttl: float = CHAT_JOB_TTL):
+        self.workers = workers
+        self.ttl = ttl
+        self._queue: asyncio.Queue = asyncio.Queue(maxsize=queue_size)
+        self._jobs: Dict[str, ChatJob] = {}
+
+    def submit(self, message: ChatMessage) -> ChatJob:
+        """Queue a message; raises asyncio.QueueFull when the backlog is full"""
+        job = ChatJob(message)
+        self._queue.put_nowait(job)
+        self._jobs[job.id] = job
+        return job
+
+    def get(self, job_id: str) -> Optional[ChatJob]:
+        return self._jobs.get(job_id)
+
+    async def wait(self, job: ChatJob, timeout: float) -> ChatJob:
+        """Long-poll: return once the job finishes or the timeout passes"""
+        try:
+            await asyncio.wait_for(job.done.wait(), timeout)
+        except asyncio.TimeoutError:
+            pass
+        return job
+
+    async def subscribe(self, job_id: str, send: JobSubscriber) -> bool:
+        """Push the job's final state to `send`; immediately if already finished"""
+        job = self._jobs.get(job_id)
+        if job is None:
+            return False
+        if job.done.is_set():
+            await send(self._frame(job))
+        else:
+            job.subscribers.append(send)
+        return True
+
+    @staticmethod
+    def _frame(job: ChatJob) -> str:
+        return json.dumps({"type": "chat_job", **job.to_dict()}, default=_json_default)
+
+    async def _worker(self, handler: JobHandler) -> None:
+        while True:
+            job = await self._queue.get()
+            job.status = "running"
+            try:
+                job.result = await handler(job.message)
+                job.status = "succeeded"
+            except Exception as e:
+                logger.error(f"Chat job {job.id} failed: {e}")
+                job.error = str(e)
+                job.status = "failed"
+            job.finished_at = datetime.now()
+            job.expires_at = time.monotonic() + self.ttl
+            job.done.set()
+            self._queue.task_done()
+
+            frame = self._frame(job)
+            for send in job.subscribers:
+                try:
+                    await send(frame)
+                except Exception as e:
+                    logger.error(f"Error pushing chat job {job.id}: {e}")
+            job.subscribers.clear()
+
+    def _expire(self) -> None:
+        now = time.monotonic()
+        expired = [job_id for job_id, job in self._jobs.items() if job.expires_at and job.expires_at <= now]
+        for job_id in expired:
+            del self._jobs[job_id]
+
+    def metrics(self) -> Dict[str, Any]:
+        return {"workers": self.workers, "queued": self._queue.qsize(), "tracked": len(self._jobs)}
+
+    async def run(self, handler: JobHandler) -> None:
+        """Start the worker pool and sweep expired jobs until cancelled"""
+        workers = [asyncio.create_task(self._worker(handler)) for _ in range(self.workers)]
+        try:
+            while True:
+                await asyncio.sleep(min(self.ttl, 60))
+                self._expire()
+        finally:
+            for worker in workers:
+                worker.cancel()
+
+
+# Global chat job manager
+chat_jobs = ChatJobManager()
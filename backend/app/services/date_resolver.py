@@ -0,0 +1,324 @@
+import calendar
+import os
+import re
+from datetime import date, datetime, time, timedelta
+from functools import lru_cache
+from typing import NamedTuple, Optional, Tuple
+from zoneinfo import ZoneInfo
+
+# Due-date phrases are matched against the precompiled patterns below. Results
+# are naive wall-clock datetimes in APP_TIMEZONE (server local time when unset),
+# matching the naive Task.due_date column.
+APP_TIMEZONE = os.getenv("APP_TIMEZONE")
+
+# Time used when a phrase names a day but no time
+DEFAULT_DUE_TIME = time(23, 59, 59)
+
+_NUMBERS = {
+    "a": 1, "an": 1, "one": 1, "two": 2, "three": 3, "four": 4, "five": 5, "six": 6,
+    "seven": 7, "eight": 8, "nine": 9, "ten": 10, "eleven": 11, "twelve": 12,
+}
+WEEKDAYS = {
+    "monday": 0, "mon": 0, "tuesday": 1, "tue": 1, "tues": 1, "wednesday": 2, "wed": 2,
+    "thursday": 3, "thu": 3, "thur": 3, "thurs": 3, "friday": 4, "fri": 4,
+    "saturday": 5, "sat": 5, "sunday": 6, "sun": 6,
+}
+_NAMED_TIMES = {
+    "noon": (12, 0), "midday": (12, 0), "midnight": (0, 0), "morning": (9, 0),
+    "afternoon": (15, 0), "evening": (18, 0), "tonight": (20, 0),
+}
+
+NUMBER_PATTERN = r"(\d+|" + "|".join(_NUMBERS) + r")"
+_UNIT = r"(minute|min|hour|hr|day|week|month)s?"
+WEEKDAY_PATTERN = "|".join(sorted(WEEKDAYS, key=len, reverse=True))
+_FULL_WEEKDAY_NAMES = "|".join(name for name in WEEKDAYS if name.endswith("day"))
+
+_ISO = re.compile(r"\b\d{4}-\d{2}-\d{2}(?:[t ]\d{2}:\d{2}(?::\d{2}(?:\.\d+)?)?(?:z|[+-]\d{2}:?\d{2})?)?\b")
+_RELATIVE = re.compile(rf"\bin\s+{NUMBER_PATTERN}\s+{_UNIT}\b|\b{NUMBER_PATTERN}\s+{_UNIT}\s+from\s+now\b")
+_DAY_WORD = re.compile(r"\b(?P<word>day\s+after\s+tomorrow|today|tonight|tomorrow|tmrw|yesterday)\b")
+# A time of day following a day name: "5pm", "17:30", "at 9", "noon"
+_TIME_PART = r"(?:at\s+)?(?:\d{1,2}(?::\d{2})?\s*(?:am|pm)|\d{1,2}:\d{2}|" + "|".join(_NAMED_TIMES) + r")\b|at\s+\d{1,2}\b"
+# Abbreviations ("sat", "sun", "wed") are ordinary words too: they only count
+# after "this", "next", "coming", "on" or "by", before a time of day, or as
+# the whole phrase
+_WEEKDAY = re.compile(
+    rf"\b(?:(?P<which>this|next|coming)\s+(?P<weekday>{WEEKDAY_PATTERN})|(?:on|by)\s+(?P<on>{WEEKDAY_PATTERN})"
+    rf"|(?P<full>{_FULL_WEEKDAY_NAMES})|(?P<timed>{WEEKDAY_PATTERN})(?=\s+(?:{_TIME_PART}))|^(?P<bare>{WEEKDAY_PATTERN})$)\b"
+)
+_PERIOD = re.compile(r"\b(?:(?P<which>this|next)\s+(?P<period>week|month|weekend)|end\s+of\s+(?:the\s+)?(?P<end>week|month))\b")
+# A clock time needs am/pm or hh:mm; a bare "at 5" is as likely "at 5 people"
+_CLOCK = re.compile(r"\b(?:at\s+)?(?P<hour>\d{1,2})(?::(?P<minute>\d{2}))?\s*(?P<ampm>am|pm)\b|\b(?:at\s+)?(?P<hhmm>\d{1,2}):(?P<mm>\d{2})\b")
+# A bare hour ("at 9") only counts next to a day ("today at 9") or on its own
+_AT_HOUR = re.compile(r"\bat\s+(?P<hour>\d{1,2})\b(?!\s*(?::\d|am\b|pm\b))")
+_NAMED_TIME = re.compile(r"\b(?P<named>" + "|".join(_NAMED_TIMES) + r")\b")
+# Named times inside free text ("evening walk") only count with a lead-in
+_NAMED_TIME_PHRASE = re.compile(r"\b(?:at|this|in\s+the)\s+(?:" + "|".join(_NAMED_TIMES) + r")\b")
+
+
+class _Parsed(NamedTuple):
+    # ("offset", days) | ("weekday", weekday, which) | ("months", n) | ("period", which, period)
+    day_rule: Optional[tuple]
+    time_of_day: Optional[Tuple[int, int]]
+    # "in 3 hours" style phrases are relative to the clock, not the day
+    clock_delta: Optional[timedelta]
+
+
+def app_timezone() -> Optional[ZoneInfo]:
+    """APP_TIMEZONE, or None for server local time"""
+    return ZoneInfo(APP_TIMEZONE) if APP_TIMEZONE else None
+
+
+def local_now() -> datetime:
+    """Naive current wall-clock time in APP_TIMEZONE"""
+    tz = app_timezone()
+    return datetime.now(tz).replace(tzinfo=None) if tz else datetime.now()
+
+
+def to_timestamp(value: datetime) -> float:
+    """Epoch seconds for a naive APP_TIMEZONE wall-clock datetime (or an aware one)"""
+    if value.tzinfo is None and app_timezone() is not None:
+        value = value.replace(tzinfo=app_timezone())
+    return value.timestamp()
+
+
+def _normalize(phrase: str) -> str:
+    return " ".join(phrase.lower().split())
+
+
+def parse_number(value: str) -> int:
+    """A count matched by NUMBER_PATTERN, in digits or words"""
+    return int(value) if value.isdigit() else _NUMBERS[value]
+
+
+def _parse_iso(text: str) -> Optional[datetime]:
+    match = _ISO.search(text)
+    if not match:
+        return None
+    try:
+        parsed = datetime.fromisoformat(match.group(0).upper().replace("Z", "+00:00"))
+    except ValueError:
+        return None
+    if parsed.tzinfo is not None:
+        parsed = parsed.astimezone(app_timezone()).replace(tzinfo=None)
+    elif len(match.group(0)) == 10:
+        parsed = datetime.combine(parsed.date(), DEFAULT_DUE_TIME)
+    return parsed
+
+
+def _parse_time(text: str) -> Optional[Tuple[int, int]]:
+    match = _CLOCK.search(text)
+    if match:
+        if match.group("hour"):
+            hour, minute = int(match.group("hour")), int(match.group("minute") or 0)
+            if hour > 12:
+                return None
+            hour = hour % 12 + (12 if match.group("ampm") == "pm" else 0)
+        else:
+            hour, minute = int(match.group("hhmm")), int(match.group("mm"))
+        if hour < 24 and minute < 60:
+            return hour, minute
+        return None
+    named = _NAMED_TIME.search(text)
+    return _NAMED_TIMES[named.group("named")] if named else None
+
+
+def _parse_at_hour(text: str) -> Optional[Tuple[int, int]]:
+    match = _AT_HOUR.search(text)
+    if not match:
+        return None
+    hour = int(match.group("hour"))
+    # "at 5" on its own almost always means the afternoon
+    if 1 <= hour <= 7:
+        hour += 12
+    return (hour, 0) if hour < 24 else None
+
+
+@lru_cache(maxsize=2048)
+def _parse(text: str) -> Optional[_Parsed]:
+    """Match a normalized phrase against the grammar (memoized per phrase)"""
+    time_of_day = _parse_time(text)
+    if time_of_day is None and _AT_HOUR.fullmatch(text):
+        time_of_day = _parse_at_hour(text)
+    # Only used with a day, which rules out "at 5 people"
+    day_time = time_of_day or _parse_at_hour(text)
+
+    relative = _RELATIVE.search(text)
+    if relative:
+        # Groups 1-2 are "in N units", groups 3-4 are "N units from now"
+        n = parse_number(relative.group(1) or relative.group(3))
+        unit = (relative.group(2) or relative.group(4))[:2]
+        if unit in ("mi", "ho", "hr"):
+            minutes = n * 60 if unit in ("ho", "hr") else n
+            return _Parsed(None, None, timedelta(minutes=minutes))
+        if unit == "mo":
+            return _Parsed(("months", n), day_time, None)
+        return _Parsed(("offset", n * 7 if unit == "we" else n), day_time, None)
+
+    word = _DAY_WORD.search(text)
+    if word:
+        offsets = {"today": 0, "tonight": 0, "tomorrow": 1, "tmrw": 1, "yesterday": -1}
+        key = word.group("word")
+        offset = 2 if key.startswith("day") else offsets[key]
+        return _Parsed(("offset", offset), day_time, None)
+
+    weekday = _WEEKDAY.search(text)
+    if weekday:
+        name = next(weekday.group(group) for group in ("weekday", "on", "full", "timed", "bare") if weekday.group(group))
+        return _Parsed(("weekday", WEEKDAYS[name], weekday.group("which")), day_time, None)
+
+    period = _PERIOD.search(text)
+    if period:
+        if period.group("end"):
+            return _Parsed(("period", "end", period.group("end")), day_time, None)
+        return _Parsed(("period", period.group("which"), period.group("period")), day_time, None)
+
+    if time_of_day:
+        return _Parsed(None, time_of_day, None)
+    return None
+
+
+def add_months(day: date, months: int) -> date:
+    """Same day `months` later, clamped to the end of a shorter month"""
+    month_index = day.month - 1 + months
+    year, month = day.year + month_index // 12, month_index % 12 + 1
+    return date(year, month, min(day.day, calendar.monthrange(year, month)[1]))
+
+
+def _week_start(day: date) -> date:
+    return day - timedelta(days=day.weekday())
+
+
+@lru_cache(maxsize=4096)
+def _day_for(rule: tuple, reference_day: date) -> date:
+    """Resolve a day rule against a reference day (memoized per rule and day)"""
+    kind = rule[0]
+    if kind == "offset":
+        return reference_day + timedelta(days=rule[1])
+    if kind == "months":
+        return add_months(reference_day, rule[1])
+    if kind == "weekday":
+        target, which = rule[1], rule[2]
+        if which == "next":
+            # The named day in the following calendar week
+            return _week_start(reference_day) + timedelta(days=7 + target)
+        days_ahead = (target - reference_day.weekday()) % 7
+        if days_ahead == 0 and which != "this":
+            days_ahead = 7
+        return reference_day + timedelta(days=days_ahead)
+
+    which, period = rule[1], rule[2]
+    if period == "week":
+        if which == "next":
+            return reference_day + timedelta(days=7)
+        return _week_start(reference_day) + timedelta(days=6)
+    if period == "weekend":
+        saturday = _week_start(reference_day) + timedelta(days=5)
+        return saturday + timedelta(days=7) if which == "next" else saturday
+    if which == "next":
+        return add_months(reference_day, 1)
+    return date(reference_day.year, reference_day.month, calendar.monthrange(reference_day.year, reference_day.month)[1])
+
+
+def find_date_phrase(text: Optional[str]) -> Optional[str]:
+    """The date and time words inside free text, e.g. "tomorrow at 3pm" from
+    "call bob tomorrow at 3pm"; None when the text names no date or time.
+
+    Pass the result to resolve_date instead of the whole message, so words in
+    a task title are not read as dates.
+    """
+    if not text:
+        return None
+    text = _normalize(text)
+    spans = sorted(
+        match.span()
+        for pattern in (_ISO, _RELATIVE, _DAY_WORD, _WEEKDAY, _PERIOD, _CLOCK)
+        for match in pattern.finditer(text)
+    )
+    named = _NAMED_TIME.finditer(text) if spans else _NAMED_TIME_PHRASE.finditer(text)
+    spans = sorted(spans + [match.span() for match in named])
+    # "at 9" only right before or after a day or time already found
+    spans = sorted(spans + [
+        match.span() for match in _AT_HOUR.finditer(text)
+        if any(
+            (stop <= match.start() and not text[stop:match.start()].strip())
+            or (match.end() <= start and not text[match.end():start].strip())
+            for start, stop in spans
+        )
+    ])
+
+    pieces, end = [], 0
+    for start, stop in spans:
+        if start >= end:
+            pieces.append(text[start:stop])
+            end = stop
+    return " ".join(pieces) or None
+
+
+def resolve_date(phrase: Optional[str], now: Optional[datetime] = None) -> Optional[datetime]:
+    """Resolve an ISO string or natural-language phrase to a due datetime.
+
+    Returns None when nothing in the phrase looks like a date.
+    """
+    if not phrase:
+        return None
+    text = _normalize(phrase)
+    iso = _parse_iso(text)
+    if iso is not None:
+        return iso
+
+    parsed = _parse(text)
+    if parsed is None:
+        return None
+    now = now or local_now()
+
+    if parsed.clock_delta is not None:
+        return (now + parsed.clock_delta).replace(second=0, microsecond=0)
+
+    if parsed.day_rule is None:
+        # Only a time of day: the next time the clock reads it
+        candidate = datetime.combine(now.date(), time(*parsed.time_of_day))
+        return candidate if candidate > now else candidate + timedelta(days=1)
+
+    day = _day_for(parsed.day_rule, now.date())
+    at = time(*parsed.time_of_day) if parsed.time_of_day else DEFAULT_DUE_TIME
+    return datetime.combine(day, at)
+
+
+def resolve_range(phrase: Optional[str], now: Optional[datetime] = None) -> Optional[Tuple[datetime, datetime]]:
+    """Resolve a phrase like "this week", "tomorrow" or "next month" to a [start, end] window"""
+    if not phrase:
+        return None
+    text = _normalize(phrase)
+    now = now or local_now()
+    today = now.date()
+
+    iso = _parse_iso(text)
+    if iso is not None:
+        first = last = iso.date()
+    else:
+        parsed = _parse(text)
+        if parsed is None or parsed.day_rule is None:
+            return None
+        rule = parsed.day_rule
+        if rule[0] == "period" and rule[1] != "end":
+            first, last = _period_bounds(rule[1], rule[2], today)
+        elif rule[0] == "period":
+            first, last = today, _day_for(rule, today)
+        else:
+            first = last = _day_for(rule, today)
+
+    return datetime.combine(first, time.min), datetime.combine(last, time.max)
+
+
+@lru_cache(maxsize=256)
+def _period_bounds(which: str, period: str, reference_day: date) -> Tuple[date, date]:
+    if period == "week":
+        start = _week_start(reference_day) + timedelta(days=7 if which == "next" else 0)
+        return start, start + timedelta(days=6)
+    if period == "weekend":
+        saturday = _week_start(reference_day) + timedelta(days=12 if which == "next" else 5)
+        return saturday, saturday + timedelta(days=1)
+    start = reference_day.replace(day=1)
+    if which == "next":
+        start = add_months(start, 1)
+    return start, start.replace(day=calendar.monthrange(start.year, start.month)[1])
@@ -0,0 +1,224 @@
+import asyncio
+import hashlib
+import json
+import logging
+import os
+import time
+from collections import OrderedDict
+from datetime import datetime, timedelta, timezone
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple
+
+from sqlalchemy import delete
+from sqlalchemy.exc import IntegrityError
+
+from app.database.connection import AsyncSessionLocal
+from app.models.task import IdempotencyRecord
+
+logger = logging.getLogger(__name__)
+
+# Stored responses are replayed for this long
+IDEMPOTENCY_TTL = float(os.getenv("IDEMPOTENCY_TTL_SECONDS", "86400"))
+# Responses also kept in memory, so most retries skip the database
+IDEMPOTENCY_CACHE_SIZE = int(os.getenv("IDEMPOTENCY_CACHE_SIZE", "1000"))
+# A claim whose request never finished (e.g. the process died) can be taken over after this
+IDEMPOTENCY_LOCK_SECONDS = float(os.getenv("IDEMPOTENCY_LOCK_SECONDS", "60"))
+# How long a retry waits on a first request still running in another process
+IDEMPOTENCY_WAIT_SECONDS = float(os.getenv("IDEMPOTENCY_WAIT_SECONDS", "30"))
+IDEMPOTENCY_PURGE_INTERVAL = float(os.getenv("IDEMPOTENCY_PURGE_INTERVAL_SECONDS", "600"))
+
+MAX_KEY_LENGTH = 255
+_POLL_SECONDS = 0.2
+
+Handler = Callable[[], Awaitable[Any]]
+
+
+class IdempotencyConflict(Exception):
+    """The key was already used for a request with a different body"""
+
+
+class IdempotencyInProgress(Exception):
+    """The first request with this key is still running elsewhere"""
+
+    def __init__(self, retry_after: int):
+        super().__init__("A request with this Idempotency-Key is still in progress")
+        self.retry_after = retry_after
+
+
+def fingerprint(*parts: Any) -> str:
+    """Stable hash of a request's body and options"""
+    return hashlib.sha256(json.dumps(parts, sort_keys=True, default=str).encode()).hexdigest()
+
+
+class IdempotencyCache:
+    """Replays the stored response of the first request made with an Idempotency-Key.
+
+    The first request claims the key with a row in `idempotency_keys`, runs,
+    and stores its JSON response for `ttl` seconds. Retries in this process
+    wait on the running request's future; retries elsewhere poll the row.
+    Completed responses are also kept in a bounded LRU. Only successful
+    responses are stored: when the handler raises, the claim is released and
+    the next retry runs again.
+    """
+
+    def __init__(
+        self,
+        ttl: float = IDEMPOTENCY_TTL,
+        cache_size: int = IDEMPOTENCY_CACHE_SIZE,
+        lock_seconds: float = IDEMPOTENCY_LOCK_SECONDS,
+        wait_seconds: float = IDEMPOTENCY_WAIT_SECONDS,
+        interval: float = IDEMPOTENCY_PURGE_INTERVAL,
+    ):
+        self.ttl = ttl
+        self.cache_size = cache_size
+        self.lock_seconds = lock_seconds
+        self.wait_seconds = wait_seconds
+        self.interval = interval
+        # key -> (fingerprint, response, monotonic expiry)
+        self._responses: "OrderedDict[str, Tuple[str, Any, float]]" = OrderedDict()
+        self._running: Dict[str, Tuple[str, asyncio.Future]] = {}
+        self.replayed = 0
+
+    @staticmethod
+    def scoped_key(scope: str, client: str, key: str) -> str:
+        return hashlib.sha256(f"{scope}\n{client}\n{key}".encode()).hexdigest()
+
+    def _remember(self, key: str, request_fingerprint: str, response: Any) -> None:
+        self._responses[key] = (request_fingerprint, response, time.monotonic() + self.ttl)
+        self._responses.move_to_end(key)
+        while len(self._responses) > self.cache_size:
+            self._responses.popitem(last=False)
+
+    def _replay(self, request_fingerprint: str, stored_fingerprint: str, response: Any) -> Any:
+        if stored_fingerprint != request_fingerprint:
+            raise IdempotencyConflict("Idempotency-Key was already used with a different request")
+        self.replayed += 1
+        return response
+
+    async def execute(self, key: str, request_fingerprint: str, handler: Handler) -> Tuple[Any, bool]:
+        """Run `handler` once per key; returns (response, replayed)"""
+        cached = self._responses.get(key)
+        if cached is not None and cached[2] > time.monotonic():
+            self._responses.move_to_end(key)
+            return self._replay(request_fingerprint, cached[0], cached[1]), True
+
+        running = self._running.get(key)
+        if running is not None:
+            await asyncio.wait({running[1]})
+            if running[1].cancelled():
+                # The first request's client went away before it finished
+                return await self.execute(key, request_fingerprint, handler)
+            return self._replay(request_fingerprint, running[0], running[1].result()), True
+
+        future = asyncio.get_running_loop().create_future()
+        self._running[key] = (request_fingerprint, future)
+        try:
+            stored = await self._claim(key, request_fingerprint)
+            if stored is not None:
+                future.set_result(stored[1])
+                self._remember(key, *stored)
+                return self._replay(request_fingerprint, *stored), True
+
+            try:
+                response = await handler()
+            except BaseException:
+                await self._release(key)
+                raise
+            await self._store(key, response)
+            self._remember(key, request_fingerprint, response)
+            future.set_result(response)
+            return response, False
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except Exception as e:
+            if not future.done():
+                future.set_exception(e)
+                # Mark retrieved, so a key nobody waited on doesn't log a warning
+                future.exception()
+            raise
+        finally:
+            del self._running[key]
+
+    async def _claim(self, key: str, request_fingerprint: str) -> Optional[Tuple[str, Any]]:
+        """Insert the claim row; returns (fingerprint, response) if a finished one exists"""
+        deadline = time.monotonic() + self.wait_seconds
+        while True:
+            now = datetime.now(timezone.utc)
+            async with AsyncSessionLocal() as db:
+                # Expired responses and abandoned claims free the key
+                await db.execute(
+                    delete(IdempotencyRecord).where(IdempotencyRecord.key == key, IdempotencyRecord.expires_at <= now)
+                )
+                db.add(IdempotencyRecord(
+                    key=key,
+                    fingerprint=request_fingerprint,
+                    expires_at=now + timedelta(seconds=self.lock_seconds),
+                ))
+                try:
+                    await db.commit()
+                    return None
+                except IntegrityError:
+                    await db.rollback()
+                record = await db.get(IdempotencyRecord, key)
+
+            if record is None:
+                continue
+            if record.response is not None:
+                return record.fingerprint, json.loads(record.response)
+            if record.fingerprint != request_fingerprint:
+                raise IdempotencyConflict("Idempotency-Key was already used with a different request")
+            if time.monotonic() >= deadline:
+                raise IdempotencyInProgress(max(1, int(self.wait_seconds)))
+            await asyncio.sleep(_POLL_SECONDS)
+
+    async def _store(self, key: str, response: Any) -> None:
+        try:
+            async with AsyncSessionLocal() as db:
+                record = await db.get(IdempotencyRecord, key)
+                if record is not None:
+                    record.response = json.dumps(response, default=str)
+                    record.expires_at = datetime.now(timezone.utc) + timedelta(seconds=self.ttl)
+                    await db.commit()
+        except Exception as e:
+            # The write already happened; only cross-process replay is lost
+            logger.error(f"Failed to store idempotent response: {e}")
+
+    async def _release(self, key: str) -> None:
+        try:
+            async with AsyncSessionLocal() as db:
+                await db.execute(
+                    delete(IdempotencyRecord).where(IdempotencyRecord.key == key, IdempotencyRecord.response.is_(None))
+                )
+                await db.commit()
+        except Exception as e:
+            logger.error(f"Failed to release idempotency key: {e}")
+
+    async def purge(self) -> int:
+        """Delete expired responses and abandoned claims; returns rows removed"""
+        async with AsyncSessionLocal() as db:
+            result = await db.execute(
+                delete(IdempotencyRecord).where(IdempotencyRecord.expires_at <= datetime.now(timezone.utc))
+            )
+            await db.commit()
+        now = time.monotonic()
+        for key in [key for key, entry in self._responses.items() if entry[2] <= now]:
+            del self._responses[key]
+        return result.rowcount
+
+    async def run(self) -> None:
+        """Background loop: purge, then wait `interval` seconds"""
+        while True:
+            try:
+                removed = await self.purge()
+                if removed:
+                    logger.info(f"Purged {removed} expired idempotency keys")
+            except Exception as e:
+                logger.error(f"Idempotency key purge failed: {e}")
+            await asyncio.sleep(self.interval)
+
+    def metrics(self) -> Dict[str, Any]:
+        return {"cached": len(self._responses), "running": len(self._running), "replayed": self.replayed}
+
+
+# Global replay cache for POST /api/tasks and POST /api/chat
+idempotency_cache = IdempotencyCache()
@@ -0,0 +1,322 @@
+import logging
+import os
+import re
+from collections import defaultdict
+from datetime import date, datetime, time, timedelta
+from functools import lru_cache
+from typing import Any, Collection, Dict, Iterable, Iterator, NamedTuple, Optional, Set, Tuple
+
+from app.models.task import TaskStatus
+from app.services.date_resolver import (
+    DEFAULT_DUE_TIME, NUMBER_PATTERN, WEEKDAYS, WEEKDAY_PATTERN, add_months, app_timezone, local_now, parse_number
+)
+
+logger = logging.getLogger(__name__)
+
+# Recurring tasks are stored once, with a rule; their occurrences are generated
+# on read for the requested due-date window. Rules are a subset of RFC 5545
+# RRULE: FREQ (DAILY, WEEKLY, MONTHLY, YEARLY), INTERVAL, BYDAY (weekly only),
+# COUNT and UNTIL, e.g. "FREQ=WEEKLY;BYDAY=MO".
+
+# Window used when a query gives no due-date bounds
+RECURRENCE_HORIZON_DAYS = int(os.getenv("RECURRENCE_HORIZON_DAYS", "14"))
+
+FREQUENCIES = ("DAILY", "WEEKLY", "MONTHLY", "YEARLY")
+_DAY_CODES = ("MO", "TU", "WE", "TH", "FR", "SA", "SU")
+_UNIT_FREQ = {"day": "DAILY", "week": "WEEKLY", "month": "MONTHLY", "year": "YEARLY"}
+_ADVERBS = {"daily": "DAILY", "weekly": "WEEKLY", "monthly": "MONTHLY", "yearly": "YEARLY", "annually": "YEARLY"}
+_DAY_GROUPS = {"weekday": (0, 1, 2, 3, 4), "weekend": (5, 6)}
+
+_DAY_NAME = rf"(?:{WEEKDAY_PATTERN}|weekday|weekend)s?"
+_EVERY_UNIT = re.compile(rf"^(?:every|each)\s+(?:(?P<other>other)\s+|(?P<count>{NUMBER_PATTERN})\s+)?(?P<unit>day|week|month|year)s?(?:\s+on\s+(?P<days>.+))?$")
+_EVERY_DAY_NAME = re.compile(rf"^(?:every|each|on)\s+(?:(?P<other>other)\s+)?(?P<days>{_DAY_NAME}(?:\s*(?:,|and|&)\s*{_DAY_NAME})*)$")
+_DAY_SPLIT = re.compile(r"\s*(?:,|\band\b|&)\s*")
+
+
+class RecurrenceRule(NamedTuple):
+    freq: str
+    interval: int = 1
+    # Weekday numbers (Monday = 0), only with FREQ=WEEKLY
+    weekdays: Tuple[int, ...] = ()
+    count: Optional[int] = None
+    until: Optional[datetime] = None
+
+    def __str__(self) -> str:
+        parts = [f"FREQ={self.freq}"]
+        if self.interval != 1:
+            parts.append(f"INTERVAL={self.interval}")
+        if self.weekdays:
+            parts.append("BYDAY=" + ",".join(_DAY_CODES[day] for day in self.weekdays))
+        if self.count is not None:
+            parts.append(f"COUNT={self.count}")
+        if self.until is not None:
+            parts.append(f"UNTIL={self.until:%Y%m%dT%H%M%S}")
+        return ";".join(parts)
+
+
+def _parse_until(value: str) -> datetime:
+    value = value.rstrip("Z")
+    try:
+        if "T" in value:
+            return datetime.strptime(value, "%Y%m%dT%H%M%S")
+        return datetime.combine(datetime.strptime(value, "%Y%m%d").date(), time.max)
+    except ValueError:
+        raise ValueError(f"Invalid UNTIL: {value}. Use YYYYMMDD or YYYYMMDDTHHMMSS")
+
+
+@lru_cache(maxsize=1024)
+def parse_rule(text: str) -> RecurrenceRule:
+    """Parse an RRULE string; raises ValueError for anything outside the supported subset"""
+    parts = {}
+    body = text.strip().upper()
+    if body.startswith("RRULE:"):
+        body = body[len("RRULE:"):]
+    for part in filter(None, body.split(";")):
+        key, sep, value = part.partition("=")
+        if not sep:
+            raise ValueError(f"Invalid recurrence rule part: {part}")
+        parts[key.strip()] = value.strip()
+
+    freq = parts.pop("FREQ", None)
+    if freq not in FREQUENCIES:
+        raise ValueError(f"Recurrence rule needs FREQ={'|'.join(FREQUENCIES)}")
+    try:
+        interval = int(parts.pop("INTERVAL", "1"))
+        count = int(parts.pop("COUNT")) if "COUNT" in parts else None
+    except ValueError:
+        raise ValueError("INTERVAL and COUNT must be whole numbers")
+    if interval < 1 or (count is not None and count < 1):
+        raise ValueError("INTERVAL and COUNT must be at least 1")
+
+    weekdays: Tuple[int, ...] = ()
+    if "BYDAY" in parts:
+        if freq != "WEEKLY":
+            raise ValueError("BYDAY is only supported with FREQ=WEEKLY")
+        codes = parts.pop("BYDAY").split(",")
+        if not set(codes) <= set(_DAY_CODES):
+            raise ValueError(f"BYDAY takes {','.join(_DAY_CODES)}")
+        weekdays = tuple(sorted({_DAY_CODES.index(code) for code in codes}))
+    until = _parse_until(parts.pop("UNTIL")) if "UNTIL" in parts else None
+
+    if parts:
+        raise ValueError(f"Unsupported recurrence rule parts: {', '.join(parts)}")
+    return RecurrenceRule(freq, interval, weekdays, count, until)
+
+
+def _weekdays(text: str) -> Tuple[int, ...]:
+    days = set()
+    for name in _DAY_SPLIT.split(text.strip()):
+        name = name.strip()
+        if name in _DAY_GROUPS or name.rstrip("s") in _DAY_GROUPS:
+            days.update(_DAY_GROUPS[name if name in _DAY_GROUPS else name.rstrip("s")])
+        elif name in WEEKDAYS:
+            days.add(WEEKDAYS[name])
+        elif name.endswith("s") and name[:-1] in WEEKDAYS:
+            days.add(WEEKDAYS[name[:-1]])
+        else:
+            raise ValueError(f"Unknown weekday: {name}")
+    return tuple(sorted(days))
+
+
+def normalize_rule(text: str) -> str:
+    """Canonical RRULE for an RRULE string or a phrase like "every monday" or "every 2 weeks".
+
+    Raises ValueError when the text is neither.
+    """
+    phrase = " ".join(text.lower().split())
+    if phrase.startswith(("freq=", "rrule:")):
+        return str(parse_rule(text))
+
+    if phrase in _ADVERBS:
+        return str(RecurrenceRule(_ADVERBS[phrase]))
+    match = _EVERY_UNIT.match(phrase)
+    if match:
+        interval = 2 if match.group("other") else parse_number(match.group("count")) if match.group("count") else 1
+        freq = _UNIT_FREQ[match.group("unit")]
+        weekdays: Tuple[int, ...] = ()
+        if match.group("days"):
+            if freq != "WEEKLY":
+                raise ValueError(f"Weekdays only go with weekly repeats: {text}")
+            weekdays = _weekdays(match.group("days"))
+        return str(RecurrenceRule(freq, interval, weekdays))
+    match = _EVERY_DAY_NAME.match(phrase)
+    if match:
+        weekdays = _weekdays(match.group("days"))
+        return str(RecurrenceRule("WEEKLY", 2 if match.group("other") else 1, weekdays))
+    raise ValueError(f"Unrecognized repeat: {text}. Try 'every monday', 'daily' or 'FREQ=WEEKLY;BYDAY=MO'")
+
+
+def _nth(rule: RecurrenceRule, start: datetime, index: int) -> datetime:
+    if rule.freq == "DAILY":
+        return start + timedelta(days=index * rule.interval)
+    if rule.freq == "WEEKLY":
+        return start + timedelta(weeks=index * rule.interval)
+    months = index * rule.interval * (12 if rule.freq == "YEARLY" else 1)
+    # Always from the start date, so the 31st comes back after a short month
+    return datetime.combine(add_months(start.date(), months), start.time())
+
+
+def _first_index(rule: RecurrenceRule, start: datetime, window_start: datetime) -> int:
+    """Index of an occurrence at or just before the window start"""
+    if window_start <= start:
+        return 0
+    if rule.freq in ("DAILY", "WEEKLY"):
+        step = timedelta(days=rule.interval * (7 if rule.freq == "WEEKLY" else 1))
+        return (window_start - start) // step
+    months = (window_start.year - start.year) * 12 + window_start.month - start.month
+    return max(0, months // (rule.interval * (12 if rule.freq == "YEARLY" else 1)) - 1)
+
+
+def _weekly_by_day(rule: RecurrenceRule, start: datetime, window_start: datetime, window_end: datetime) -> Iterator[datetime]:
+    first_monday = start.date() - timedelta(days=start.weekday())
+    step = 7 * rule.interval
+    # Listed days earlier in the first week than the start are not occurrences
+    skipped = sum(1 for day in rule.weekdays if datetime.combine(first_monday + timedelta(days=day), start.time()) < start)
+    week = 0 if window_start <= start else max(0, (window_start.date() - first_monday).days // step)
+    while True:
+        monday = first_monday + timedelta(days=week * step)
+        for position, day in enumerate(rule.weekdays):
+            index = week * len(rule.weekdays) + position - skipped
+            if index < 0:
+                continue
+            if rule.count is not None and index >= rule.count:
+                return
+            value = datetime.combine(monday + timedelta(days=day), start.time())
+            if value > window_end:
+                return
+            if value >= window_start:
+                yield value
+        week += 1
+
+
+def occurrences(rule: RecurrenceRule, start: datetime, window_start: datetime, window_end: datetime) -> Iterator[datetime]:
+    """Occurrences of a series starting at `start` that fall within [window_start, window_end].
+
+    Jumps straight to the window, so the work depends on the window size and
+    not on how long the series has been running.
+    """
+    if rule.until is not None:
+        window_end = min(window_end, rule.until)
+    if window_end < max(window_start, start):
+        return
+    if rule.weekdays:
+        yield from _weekly_by_day(rule, start, window_start, window_end)
+        return
+
+    index = _first_index(rule, start, window_start)
+    while rule.count is None or index < rule.count:
+        value = _nth(rule, start, index)
+        if value > window_end:
+            return
+        if value >= window_start:
+            yield value
+        index += 1
+
+
+def occurrence_on(rule: RecurrenceRule, start: datetime, day: date) -> Optional[datetime]:
+    """The occurrence falling on a given day, if any"""
+    return next(occurrences(rule, start, datetime.combine(day, time.min), datetime.combine(day, time.max)), None)
+
+
+def next_occurrence(
+    rule: RecurrenceRule, start: datetime, after: datetime, saved: Collection[datetime] = ()
+) -> Optional[datetime]:
+    """First occurrence at or after `after` that is not in `saved` (the
+    occurrences saved as their own rows); None once the series has ended"""
+    # Lazy: stops at the first unsaved occurrence
+    return next((value for value in occurrences(rule, start, after, datetime.max) if value not in saved), None)
+
+
+def start_of_day(now: Optional[datetime] = None) -> datetime:
+    """Midnight today in APP_TIMEZONE; occurrences from here on are still due"""
+    return datetime.combine((now or local_now()).date(), time.min)
+
+
+def is_occurrence(rule: RecurrenceRule, start: datetime, value: datetime) -> bool:
+    return next(occurrences(rule, start, value, value), None) == value
+
+
+def series_start(due_date: Optional[datetime]) -> datetime:
+    """First occurrence of a new series: its due date, or today at the default due time"""
+    return due_date or datetime.combine(local_now().date(), DEFAULT_DUE_TIME)
+
+
+def naive_local(value: datetime) -> datetime:
+    """Naive APP_TIMEZONE wall-clock time, the form due dates are stored in"""
+    if value.tzinfo is None:
+        return value
+    return value.astimezone(app_timezone()).replace(tzinfo=None)
+
+
+def window(after: Optional[datetime], before: Optional[datetime]) -> Tuple[datetime, datetime]:
+    """Due-date window to expand series over: the query's bounds, defaulting to
+    today through RECURRENCE_HORIZON_DAYS ahead"""
+    start = naive_local(after) if after else datetime.combine(local_now().date(), time.min)
+    end = naive_local(before) if before else start + timedelta(days=RECURRENCE_HORIZON_DAYS)
+    return start, end
+
+
+class OccurrenceTracker:
+    """Open recurring series and their saved occurrences, kept from TaskService
+    listener records, so a listener can find each series' next due occurrence
+    without a query. The series row's own due_date is only its first occurrence.
+    """
+
+    def __init__(self):
+        # Series id -> (rule, first occurrence, series record)
+        self._series: Dict[int, Tuple[RecurrenceRule, datetime, Dict[str, Any]]] = {}
+        self._saved: Dict[int, Set[datetime]] = defaultdict(set)
+
+    def __contains__(self, series_id: int) -> bool:
+        return series_id in self._series
+
+    def track(self, record: Dict[str, Any]) -> None:
+        """Add, update or drop a series row; only open series with a due date are kept"""
+        self._series.pop(record["id"], None)
+        if not record["recurrence"] or record["due_date"] is None or TaskStatus(record["status"]) == TaskStatus.COMPLETED:
+            return
+        try:
+            rule = parse_rule(record["recurrence"])
+        except ValueError as e:
+            logger.error(f"Skipping task {record['id']} with invalid recurrence '{record['recurrence']}': {e}")
+            return
+        self._series[record["id"]] = (rule, record["due_date"], record)
+
+    def save(self, series_id: int, occurrence_date: datetime) -> None:
+        self._saved[series_id].add(occurrence_date)
+
+    def apply(self, before: Optional[Dict[str, Any]], after: Optional[Dict[str, Any]]) -> Optional[int]:
+        """Track a task write. Returns the series id when an occurrence of a
+        tracked series was saved, changed or deleted, since its next due
+        occurrence may have moved"""
+        record = after or before
+        if record["recurrence"] or (before and before["recurrence"]):
+            if after is None:
+                self._series.pop(before["id"], None)
+                self._saved.pop(before["id"], None)
+            else:
+                self.track(after)
+        series_id = None
+        for value, saved in ((before, False), (after, True)):
+            if value and value["series_id"] and value["occurrence_date"]:
+                series_id = value["series_id"]
+                if saved:
+                    self._saved[series_id].add(value["occurrence_date"])
+                else:
+                    self._saved[series_id].discard(value["occurrence_date"])
+        return series_id if series_id in self._series else None
+
+    def next_due(self, series_id: int, after: datetime) -> Optional[datetime]:
+        """Next occurrence at or after `after` not saved as its own row"""
+        entry = self._series.get(series_id)
+        if entry is None:
+            return None
+        rule, start, _ = entry
+        return next_occurrence(rule, start, after, self._saved.get(series_id, ()))
+
+    def record(self, series_id: int) -> Optional[Dict[str, Any]]:
+        entry = self._series.get(series_id)
+        return entry[2] if entry else None
+
+    def series_ids(self) -> Iterable[int]:
+        return list(self._series)
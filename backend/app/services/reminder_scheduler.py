@@ -0,0 +1,193 @@
+import asyncio
+import heapq
+import json
+import logging
+import os
+import time
+from datetime import datetime, timedelta
+from itertools import count
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+from sqlalchemy.future import select
+
+from app.database.connection import AsyncSessionLocal
+from app.models.task import Task, TaskStatus
+from app.services import recurrence
+from app.services.date_resolver import local_now, to_timestamp
+from app.services.task_service import TaskService
+
+logger = logging.getLogger(__name__)
+
+# How long before the due date the reminder event fires
+REMINDER_LEAD_SECONDS = float(os.getenv("REMINDER_LEAD_MINUTES", "15")) * 60
+# Tasks that fell due this recently (e.g. while the app was down) are announced at startup
+REMINDER_CATCH_UP_SECONDS = float(os.getenv("REMINDER_CATCH_UP_MINUTES", "60")) * 60
+
+REMINDER = "task_reminder"
+OVERDUE = "task_overdue"
+
+# Heap entry: (fire_at epoch seconds, tie-breaker, task_id, event type, version)
+_Entry = Tuple[float, int, int, str, int]
+
+
+class ReminderScheduler:
+    """Fires reminder / overdue events for task due dates from a min-heap.
+
+    The heap is filled once at startup and then kept in sync by TaskService
+    writes, so no polling of the tasks table is needed. Rescheduled or deleted
+    tasks leave stale heap entries behind; they are skipped by version check
+    when popped and swept out when they outnumber the live ones. A recurring
+    series is scheduled for its next occurrence not saved as a row, and moves
+    on to the following one once that fires or is completed.
+    """
+
+    def __init__(self, lead_seconds: float = REMINDER_LEAD_SECONDS, catch_up_seconds: float = REMINDER_CATCH_UP_SECONDS):
+        self.lead_seconds = lead_seconds
+        self.catch_up_seconds = catch_up_seconds
+        self._heap: List[_Entry] = []
+        self._tasks: Dict[int, Dict[str, Any]] = {}
+        self._versions: Dict[int, int] = {}
+        self._counter = count()
+        self._wakeup = asyncio.Event()
+        self._occurrences = recurrence.OccurrenceTracker()
+
+    def __len__(self) -> int:
+        return len(self._tasks)
+
+    def schedule(self, task_id: int, title: str, due_date: datetime, occurrence: bool = False) -> None:
+        """(Re)schedule the reminder and overdue events for a task, or with
+        `occurrence` for the occurrence of series `task_id` due then"""
+        version = self._versions.get(task_id, 0) + 1
+        self._versions[task_id] = version
+        self._tasks[task_id] = {"id": task_id, "title": title, "due_date": due_date.isoformat()}
+        if occurrence:
+            self._tasks[task_id].update(series_id=task_id, occurrence_date=due_date.isoformat())
+
+        due_at = to_timestamp(due_date)
+        now = time.time()
+        if self.lead_seconds and due_at - self.lead_seconds > now:
+            self._push(due_at - self.lead_seconds, task_id, REMINDER, version)
+        self._push(due_at, task_id, OVERDUE, version)
+
+    def schedule_series(self, series_id: int, after: datetime) -> None:
+        """Schedule a series for its next unsaved occurrence at or after `after`"""
+        due_date = self._occurrences.next_due(series_id, after)
+        if due_date is None:
+            self.unschedule(series_id)
+        else:
+            self.schedule(series_id, self._occurrences.record(series_id)["title"], due_date, occurrence=True)
+
+    def unschedule(self, task_id: int) -> None:
+        """Drop any pending events for a task"""
+        if self._tasks.pop(task_id, None) is not None:
+            self._versions[task_id] += 1
+            self._maybe_compact()
+
+    def _push(self, fire_at: float, task_id: int, kind: str, version: int) -> None:
+        entry = (fire_at, next(self._counter), task_id, kind, version)
+        heapq.heappush(self._heap, entry)
+        if self._heap[0] is entry:
+            self._wakeup.set()
+
+    def _maybe_compact(self) -> None:
+        if len(self._heap) > 2 * len(self._tasks) + 64:
+            self._heap = [entry for entry in self._heap if self._is_live(entry)]
+            heapq.heapify(self._heap)
+
+    def _is_live(self, entry: _Entry) -> bool:
+        task_id, version = entry[2], entry[4]
+        return task_id in self._tasks and self._versions.get(task_id) == version
+
+    def apply(self, before: Optional[Dict[str, Any]], after: Optional[Dict[str, Any]]) -> None:
+        """TaskService listener: keep the heap in step with task writes"""
+        series_id = self._occurrences.apply(before, after)
+        if series_id is not None:
+            # An occurrence was completed, edited or deleted: the series' next one may differ
+            self.schedule_series(series_id, local_now())
+
+        if after is None:
+            self.unschedule(before["id"])
+            return
+
+        if after["due_date"] and after["status"] != TaskStatus.COMPLETED:
+            unchanged = (
+                before is not None
+                and before["id"] in self._tasks
+                and before["due_date"] == after["due_date"]
+                and before["recurrence"] == after["recurrence"]
+                and before["status"] != TaskStatus.COMPLETED
+            )
+            if unchanged:
+                self._tasks[after["id"]]["title"] = after["title"]
+            elif after["recurrence"]:
+                self.schedule_series(after["id"], local_now())
+            else:
+                self.schedule(after["id"], after["title"], after["due_date"])
+        else:
+            self.unschedule(after["id"])
+
+    async def load(self) -> None:
+        """Fill the heap with open tasks not yet overdue or overdue within the
+        catch-up window; the latter fire their overdue event right away"""
+        since = local_now() - timedelta(seconds=self.catch_up_seconds)
+        async with AsyncSessionLocal() as db:
+            result = await db.stream(
+                select(Task.id, Task.title, Task.due_date)
+                .where(Task.status != TaskStatus.COMPLETED, Task.due_date > since, Task.recurrence.is_(None))
+            )
+            async for task_id, title, due_date in result:
+                self.schedule(task_id, title, due_date)
+
+            series = await db.execute(
+                select(Task.id, Task.title, Task.status, Task.due_date, Task.recurrence)
+                .where(Task.status != TaskStatus.COMPLETED, Task.due_date.isnot(None), Task.recurrence.isnot(None))
+            )
+            for row in series:
+                self._occurrences.track(dict(row._mapping))
+            saved = await db.execute(
+                select(Task.series_id, Task.occurrence_date)
+                .where(Task.series_id.isnot(None), Task.occurrence_date > since)
+            )
+            for series_id, occurrence_date in saved:
+                self._occurrences.save(series_id, occurrence_date)
+        for series_id in self._occurrences.series_ids():
+            self.schedule_series(series_id, since)
+
+    def _pop_due(self, now: float) -> List[Tuple[str, Dict[str, Any]]]:
+        events = []
+        while self._heap and self._heap[0][0] <= now:
+            entry = heapq.heappop(self._heap)
+            if not self._is_live(entry):
+                continue
+            task_id, kind = entry[2], entry[3]
+            task = self._tasks[task_id]
+            events.append((kind, dict(task)))
+            if kind == OVERDUE and "occurrence_date" in task:
+                # On to the series' following occurrence
+                self.schedule_series(task_id, datetime.fromisoformat(task["occurrence_date"]) + timedelta(microseconds=1))
+            elif kind == OVERDUE:
+                # Nothing left to fire for this task until it is rescheduled
+                del self._tasks[task_id]
+        return events
+
+    async def run(self, broadcast: Callable[[str], Awaitable[None]]) -> None:
+        """Load due dates, then sleep until the next event and broadcast it"""
+        await self.load()
+        while True:
+            for kind, task in self._pop_due(time.time()):
+                try:
+                    await broadcast(json.dumps({"type": kind, "task": task}))
+                except Exception as e:
+                    logger.error(f"Error broadcasting {kind} for task {task['id']}: {e}")
+
+            self._wakeup.clear()
+            timeout = self._heap[0][0] - time.time() if self._heap else None
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=timeout)
+            except asyncio.TimeoutError:
+                pass
+
+
+# Global scheduler instance
+reminder_scheduler = ReminderScheduler()
+TaskService.add_listener(reminder_scheduler.apply)
@@ -0,0 +1,57 @@
+import asyncio
+import logging
+import os
+from datetime import datetime, timedelta, timezone
+
+from app.database.connection import AsyncSessionLocal
+from app.services.task_service import TaskService
+
+logger = logging.getLogger(__name__)
+
+# Completed tasks older than this many days are moved to the archive table
+ARCHIVE_AFTER_DAYS = float(os.getenv("ARCHIVE_AFTER_DAYS", "30"))
+ARCHIVE_BATCH_SIZE = int(os.getenv("ARCHIVE_BATCH_SIZE", "500"))
+ARCHIVE_INTERVAL = float(os.getenv("ARCHIVE_INTERVAL_SECONDS", "3600"))
+
+
+class TaskArchiver:
+    """Background job moving old completed tasks out of the hot table"""
+
+    def __init__(
+        self,
+        after_days: float = ARCHIVE_AFTER_DAYS,
+        batch_size: int = ARCHIVE_BATCH_SIZE,
+        interval: float = ARCHIVE_INTERVAL,
+    ):
+        self.after_days = after_days
+        self.batch_size = batch_size
+        self.interval = interval
+
+    async def archive(self) -> int:
+        """Archive everything past the cutoff, one short transaction per batch"""
+        cutoff = datetime.now(timezone.utc) - timedelta(days=self.after_days)
+        total = 0
+        while True:
+            async with AsyncSessionLocal() as db:
+                moved = await TaskService(db).archive_completed(cutoff, self.batch_size)
+            total += moved
+            if moved < self.batch_size:
+                break
+            # Let request handlers in between batches
+            await asyncio.sleep(0)
+        if total:
+            logger.info(f"Archived {total} completed task(s)")
+        return total
+
+    async def run(self) -> None:
+        """Background loop: archive, then wait `interval` seconds"""
+        while True:
+            try:
+                await self.archive()
+            except Exception as e:
+                logger.error(f"Task archival failed: {e}")
+            await asyncio.sleep(self.interval)
+
+
+# Global archiver instance
+task_archiver = TaskArchiver()
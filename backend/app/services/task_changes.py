@@ -0,0 +1,132 @@
+import asyncio
+import logging
+import os
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, Optional
+
+from sqlalchemy import delete, exists, func
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.future import select
+from sqlalchemy.orm import aliased
+
+from app.database.connection import AsyncSessionLocal
+from app.models.task import ChangeOp, Task, TaskChange, TaskChangeFloor
+
+logger = logging.getLogger(__name__)
+
+# Entries superseded by a newer change to the same task are dropped after this long
+CHANGE_LOG_COMPACT_AFTER_SECONDS = float(os.getenv("CHANGE_LOG_COMPACT_AFTER_SECONDS", "3600"))
+# Tombstones are kept this long; clients that last synced earlier must reload
+CHANGE_LOG_TOMBSTONE_DAYS = float(os.getenv("CHANGE_LOG_TOMBSTONE_DAYS", "30"))
+CHANGE_LOG_COMPACT_INTERVAL = float(os.getenv("CHANGE_LOG_COMPACT_INTERVAL_SECONDS", "600"))
+# A gap in sequence numbers younger than this may be a transaction that has
+# not committed yet, so reads stop in front of it
+CHANGE_LOG_SETTLE_SECONDS = 5.0
+
+
+def _utc(value: datetime) -> datetime:
+    # SQLite returns naive UTC timestamps
+    return value if value.tzinfo else value.replace(tzinfo=timezone.utc)
+
+
+class TaskChangeLog:
+    """Reads deltas from the task change log and compacts it in the background.
+
+    TaskService appends one entry per written task in the write's own
+    transaction. Compaction keeps only the newest entry per task and prunes
+    old tombstones, so a sync costs O(changes since the client's last seq)
+    and the log stays O(tasks).
+    """
+
+    def __init__(
+        self,
+        compact_after: float = CHANGE_LOG_COMPACT_AFTER_SECONDS,
+        tombstone_days: float = CHANGE_LOG_TOMBSTONE_DAYS,
+        interval: float = CHANGE_LOG_COMPACT_INTERVAL,
+        settle_seconds: float = CHANGE_LOG_SETTLE_SECONDS,
+    ):
+        self.compact_after = compact_after
+        self.tombstone_days = tombstone_days
+        self.interval = interval
+        self.settle_seconds = settle_seconds
+
+    async def changes(self, db: AsyncSession, since: Optional[int], limit: int = 500) -> Dict[str, Any]:
+        """Latest change per task after `since`, oldest first.
+
+        Without `since`, returns just the current position to start syncing from.
+        """
+        floor = (await db.execute(select(TaskChangeFloor.seq))).scalar() or 0
+        # The newest entry may itself have been a pruned tombstone
+        latest = max((await db.execute(select(func.max(TaskChange.seq)))).scalar() or 0, floor)
+        if since is None:
+            return {"changes": [], "next_since": latest}
+        if since < floor:
+            return {"changes": [], "next_since": latest, "reset": True}
+
+        result = await db.execute(
+            select(TaskChange, Task)
+            .outerjoin(Task, Task.id == TaskChange.task_id)
+            .where(TaskChange.seq > since)
+            .order_by(TaskChange.seq)
+            .limit(limit + 1)
+        )
+        rows = result.all()
+        settled_before = datetime.now(timezone.utc) - timedelta(seconds=self.settle_seconds)
+
+        entries: Dict[int, Dict[str, Any]] = {}
+        next_since = since
+        has_more = len(rows) > limit
+        for change, task in rows[:limit]:
+            if change.seq != next_since + 1 and _utc(change.changed_at) > settled_before:
+                has_more = True
+                break
+            next_since = change.seq
+            # Re-insert so each task sits at the position of its latest change
+            entries.pop(change.task_id, None)
+            if change.op == ChangeOp.UPSERT and task is not None:
+                entries[change.task_id] = {"seq": change.seq, "op": "upsert", "task_id": change.task_id, "task": task}
+            else:
+                # Deleted after this entry was written; its tombstone follows
+                entries[change.task_id] = {"seq": change.seq, "op": "delete", "task_id": change.task_id}
+        return {"changes": list(entries.values()), "next_since": next_since, "has_more": has_more}
+
+    async def compact(self) -> int:
+        """Drop superseded entries and expired tombstones; returns entries removed"""
+        now = datetime.now(timezone.utc)
+        newer = aliased(TaskChange)
+        async with AsyncSessionLocal() as db:
+            superseded = await db.execute(
+                delete(TaskChange).where(
+                    TaskChange.changed_at < now - timedelta(seconds=self.compact_after),
+                    exists().where(newer.task_id == TaskChange.task_id, newer.seq > TaskChange.seq),
+                )
+            )
+            removed = superseded.rowcount
+
+            expired = TaskChange.op == ChangeOp.DELETE, TaskChange.changed_at < now - timedelta(days=self.tombstone_days)
+            through = (await db.execute(select(func.max(TaskChange.seq)).where(*expired))).scalar()
+            if through is not None:
+                pruned = await db.execute(delete(TaskChange).where(*expired, TaskChange.seq <= through))
+                removed += pruned.rowcount
+                floor = await db.get(TaskChangeFloor, 1)
+                if floor is None:
+                    db.add(TaskChangeFloor(id=1, seq=through))
+                else:
+                    floor.seq = max(floor.seq, through)
+            await db.commit()
+        if removed:
+            logger.info(f"Compacted {removed} task change log entries")
+        return removed
+
+    async def run(self) -> None:
+        """Background loop: compact, then wait `interval` seconds"""
+        while True:
+            try:
+                await self.compact()
+            except Exception as e:
+                logger.error(f"Task change log compaction failed: {e}")
+            await asyncio.sleep(self.interval)
+
+
+# Global change log reader / compactor
+task_change_log = TaskChangeLog()
@@ -0,0 +1,153 @@
+import logging
+import os
+import zlib
+from collections import defaultdict
+from typing import Any, Dict, List, NamedTuple, Optional, Set
+
+import numpy as np
+from sqlalchemy.future import select
+
+from app.database.connection import AsyncSessionLocal
+from app.models.task import Task, TaskStatus
+from app.services.text_terms import words
+
+logger = logging.getLogger(__name__)
+
+# What TaskService.create_task does with a near-duplicate: warn | merge | reject
+DUPLICATE_POLICY = os.getenv("DUPLICATE_POLICY", "warn")
+DUPLICATE_POLICIES = ("warn", "merge", "reject")
+# Estimated Jaccard similarity of title shingles at which a task counts as a duplicate
+DUPLICATE_THRESHOLD = float(os.getenv("DUPLICATE_THRESHOLD", "0.6"))
+
+# 16 bands of 4 rows: titles around 0.5 similarity become candidates about half the time
+NUM_PERM = 64
+BANDS = 16
+ROWS = NUM_PERM // BANDS
+SHINGLE_SIZE = 3
+
+_PRIME = (1 << 31) - 1
+_rng = np.random.default_rng(20240917)
+_A = _rng.integers(1, _PRIME, NUM_PERM, dtype=np.uint64)
+_B = _rng.integers(0, _PRIME, NUM_PERM, dtype=np.uint64)
+
+
+class DuplicateMatch(NamedTuple):
+    task_id: int
+    title: str
+    similarity: float
+
+
+class DuplicateTaskError(Exception):
+    """Raised by create_task under the "reject" policy"""
+
+    def __init__(self, match: DuplicateMatch):
+        super().__init__(f"Task looks like a duplicate of #{match.task_id} '{match.title}'")
+        self.match = match
+
+
+def _shingles(title: str) -> Set[int]:
+    text = " ".join(words(title)) or title.lower().strip()
+    if len(text) <= SHINGLE_SIZE:
+        return {zlib.crc32(text.encode("utf-8"))}
+    return {zlib.crc32(text[i : i + SHINGLE_SIZE].encode("utf-8")) for i in range(len(text) - SHINGLE_SIZE + 1)}
+
+
+def minhash(title: str) -> np.ndarray:
+    """MinHash signature of a title's character shingles (after stemming)"""
+    hashes = np.fromiter(_shingles(title), dtype=np.uint64)
+    # (a * x + b) mod p for every permutation and shingle at once
+    return ((_A[:, None] * (hashes[None, :] & np.uint64(_PRIME)) + _B[:, None]) % np.uint64(_PRIME)).min(axis=1)
+
+
+class DuplicateIndex:
+    """MinHash/LSH index over the titles of open tasks.
+
+    Each signature is cut into bands; tasks sharing any band bucket are
+    candidates and are confirmed by comparing full signatures. Lookups touch
+    BANDS buckets regardless of table size. Completed tasks drop out, since
+    repeating a finished chore is not a duplicate.
+    """
+
+    def __init__(self, threshold: float = DUPLICATE_THRESHOLD):
+        self.threshold = threshold
+        self._signatures: Dict[int, np.ndarray] = {}
+        self._titles: Dict[int, str] = {}
+        self._buckets: List[Dict[bytes, Set[int]]] = [defaultdict(set) for _ in range(BANDS)]
+        # Tasks closed or deleted while load() is streaming must not be re-added by it
+        self._loading = False
+        self._removed_during_load: Set[int] = set()
+
+    def __len__(self) -> int:
+        return len(self._signatures)
+
+    @staticmethod
+    def _bands(signature: np.ndarray) -> List[bytes]:
+        return [signature[band * ROWS : (band + 1) * ROWS].tobytes() for band in range(BANDS)]
+
+    def add(self, task_id: int, title: str) -> None:
+        self._discard(task_id)
+        signature = minhash(title)
+        self._signatures[task_id] = signature
+        self._titles[task_id] = title
+        for band, key in enumerate(self._bands(signature)):
+            self._buckets[band][key].add(task_id)
+
+    def remove(self, task_id: int) -> None:
+        if self._loading:
+            self._removed_during_load.add(task_id)
+        self._discard(task_id)
+
+    def _discard(self, task_id: int) -> None:
+        signature = self._signatures.pop(task_id, None)
+        if signature is None:
+            return
+        del self._titles[task_id]
+        for band, key in enumerate(self._bands(signature)):
+            bucket = self._buckets[band][key]
+            bucket.discard(task_id)
+            if not bucket:
+                del self._buckets[band][key]
+
+    def find(self, title: str, exclude_id: Optional[int] = None) -> Optional[DuplicateMatch]:
+        """Most similar open task at or above the threshold, if any"""
+        signature = minhash(title)
+        candidates: Set[int] = set()
+        for band, key in enumerate(self._bands(signature)):
+            candidates |= self._buckets[band].get(key, set())
+        candidates.discard(exclude_id)
+
+        best: Optional[DuplicateMatch] = None
+        for task_id in candidates:
+            similarity = float(np.mean(self._signatures[task_id] == signature))
+            if similarity >= self.threshold and (best is None or similarity > best.similarity):
+                best = DuplicateMatch(task_id, self._titles[task_id], similarity)
+        return best
+
+    def apply(self, before: Optional[Dict[str, Any]], after: Optional[Dict[str, Any]]) -> None:
+        """TaskService listener: index open tasks by title"""
+        if after is None or after["status"] == TaskStatus.COMPLETED:
+            self.remove((after or before)["id"])
+        elif before is None or before["title"] != after["title"] or after["id"] not in self._signatures:
+            self.add(after["id"], after["title"])
+
+    async def load(self) -> None:
+        """Index the titles of all open tasks"""
+        self._loading = True
+        try:
+            async with AsyncSessionLocal() as db:
+                result = await db.stream(
+                    select(Task.id, Task.title).where(Task.status != TaskStatus.COMPLETED)
+                )
+                async for task_id, title in result:
+                    if task_id not in self._signatures and task_id not in self._removed_during_load:
+                        self.add(task_id, title)
+            logger.info(f"Duplicate index loaded: {len(self)} open tasks")
+        except Exception as e:
+            logger.error(f"Failed to load duplicate index: {e}")
+        finally:
+            self._loading = False
+            self._removed_during_load.clear()
+
+
+# Global duplicate index; TaskService registers it as a listener
+duplicate_index = DuplicateIndex()
@@ -0,0 +1,152 @@
+import heapq
+import logging
+from collections import defaultdict
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Set, Tuple
+
+from sqlalchemy.future import select
+
+from app.database.connection import AsyncSessionLocal
+from app.models.task import Task, TaskDependency, TaskPriority, TaskStatus
+
+logger = logging.getLogger(__name__)
+
+_PRIORITY_RANK = {priority: rank for rank, priority in enumerate(TaskPriority)}
+
+
+class TaskGraphError(ValueError):
+    """Invalid subtask or dependency link, e.g. one that would form a cycle"""
+
+
+class TaskGraphIndex:
+    """In-memory index of open tasks, subtasks and blocking edges.
+
+    A task is ready when it is open, none of its blockers is open and none of
+    its subtasks is open - the first layer of a topological order of the open
+    work. Readiness is re-evaluated only for the tasks a write touches (the
+    task, its dependents and its parent), so `ready()` is a heap selection
+    over the ready set.
+    """
+
+    def __init__(self):
+        # Open task id -> (priority, due_date, parent_id)
+        self._open: Dict[int, Tuple[TaskPriority, Optional[datetime], Optional[int]]] = {}
+        self._blockers: Dict[int, Set[int]] = defaultdict(set)
+        self._dependents: Dict[int, Set[int]] = defaultdict(set)
+        self._open_children: Dict[int, Set[int]] = defaultdict(set)
+        self._ready: Set[int] = set()
+        # Tasks closed or deleted while load() is streaming must not be re-added by it
+        self._loading = False
+        self._removed_during_load: Set[int] = set()
+
+    def __len__(self) -> int:
+        return len(self._open)
+
+    def _refresh(self, task_id: int) -> None:
+        if task_id not in self._open:
+            self._ready.discard(task_id)
+            return
+        blocked = self._open_children.get(task_id) or any(
+            blocker in self._open for blocker in self._blockers.get(task_id, ())
+        )
+        if blocked:
+            self._ready.discard(task_id)
+        else:
+            self._ready.add(task_id)
+
+    def _refresh_around(self, task_id: int, parent_id: Optional[int]) -> None:
+        self._refresh(task_id)
+        for dependent in self._dependents.get(task_id, ()):
+            self._refresh(dependent)
+        if parent_id is not None:
+            self._refresh(parent_id)
+
+    def _set_open(self, record: Dict[str, Any]) -> None:
+        self._open[record["id"]] = (record["priority"], record["due_date"], record["parent_id"])
+        if record["parent_id"] is not None:
+            self._open_children[record["parent_id"]].add(record["id"])
+
+    def _set_closed(self, task_id: int) -> Optional[int]:
+        entry = self._open.pop(task_id, None)
+        parent_id = entry[2] if entry else None
+        if parent_id is not None:
+            children = self._open_children.get(parent_id)
+            if children is not None:
+                children.discard(task_id)
+                if not children:
+                    del self._open_children[parent_id]
+        return parent_id
+
+    def apply(self, before: Optional[Dict[str, Any]], after: Optional[Dict[str, Any]]) -> None:
+        """TaskService listener: track open tasks and their parents"""
+        task_id = (after or before)["id"]
+        if self._loading:
+            self._removed_during_load.add(task_id)
+        old_parent = self._set_closed(task_id)
+        if after is not None and after["status"] != TaskStatus.COMPLETED:
+            self._set_open(after)
+        if after is None:
+            self._drop_edges(task_id)
+        new_parent = after["parent_id"] if after is not None else None
+        self._refresh_around(task_id, new_parent)
+        if old_parent is not None and old_parent != new_parent:
+            self._refresh(old_parent)
+
+    def add_edge(self, task_id: int, blocked_by_id: int) -> None:
+        self._blockers[task_id].add(blocked_by_id)
+        self._dependents[blocked_by_id].add(task_id)
+        self._refresh(task_id)
+
+    def remove_edge(self, task_id: int, blocked_by_id: int) -> None:
+        self._blockers.get(task_id, set()).discard(blocked_by_id)
+        self._dependents.get(blocked_by_id, set()).discard(task_id)
+        self._refresh(task_id)
+
+    def _drop_edges(self, task_id: int) -> None:
+        for blocker in self._blockers.pop(task_id, set()):
+            self._dependents.get(blocker, set()).discard(task_id)
+        for dependent in self._dependents.pop(task_id, set()):
+            self._blockers.get(dependent, set()).discard(task_id)
+            self._refresh(dependent)
+
+    def ready(self, limit: int = 20) -> List[int]:
+        """Ready task ids: highest priority first, then earliest due date"""
+        def order(task_id: int):
+            priority, due_date, _ = self._open[task_id]
+            return (-_PRIORITY_RANK[priority], due_date is None, due_date or datetime.max, task_id)
+
+        return heapq.nsmallest(limit, self._ready, key=order)
+
+    def ready_ids(self) -> Set[int]:
+        """Every ready task id, unordered"""
+        return set(self._ready)
+
+    async def load(self) -> None:
+        """Read open tasks and all dependency edges"""
+        self._loading = True
+        try:
+            async with AsyncSessionLocal() as db:
+                tasks = await db.stream(
+                    select(Task.id, Task.priority, Task.due_date, Task.parent_id)
+                    .where(Task.status != TaskStatus.COMPLETED)
+                )
+                async for row in tasks:
+                    record = dict(row._mapping)
+                    if record["id"] not in self._open and record["id"] not in self._removed_during_load:
+                        self._set_open(record)
+                edges = await db.stream(select(TaskDependency.task_id, TaskDependency.blocked_by_id))
+                async for task_id, blocked_by_id in edges:
+                    self._blockers[task_id].add(blocked_by_id)
+                    self._dependents[blocked_by_id].add(task_id)
+            for task_id in list(self._open):
+                self._refresh(task_id)
+            logger.info(f"Task graph loaded: {len(self._open)} open tasks, {len(self._ready)} ready")
+        except Exception as e:
+            logger.error(f"Failed to load task graph: {e}")
+        finally:
+            self._loading = False
+            self._removed_during_load.clear()
+
+
+# Global graph index; TaskService registers it as a listener
+task_graph = TaskGraphIndex()
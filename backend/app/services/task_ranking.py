@@ -0,0 +1,280 @@
+import logging
+import os
+import time
+from collections import defaultdict
+from datetime import datetime, timedelta
+from typing import Any, Dict, Iterable, List, NamedTuple, Optional, Set, Tuple
+
+import numpy as np
+from sqlalchemy import Float, case, cast, exists, extract, func, literal
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.future import select
+from sqlalchemy.orm import aliased
+
+from app.models.task import Task, TaskDependency, TaskPriority, TaskStatus
+from app.services import recurrence
+from app.services.date_resolver import local_now
+from app.services.task_graph import task_graph
+from app.services.task_snapshot import task_snapshot
+
+logger = logging.getLogger(__name__)
+
+# Weight of each score component; every component is scaled to 0..1
+TASK_RANK_WEIGHT_PRIORITY = float(os.getenv("TASK_RANK_WEIGHT_PRIORITY", "3"))
+TASK_RANK_WEIGHT_DUE = float(os.getenv("TASK_RANK_WEIGHT_DUE", "2"))
+TASK_RANK_WEIGHT_OVERDUE = float(os.getenv("TASK_RANK_WEIGHT_OVERDUE", "1.5"))
+TASK_RANK_WEIGHT_AGE = float(os.getenv("TASK_RANK_WEIGHT_AGE", "0.5"))
+# Due-date urgency rises from 0 to 1 over this many days before the due date
+TASK_RANK_DUE_HORIZON_DAYS = float(os.getenv("TASK_RANK_DUE_HORIZON_DAYS", "7"))
+# Age reaches its full weight once a task has been open this many days
+TASK_RANK_AGE_HORIZON_DAYS = float(os.getenv("TASK_RANK_AGE_HORIZON_DAYS", "30"))
+
+_EPOCH = datetime(1970, 1, 1)
+_PRIORITY_RANK = {priority: rank for rank, priority in enumerate(TaskPriority)}
+_TOP_PRIORITY = len(TaskPriority) - 1
+# julianday() of the Unix epoch
+_JULIAN_EPOCH = 2440587.5
+
+
+def _wall_seconds(value: datetime) -> float:
+    """Naive wall-clock time as epoch seconds, the way due dates are stored"""
+    return (value - _EPOCH).total_seconds()
+
+
+def _timestamp(value: datetime) -> float:
+    # Naive created_at values come from the database clock in UTC
+    return value.timestamp() if value.tzinfo is not None else _wall_seconds(value)
+
+
+class Ranked(NamedTuple):
+    task_id: int
+    score: float
+    # For a recurring task's series row: the occurrence that was ranked
+    occurrence_date: Optional[datetime] = None
+
+
+def _duration(seconds: float) -> str:
+    for unit, size in (("day", 86400), ("hour", 3600), ("minute", 60)):
+        if seconds >= size:
+            count = int(seconds // size)
+            return f"{count} {unit}{'s' if count != 1 else ''}"
+    return "less than a minute"
+
+
+class TaskRanker:
+    """Scores open tasks to answer "what should I do next" without the LLM.
+
+    score = priority weight * priority (low 0 .. urgent 1)
+          + due weight      * due-date urgency (0 beyond the horizon, 1 when due)
+          + overdue weight  * overdue (0 or 1)
+          + age weight      * age (1 after the age horizon)
+
+    With the task snapshot loaded the score is computed over its arrays with
+    NumPy and the top k selected by partition; otherwise the same formula runs
+    in SQL and the database keeps the top k (ORDER BY score LIMIT k). Ties go
+    to the older task. A recurring task is ranked by its next due occurrence
+    not yet saved as a row (from the start of today, so one due earlier today
+    counts as overdue); saved occurrences that are still open rank as rows.
+    """
+
+    def __init__(
+        self,
+        priority: float = TASK_RANK_WEIGHT_PRIORITY,
+        due: float = TASK_RANK_WEIGHT_DUE,
+        overdue: float = TASK_RANK_WEIGHT_OVERDUE,
+        age: float = TASK_RANK_WEIGHT_AGE,
+        due_horizon_days: float = TASK_RANK_DUE_HORIZON_DAYS,
+        age_horizon_days: float = TASK_RANK_AGE_HORIZON_DAYS,
+    ):
+        self.priority = priority
+        self.due = due
+        self.overdue = overdue
+        self.age = age
+        self.due_horizon = due_horizon_days * 86400
+        self.age_horizon = age_horizon_days * 86400
+
+    async def rank(
+        self, db: AsyncSession, limit: int = 5, ready_only: bool = False, now: Optional[datetime] = None
+    ) -> List[Ranked]:
+        """The `limit` best open tasks, best first.
+
+        `ready_only` skips tasks still waiting on an open blocker or subtask.
+        """
+        now = now or local_now()
+        if task_snapshot.ready:
+            return self._rank_arrays(limit, ready_only, now)
+        return await self._rank_sql(db, limit, ready_only, now)
+
+    def _scores(self, priority: np.ndarray, due_date: np.ndarray, created_at: np.ndarray, now: datetime) -> np.ndarray:
+        """Scores from priority indexes and epoch-second due/created times"""
+        # NaN (no due date) gives no urgency and compares False for overdue
+        until_due = due_date - _wall_seconds(now)
+        due = np.nan_to_num(np.clip(1 - until_due / self.due_horizon, 0, 1))
+        age = np.clip((time.time() - created_at) / self.age_horizon, 0, 1)
+        return (
+            self.priority * priority / _TOP_PRIORITY
+            + self.due * due
+            + self.overdue * (until_due < 0)
+            + self.age * age
+        )
+
+    @staticmethod
+    def _top(ids: np.ndarray, scores: np.ndarray, limit: int) -> Tuple[np.ndarray, np.ndarray]:
+        if limit < len(ids):
+            # Keep only rows that can make the top `limit`; ties at the cut stay in
+            kth = np.partition(-scores, limit - 1)[limit - 1]
+            keep = -scores <= kth
+            ids, scores = ids[keep], scores[keep]
+        order = np.lexsort((ids, -scores))[:limit]
+        return ids[order], scores[order]
+
+    def _rank_arrays(self, limit: int, ready_only: bool, now: datetime) -> List[Ranked]:
+        columns = task_snapshot.open_columns()
+        series = task_snapshot.open_series()
+        if ready_only:
+            ready = task_graph.ready_ids()
+            mask = np.isin(columns["ids"], np.fromiter(ready, dtype=np.int64, count=len(ready)))
+            columns = {name: column[mask] for name, column in columns.items()}
+            series = [row for row in series if row["id"] in ready]
+
+        scores = self._scores(columns["priority"], columns["due_date"], columns["created_at"], now)
+        ids, scores = self._top(columns["ids"], scores, limit)
+        ranked = [Ranked(task_id, round(score, 4)) for task_id, score in zip(ids.tolist(), scores.tolist())]
+        if series:
+            saved = task_snapshot.saved_occurrences([row["id"] for row in series], recurrence.start_of_day(now))
+            ranked = self._merge(ranked, self._rank_series(series, saved, limit, now), limit)
+        return ranked
+
+    def _rank_series(
+        self, series: Iterable[Dict[str, Any]], saved: Dict[int, Set[datetime]], limit: int, now: datetime
+    ) -> List[Ranked]:
+        """Series rows scored by their next occurrence from today on that is not saved as a row"""
+        today = recurrence.start_of_day(now)
+        candidates = []
+        for row in series:
+            try:
+                rule = recurrence.parse_rule(row["recurrence"])
+            except ValueError as e:
+                logger.error(f"Not ranking task {row['id']} with invalid recurrence '{row['recurrence']}': {e}")
+                continue
+            occurrence_date = recurrence.next_occurrence(rule, row["due_date"], today, saved.get(row["id"], ()))
+            if occurrence_date is not None:
+                candidates.append((row, occurrence_date))
+        if not candidates:
+            return []
+
+        ids = np.array([row["id"] for row, _ in candidates], dtype=np.int64)
+        scores = self._scores(
+            np.array([_PRIORITY_RANK[row["priority"]] for row, _ in candidates], dtype=np.float64),
+            np.array([_wall_seconds(occurrence_date) for _, occurrence_date in candidates]),
+            np.array([_timestamp(row["created_at"]) for row, _ in candidates]),
+            now,
+        )
+        ids, scores = self._top(ids, scores, limit)
+        occurrence_dates = {row["id"]: occurrence_date for row, occurrence_date in candidates}
+        return [
+            Ranked(task_id, round(score, 4), occurrence_dates[task_id])
+            for task_id, score in zip(ids.tolist(), scores.tolist())
+        ]
+
+    @staticmethod
+    def _by_series(pairs) -> Dict[int, Set[datetime]]:
+        saved = defaultdict(set)
+        for series_id, occurrence_date in pairs:
+            saved[series_id].add(occurrence_date)
+        return saved
+
+    @staticmethod
+    def _merge(tasks: List[Ranked], series: List[Ranked], limit: int) -> List[Ranked]:
+        return sorted(tasks + series, key=lambda ranked: (-ranked.score, ranked.task_id))[:limit]
+
+    @staticmethod
+    def _seconds(column, dialect: str):
+        if dialect == "sqlite":
+            return (func.julianday(column) - _JULIAN_EPOCH) * 86400.0
+        return cast(extract("epoch", column), Float)
+
+    @staticmethod
+    def _ready_conditions() -> list:
+        """No open blocker and no open subtask"""
+        blocker = aliased(Task)
+        child = aliased(Task)
+        return [
+            ~exists().where(
+                TaskDependency.task_id == Task.id,
+                blocker.id == TaskDependency.blocked_by_id,
+                blocker.status != TaskStatus.COMPLETED,
+            ),
+            ~exists().where(child.parent_id == Task.id, child.status != TaskStatus.COMPLETED),
+        ]
+
+    async def _rank_sql(self, db: AsyncSession, limit: int, ready_only: bool, now: datetime) -> List[Ranked]:
+        dialect = db.get_bind().dialect.name
+        until_due = self._seconds(Task.due_date, dialect) - literal(_wall_seconds(now), Float)
+        open_for = literal(time.time(), Float) - self._seconds(Task.created_at, dialect)
+        priority = case(
+            *[(Task.priority == priority, rank / _TOP_PRIORITY) for priority, rank in _PRIORITY_RANK.items()], else_=0.0
+        )
+        due = case(
+            (Task.due_date.is_(None), 0.0),
+            (until_due <= 0, 1.0),
+            (until_due >= self.due_horizon, 0.0),
+            else_=1.0 - until_due / self.due_horizon,
+        )
+        overdue = case((until_due < 0, 1.0), else_=0.0)
+        age = case(
+            (open_for >= self.age_horizon, 1.0),
+            (open_for <= 0, 0.0),
+            else_=open_for / self.age_horizon,
+        )
+        score = (self.priority * priority + self.due * due + self.overdue * overdue + self.age * age).label("score")
+
+        query = (
+            select(Task.id, score)
+            .where(Task.status != TaskStatus.COMPLETED, Task.recurrence.is_(None))
+            .order_by(score.desc(), Task.id)
+            .limit(limit)
+        )
+        if ready_only:
+            query = query.where(*self._ready_conditions())
+        result = await db.execute(query)
+        ranked = [Ranked(task_id, round(float(value), 4)) for task_id, value in result]
+
+        series_query = select(Task.id, Task.recurrence, Task.priority, Task.due_date, Task.created_at).where(
+            Task.status != TaskStatus.COMPLETED, Task.recurrence.isnot(None), Task.due_date.isnot(None)
+        )
+        if ready_only:
+            series_query = series_query.where(*self._ready_conditions())
+        series = [dict(row._mapping) for row in await db.execute(series_query)]
+        if series:
+            saved = await db.execute(
+                select(Task.series_id, Task.occurrence_date).where(
+                    Task.series_id.in_([row["id"] for row in series]),
+                    Task.occurrence_date >= recurrence.start_of_day(now)
+                )
+            )
+            saved = self._by_series(saved)
+            ranked = self._merge(ranked, self._rank_series(series, saved, limit, now), limit)
+        return ranked
+
+    def reasons(self, task, now: Optional[datetime] = None) -> List[str]:
+        """Short human-readable reasons a task ranks where it does"""
+        now = now or local_now()
+        reasons = []
+        if task.priority in (TaskPriority.HIGH, TaskPriority.URGENT):
+            reasons.append(f"{task.priority.value} priority")
+        if task.due_date is not None:
+            until_due = task.due_date.replace(tzinfo=None) - now
+            if until_due < timedelta(0):
+                reasons.append(f"overdue by {_duration(-until_due.total_seconds())}")
+            elif until_due.total_seconds() <= self.due_horizon:
+                reasons.append(f"due in {_duration(until_due.total_seconds())}")
+        if task.created_at is not None:
+            open_for = time.time() - _timestamp(task.created_at)
+            if open_for >= self.age_horizon / 2:
+                reasons.append(f"open for {_duration(open_for)}")
+        return reasons
+
+
+# Global ranker, weighted from the TASK_RANK_* settings
+task_ranker = TaskRanker()
@@ -0,0 +1,216 @@
+import logging
+import math
+import os
+import zlib
+from functools import lru_cache
+from typing import Any, Dict, List, Optional, Sequence, Set, Tuple
+
+import numpy as np
+
+from app.database.connection import AsyncSessionLocal
+from app.services.task_service import TaskService
+from app.services.text_terms import words as text_words
+
+logger = logging.getLogger(__name__)
+
+# Embedding width; memory is roughly tasks x dim x 4 bytes (128 -> ~512 MB at 1M tasks)
+SEARCH_EMBED_DIM = int(os.getenv("SEARCH_EMBED_DIM", "128"))
+SEARCH_EMBEDDER = os.getenv("SEARCH_EMBEDDER", "hashing")
+# Matches scoring below this are dropped from results
+SEARCH_MIN_SCORE = float(os.getenv("SEARCH_MIN_SCORE", "0.1"))
+SEARCH_LOAD_CHUNK_SIZE = 5000
+
+
+def _terms(text: str) -> List[str]:
+    words = text_words(text)
+    # Word bigrams keep some phrase order ("quarterly report" vs "report quarterly")
+    return words + [f"{first} {second}" for first, second in zip(words, words[1:])]
+
+
+@lru_cache(maxsize=65536)
+def _feature(term: str, dim: int) -> Tuple[int, float]:
+    """Hash bucket and signed weight of a term"""
+    # crc32 is stable across processes, unlike hash()
+    digest = zlib.crc32(term.encode("utf-8"))
+    weight = 1.0 if " " not in term else 0.5
+    return digest % dim, weight if digest & 0x80000000 else -weight
+
+
+class Embedder:
+    """Turns text into fixed-width float32 vectors.
+
+    `embed` returns one L2-normalized row per text. Embedders that keep corpus
+    statistics (e.g. IDF) update them in `observe` as documents come and go.
+    """
+
+    dim: int
+
+    def embed(self, texts: Sequence[str]) -> np.ndarray:
+        raise NotImplementedError
+
+    def embed_query(self, text: str) -> np.ndarray:
+        return self.embed([text])[0]
+
+    def observe(self, vectors: np.ndarray, sign: int) -> None:
+        pass
+
+
+class HashingEmbedder(Embedder):
+    """Signed feature hashing of stemmed words and bigrams with TF-IDF weighting.
+
+    Document vectors hold log-scaled term frequencies; IDF is applied to the
+    query side only, so document rows never need re-weighting as the corpus
+    changes. Works offline and needs no vocabulary.
+    """
+
+    def __init__(self, dim: int = SEARCH_EMBED_DIM):
+        self.dim = dim
+        self._df = np.zeros(dim, dtype=np.float64)
+        self._docs = 0
+
+    def _vector(self, text: str) -> np.ndarray:
+        vector = np.zeros(self.dim, dtype=np.float32)
+        counts: Dict[Tuple[int, float], int] = {}
+        for term in _terms(text):
+            feature = _feature(term, self.dim)
+            counts[feature] = counts.get(feature, 0) + 1
+        for (bucket, weight), count in counts.items():
+            vector[bucket] += weight * (1.0 + math.log(count))
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+    def embed(self, texts: Sequence[str]) -> np.ndarray:
+        if not texts:
+            return np.zeros((0, self.dim), dtype=np.float32)
+        return np.stack([self._vector(text) for text in texts])
+
+    def embed_query(self, text: str) -> np.ndarray:
+        vector = self._vector(text).astype(np.float64)
+        idf = np.log((1.0 + self._docs) / (1.0 + self._df)) + 1.0
+        vector *= idf
+        norm = np.linalg.norm(vector)
+        return (vector / norm if norm else vector).astype(np.float32)
+
+    def observe(self, vectors: np.ndarray, sign: int) -> None:
+        self._df += sign * np.count_nonzero(vectors, axis=0)
+        self._docs += sign * len(vectors)
+
+
+EMBEDDERS = {"hashing": HashingEmbedder}
+
+
+def _document(record: Dict[str, Any]) -> str:
+    return f"{record['title']} {record.get('description') or ''}"
+
+
+class TaskSearchIndex:
+    """Dense embedding matrix of non-archived tasks answering top-k similarity queries.
+
+    Rows live in one preallocated float32 matrix that doubles when full; a
+    delete moves the last row into the hole so the live rows stay contiguous.
+    Queries are a single matrix-vector product plus argpartition.
+    """
+
+    def __init__(self, embedder: Embedder, capacity: int = 1024):
+        self.embedder = embedder
+        self._matrix = np.zeros((capacity, embedder.dim), dtype=np.float32)
+        self._ids = np.zeros(capacity, dtype=np.int64)
+        self._rows: Dict[int, int] = {}
+        self._size = 0
+        # Tasks deleted while load() is streaming must not be re-added by it
+        self._loading = False
+        self._removed_during_load: Set[int] = set()
+
+    def __len__(self) -> int:
+        return self._size
+
+    def _grow(self, needed: int) -> None:
+        capacity = len(self._ids)
+        if needed <= capacity:
+            return
+        while capacity < needed:
+            capacity *= 2
+        matrix = np.zeros((capacity, self.embedder.dim), dtype=np.float32)
+        matrix[: self._size] = self._matrix[: self._size]
+        ids = np.zeros(capacity, dtype=np.int64)
+        ids[: self._size] = self._ids[: self._size]
+        self._matrix, self._ids = matrix, ids
+
+    def upsert(self, task_ids: Sequence[int], vectors: np.ndarray) -> None:
+        """Insert or replace the vectors for the given tasks"""
+        self._grow(self._size + len(task_ids))
+        for task_id, vector in zip(task_ids, vectors):
+            row = self._rows.get(task_id)
+            if row is None:
+                row = self._size
+                self._rows[task_id] = row
+                self._ids[row] = task_id
+                self._size += 1
+            else:
+                self.embedder.observe(self._matrix[row : row + 1], -1)
+            self._matrix[row] = vector
+        self.embedder.observe(vectors, 1)
+
+    def remove(self, task_id: int) -> None:
+        row = self._rows.pop(task_id, None)
+        if self._loading:
+            self._removed_during_load.add(task_id)
+        if row is None:
+            return
+        self.embedder.observe(self._matrix[row : row + 1], -1)
+        last = self._size - 1
+        if row != last:
+            moved_id = int(self._ids[last])
+            self._matrix[row] = self._matrix[last]
+            self._ids[row] = moved_id
+            self._rows[moved_id] = row
+        self._size = last
+
+    def apply(self, before: Optional[Dict[str, Any]], after: Optional[Dict[str, Any]]) -> None:
+        """TaskService listener: re-embed tasks whose text changed"""
+        if after is None:
+            self.remove(before["id"])
+            return
+        if before is not None and before["id"] in self._rows and _document(before) == _document(after):
+            return
+        self.upsert([after["id"]], self.embedder.embed([_document(after)]))
+
+    async def load(self, chunk_size: int = SEARCH_LOAD_CHUNK_SIZE) -> None:
+        """Embed every task, streaming them from the database in chunks"""
+        self._loading = True
+        try:
+            async with AsyncSessionLocal() as db:
+                async for records in TaskService(db).stream_tasks(chunk_size=chunk_size):
+                    records = [record for record in records if record["id"] not in self._removed_during_load]
+                    self.upsert([record["id"] for record in records], self.embedder.embed([_document(record) for record in records]))
+            logger.info(f"Task search index loaded: {self._size} tasks")
+        except Exception as e:
+            logger.error(f"Failed to load task search index: {e}")
+        finally:
+            self._loading = False
+            self._removed_during_load.clear()
+
+    def search(self, query: str, k: int = 10, min_score: float = SEARCH_MIN_SCORE) -> List[Tuple[int, float]]:
+        """Top-k (task_id, score) pairs by cosine similarity, best first"""
+        if not self._size or k <= 0:
+            return []
+        vector = self.embedder.embed_query(query)
+        if not vector.any():
+            return []
+        scores = self._matrix[: self._size] @ vector
+        if k < self._size:
+            # O(n) selection of the k best, then sort just those
+            top = np.argpartition(scores, self._size - k)[self._size - k :]
+        else:
+            top = np.arange(self._size)
+        top = top[np.argsort(scores[top])[::-1]]
+        return [
+            (int(self._ids[row]), float(scores[row]))
+            for row in top
+            if scores[row] >= min_score
+        ]
+
+
+# Global search index
+task_search = TaskSearchIndex(EMBEDDERS[SEARCH_EMBEDDER]())
+TaskService.add_listener(task_search.apply)
@@ -1,31 +1,255 @@
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.future import select
-from sqlalchemy import and_, or_, func
-from typing import List, Optional
+from sqlalchemy import and_, or_, func, delete, insert, case, exists, literal
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import aliased
+from typing import Any, Callable, Dict, List, Optional, Tuple
 from datetime import datetime
+from enum import Enum
+from itertools import islice
+import heapq
+import logging
 
-from app.models.task import Task, TaskStatus, TaskPriority
+from app.models.task import Task, ArchivedTask, ChangeOp, TaskChange, TaskDependency, TaskStatus, TaskPriority
 from app.schemas.task import TaskCreate, TaskUpdate, TaskFilter
+from app.services.task_dedup import DUPLICATE_POLICY, DuplicateTaskError, duplicate_index
+from app.services.task_graph import TaskGraphError, task_graph
+from app.services.task_ranking import task_ranker
+from app.services import recurrence
+from app.services.task_snapshot import task_snapshot
+
+
+logger = logging.getLogger(__name__)
+
+# Listener signature: (before, after) where each side is a task record dict or
+# None (None before = created, None after = deleted).
+TaskListener = Callable[[Optional[Dict[str, Any]], Optional[Dict[str, Any]]], None]
+
+
+# Guards subtree queries against runaway recursion
+MAX_TREE_DEPTH = 50
+
+# Task columns in API order; sparse fieldsets pick from these
+TASK_FIELDS = ["id", "title", "description", "status", "due_date", "priority", "created_at", "updated_at", "parent_id",
+               "recurrence", "series_id", "occurrence_date"]
+
+
+def parse_fields(fields: Optional[str]) -> Optional[List[str]]:
+    """Parse a comma-separated sparse fieldset; id is always included"""
+    if not fields:
+        return None
+    requested = {field.strip() for field in fields.split(",") if field.strip()}
+    unknown = requested - set(TASK_FIELDS)
+    if unknown:
+        raise ValueError(f"Unknown task field(s): {', '.join(sorted(unknown))}")
+    return [field for field in TASK_FIELDS if field == "id" or field in requested]
+
+
+def plain_value(value: Any) -> Any:
+    """JSON-friendly form of a column value"""
+    if isinstance(value, Enum):
+        return value.value
+    if isinstance(value, datetime):
+        return value.isoformat()
+    return value
+
+
+def task_record(task: Task) -> Dict[str, Any]:
+    """Plain column snapshot of a task, safe to keep after the session closes"""
+    return {column.name: getattr(task, column.name) for column in Task.__table__.columns}
 
 
 class TaskService:
+    # In-process listeners notified after every committed write
+    listeners: List[TaskListener] = []
+
     def __init__(self, db_session: AsyncSession):
         self.db = db_session
 
-    async def create_task(self, task_data: TaskCreate) -> Task:
-        """Create a new task"""
+    @property
+    def _dialect(self):
+        return self.db.get_bind().dialect
+
+    async def _refresh(self, task: Task) -> None:
+        """Reload server-set columns after a commit, then end the read transaction
+        that opened so the connection goes straight back to the pool (on SQLite
+        it is the single writer connection)"""
+        await self.db.refresh(task)
+        await self.db.commit()
+
+    @classmethod
+    def add_listener(cls, listener: TaskListener) -> None:
+        """Register a callback run after each committed task write"""
+        if listener not in cls.listeners:
+            cls.listeners.append(listener)
+
+    def _notify(self, before: Optional[Dict[str, Any]], after: Optional[Dict[str, Any]]) -> None:
+        for listener in self.listeners:
+            try:
+                listener(before, after)
+            except Exception as e:
+                logger.error(f"Task listener {listener!r} failed: {e}")
+
+    async def _apply_update(self, task: Task, task_update: TaskUpdate) -> Task:
+        before = task_record(task)
+        update_data = task_update.model_dump(exclude_unset=True)
+        if update_data.get("parent_id") is not None and update_data["parent_id"] != task.parent_id:
+            await self._check_parent(task.id, update_data["parent_id"])
+        if update_data.get("recurrence"):
+            update_data["recurrence"] = recurrence.normalize_rule(update_data["recurrence"])
+            if not update_data.get("due_date") and not task.due_date:
+                update_data["due_date"] = recurrence.series_start(None)
+        for field, value in update_data.items():
+            setattr(task, field, value)
+
+        await self._log_changes([task.id], ChangeOp.UPSERT)
+        await self.db.commit()
+        await self._refresh(task)
+        self._notify(before, task_record(task))
+        return task
+
+    async def _delete(self, task: Task) -> None:
+        # Subtasks go with their parent
+        tree = self._subtree_cte(task.id)
+        result = await self.db.execute(
+            select(*Task.__table__.columns).join(tree, Task.id == tree.c.id)
+        )
+        records = [dict(row._mapping) for row in result]
+        task_ids = [record["id"] for record in records]
+        await self._delete_dependencies(task_ids)
+        await self.db.execute(delete(Task).where(Task.id.in_(task_ids)))
+        await self._log_changes(task_ids, ChangeOp.DELETE)
+        await self.db.commit()
+        for record in records:
+            self._notify(record, None)
+
+    async def _log_changes(self, task_ids: List[int], op: ChangeOp) -> None:
+        # Same transaction as the write, so the log and the tasks table always agree
+        if task_ids:
+            await self.db.execute(insert(TaskChange), [{"task_id": task_id, "op": op} for task_id in task_ids])
+
+    async def _delete_dependencies(self, task_ids: List[int]) -> None:
+        # Not left to ON DELETE CASCADE, which SQLite ignores unless foreign keys are enabled
+        await self.db.execute(
+            delete(TaskDependency).where(
+                or_(TaskDependency.task_id.in_(task_ids), TaskDependency.blocked_by_id.in_(task_ids))
+            )
+        )
+
+    async def create_task(self, task_data: TaskCreate, on_duplicate: Optional[str] = None) -> Task:
+        """Create a new task.
+
+        If an open task with a near-identical title exists, `on_duplicate`
+        (default DUPLICATE_POLICY) decides what happens: "warn" creates the task
+        anyway, "merge" fills the existing task's blank fields and returns it,
+        "reject" raises DuplicateTaskError. Either way the returned task's
+        `duplicate_of` is set to the matching task's id.
+
+        A task with `recurrence` is stored once as a series starting at its due
+        date (today if none); raises ValueError for a rule it cannot parse.
+        """
+        match = duplicate_index.find(task_data.title)
+        if match:
+            policy = on_duplicate or DUPLICATE_POLICY
+            logger.info(f"Task '{task_data.title}' looks like #{match.task_id} '{match.title}' ({match.similarity:.2f}), policy={policy}")
+            if policy == "reject":
+                raise DuplicateTaskError(match)
+            if policy == "merge":
+                existing = await self.get_task_by_id(match.task_id)
+                if existing:
+                    merged = await self._merge_into(existing, task_data)
+                    merged.duplicate_of = match.task_id
+                    return merged
+
+        if task_data.parent_id is not None:
+            await self._check_parent(None, task_data.parent_id)
+        rule = recurrence.normalize_rule(task_data.recurrence) if task_data.recurrence else None
+        due_date = recurrence.series_start(task_data.due_date) if rule else task_data.due_date
+
         db_task = Task(
             title=task_data.title,
             description=task_data.description,
             status=task_data.status,
-            due_date=task_data.due_date,
-            priority=task_data.priority
+            due_date=due_date,
+            priority=task_data.priority,
+            parent_id=task_data.parent_id,
+            recurrence=rule
         )
         self.db.add(db_task)
+        await self.db.flush()
+        await self._log_changes([db_task.id], ChangeOp.UPSERT)
         await self.db.commit()
-        await self.db.refresh(db_task)
+        await self._refresh(db_task)
+        self._notify(None, task_record(db_task))
+        if match:
+            db_task.duplicate_of = match.task_id
         return db_task
 
+    async def _merge_into(self, task: Task, task_data: TaskCreate) -> Task:
+        # Keep what the existing task has; take only what it is missing
+        changes = {}
+        if not task.description and task_data.description:
+            changes["description"] = task_data.description
+        if not task.due_date and task_data.due_date:
+            changes["due_date"] = task_data.due_date
+        priorities = list(TaskPriority)
+        if task_data.priority and priorities.index(task_data.priority) > priorities.index(task.priority):
+            changes["priority"] = task_data.priority
+        if not changes:
+            return task
+        return await self._apply_update(task, TaskUpdate(**changes))
+
+    async def create_tasks_bulk(self, tasks: List[TaskCreate]) -> int:
+        """Insert many tasks with a single multi-row INSERT"""
+        if not tasks:
+            return 0
+
+        rows = [
+            {
+                "title": task.title,
+                "description": task.description,
+                "status": task.status or TaskStatus.PENDING,
+                "due_date": task.due_date,
+                "priority": task.priority or TaskPriority.MEDIUM,
+                "parent_id": task.parent_id,
+                "recurrence": recurrence.normalize_rule(task.recurrence) if task.recurrence else None,
+            }
+            for task in tasks
+        ]
+        if self._dialect.insert_returning:
+            result = await self.db.execute(
+                insert(Task).values(rows).returning(*Task.__table__.columns)
+            )
+            records = [dict(row._mapping) for row in result]
+        else:
+            # SQLite before 3.35 has no RETURNING: flush ORM rows for their ids, then read them back
+            created = [Task(**row) for row in rows]
+            self.db.add_all(created)
+            await self.db.flush()
+            result = await self.db.execute(
+                select(*Task.__table__.columns).where(Task.id.in_([task.id for task in created])).order_by(Task.id)
+            )
+            records = [dict(row._mapping) for row in result]
+        await self._log_changes([record["id"] for record in records], ChangeOp.UPSERT)
+        await self.db.commit()
+
+        for record in records:
+            self._notify(None, record)
+        return len(records)
+
+    async def stream_tasks(self, include_archived: bool = False, chunk_size: int = 1000):
+        """Yield lists of task records from a server-side cursor, oldest first"""
+        models = [Task, ArchivedTask] if include_archived else [Task]
+        for model in models:
+            columns = [model.__table__.c[column.name] for column in Task.__table__.columns]
+            result = await self.db.stream(
+                select(*columns)
+                .order_by(model.id)
+                .execution_options(yield_per=chunk_size)
+            )
+            async for partition in result.partitions(chunk_size):
+                yield [dict(row._mapping) for row in partition]
+
     async def get_task_by_id(self, task_id: int) -> Optional[Task]:
         """Get task by ID"""
         result = await self.db.execute(select(Task).where(Task.id == task_id))
@@ -38,45 +262,260 @@ class TaskService:
         )
         return result.scalar_one_or_none()
 
-    async def get_tasks(self, skip: int = 0, limit: int = 100) -> List[Task]:
-        """Get all tasks with pagination"""
+    async def get_tasks_by_ids(self, task_ids: List[int]) -> List[Task]:
+        """Get tasks by ID, in the order the IDs were given; missing IDs are skipped"""
+        if not task_ids:
+            return []
+        result = await self.db.execute(select(Task).where(Task.id.in_(task_ids)))
+        tasks = {task.id: task for task in result.scalars()}
+        return [tasks[task_id] for task_id in task_ids if task_id in tasks]
+
+    async def get_tasks(
+        self,
+        skip: int = 0,
+        limit: int = 100,
+        include_archived: bool = False,
+        fields: Optional[List[str]] = None
+    ) -> List[Task]:
+        """Get all tasks with pagination.
+
+        With `fields`, only those columns are selected and plain dicts are returned.
+        Recurring tasks appear as their occurrences over the next
+        RECURRENCE_HORIZON_DAYS rather than as the series row.
+        """
+        occurrences = await self._expand_recurring(TaskFilter(), self._with_sort_key(self._with_occurrence_keys(fields)))
+        if include_archived or occurrences:
+            requested = self._with_occurrence_keys(fields) if occurrences else fields
+            fields = self._with_sort_key(requested)
+            # Each source can contribute at most skip + limit rows to the page
+            hot = await self._fetch(
+                self._select(Task, fields).where(Task.recurrence.is_(None))
+                .limit(skip + limit).order_by(Task.created_at.desc()), fields
+            )
+            hot = self._merge_newest_first(hot, occurrences, limit=skip + limit)
+            if not include_archived:
+                return self._project(hot[skip:], requested)
+            cold = await self._fetch(
+                self._select(ArchivedTask, fields).where(ArchivedTask.recurrence.is_(None))
+                .limit(skip + limit).order_by(ArchivedTask.created_at.desc()), fields
+            )
+            return self._project(self._merge_newest_first(hot, cold, skip, limit), requested)
+
+        return await self._fetch(
+            self._select(Task, fields).where(Task.recurrence.is_(None))
+            .offset(skip).limit(limit).order_by(Task.created_at.desc()), fields
+        )
+
+    async def filter_tasks(self, task_filter: TaskFilter, fields: Optional[List[str]] = None) -> List[Task]:
+        """Filter tasks based on criteria.
+
+        Served from the in-memory snapshot when it is enabled and loaded;
+        archived tasks always come from the database. Recurring tasks are
+        expanded into their occurrences within the due-date bounds.
+        """
+        sort_by, descending, limit = task_filter.sort_by, task_filter.descending, task_filter.limit
+        occurrences = await self._expand_recurring(
+            task_filter, self._with_sort_key(self._with_occurrence_keys(fields), sort_by)
+        )
+        requested = self._with_occurrence_keys(fields) if occurrences else fields
+        if occurrences or task_filter.include_archived:
+            fields = self._with_sort_key(requested, sort_by)
+        if task_snapshot.ready and not task_filter.include_archived:
+            tasks = task_snapshot.filter(task_filter, fields)
+        else:
+            tasks = await self._filter_model(Task, task_filter, fields)
+        if occurrences:
+            tasks = self._merge_sorted(tasks, occurrences, sort_by, descending, limit=limit)
+        if task_filter.include_archived:
+            archived = await self._filter_model(ArchivedTask, task_filter, fields)
+            tasks = self._merge_sorted(tasks, archived, sort_by, descending, limit=limit)
+        return self._project(tasks, requested)
+
+    async def _expand_recurring(self, task_filter: TaskFilter, fields: Optional[List[str]] = None) -> list:
+        """Unsaved occurrences of the recurring tasks matching the filter.
+
+        Occurrences are generated over the filter's due-date window (default:
+        today plus RECURRENCE_HORIZON_DAYS), skipping those already saved as
+        rows because they were completed or edited. Sorted like the filter.
+        """
         result = await self.db.execute(
-            select(Task).offset(skip).limit(limit).order_by(Task.created_at.desc())
+            select(Task).where(
+                Task.recurrence.isnot(None),
+                *self._conditions(Task, task_filter, due_dates=False)
+            )
         )
+        series = [task for task in result.scalars() if task.due_date is not None]
+        if not series:
+            return []
+
+        window_start, window_end = recurrence.window(task_filter.due_date_after, task_filter.due_date_before)
+        series_ids = [task.id for task in series]
+        saved = set()
+        for model in (Task, ArchivedTask):
+            rows = await self.db.execute(
+                select(model.series_id, model.occurrence_date).where(
+                    model.series_id.in_(series_ids),
+                    model.occurrence_date.between(window_start, window_end)
+                )
+            )
+            saved.update((series_id, occurrence_date) for series_id, occurrence_date in rows)
+
+        occurrences = []
+        for task in series:
+            try:
+                rule = recurrence.parse_rule(task.recurrence)
+            except ValueError as e:
+                logger.error(f"Skipping task {task.id} with invalid recurrence '{task.recurrence}': {e}")
+                continue
+            record = task_record(task)
+            for occurrence_date in recurrence.occurrences(rule, task.due_date, window_start, window_end):
+                if (task.id, occurrence_date) in saved:
+                    continue
+                occurrence = {**record, "due_date": occurrence_date, "series_id": task.id, "occurrence_date": occurrence_date}
+                occurrences.append({field: occurrence[field] for field in fields} if fields else Task(**occurrence))
+        occurrences.sort(key=self._sort_key(task_filter.sort_by, task_filter.descending), reverse=task_filter.descending)
+        return occurrences
+
+    @staticmethod
+    def _select(model, fields: Optional[List[str]]):
+        if not fields:
+            return select(model)
+        return select(*[model.__table__.c[field] for field in fields])
+
+    async def _fetch(self, query, fields: Optional[List[str]]) -> list:
+        result = await self.db.execute(query)
+        if fields:
+            return [dict(row._mapping) for row in result]
         return result.scalars().all()
 
-    async def filter_tasks(self, task_filter: TaskFilter) -> List[Task]:
-        """Filter tasks based on criteria"""
-        query = select(Task)
+    @staticmethod
+    def _with_sort_key(fields: Optional[List[str]], sort_by: str = "created_at") -> Optional[List[str]]:
+        # Merging hot and archived rows needs the sort key even when not requested
+        if fields and sort_by not in fields:
+            return fields + [sort_by]
+        return fields
+
+    @staticmethod
+    def _with_occurrence_keys(fields: Optional[List[str]]) -> Optional[List[str]]:
+        # Occurrences repeat their series id; these tell them apart in projected rows
+        if not fields:
+            return fields
+        return fields + [field for field in ("series_id", "occurrence_date") if field not in fields]
+
+    @staticmethod
+    def _project(rows: list, fields: Optional[List[str]]) -> list:
+        # Drop a sort key added by _with_sort_key that the caller did not ask for
+        if not fields or not rows:
+            return rows
+        return [{field: row[field] for field in fields} for row in rows]
+
+    @staticmethod
+    def _order_by(model, sort_by: str, descending: bool) -> list:
+        column = getattr(model, sort_by)
+        if sort_by == "priority":
+            # Enum declaration order, not the stored label's alphabetical order
+            column = case(*[(model.priority == priority, rank) for rank, priority in enumerate(TaskPriority)])
+        if descending:
+            return [column.desc().nulls_last(), model.id.desc()]
+        return [column.asc().nulls_last(), model.id.asc()]
+
+    @staticmethod
+    def _conditions(model, task_filter: TaskFilter, due_dates: bool = True) -> list:
         conditions = []
 
         if task_filter.status:
-            conditions.append(Task.status == task_filter.status)
+            conditions.append(model.status == task_filter.status)
 
         if task_filter.priority:
-            conditions.append(Task.priority == task_filter.priority)
+            conditions.append(model.priority == task_filter.priority)
 
-        if task_filter.due_date_before:
-            conditions.append(Task.due_date <= task_filter.due_date_before)
+        if due_dates and task_filter.due_date_before:
+            conditions.append(model.due_date <= task_filter.due_date_before)
 
-        if task_filter.due_date_after:
-            conditions.append(Task.due_date >= task_filter.due_date_after)
+        if due_dates and task_filter.due_date_after:
+            conditions.append(model.due_date >= task_filter.due_date_after)
+
+        if task_filter.parent_id is not None:
+            conditions.append(model.parent_id == task_filter.parent_id)
 
         if task_filter.search:
             search_term = f"%{task_filter.search.lower()}%"
             conditions.append(
                 or_(
-                    func.lower(Task.title).like(search_term),
-                    func.lower(Task.description).like(search_term)
+                    func.lower(model.title).like(search_term),
+                    func.lower(model.description).like(search_term)
                 )
             )
 
-        if conditions:
-            query = query.where(and_(*conditions))
+        return conditions
+
+    async def _filter_model(self, model, task_filter: TaskFilter, fields: Optional[List[str]] = None) -> list:
+        # Series rows are represented by their occurrences
+        conditions = [model.recurrence.is_(None), *self._conditions(model, task_filter)]
+        query = self._select(model, fields).where(and_(*conditions))
+        query = query.order_by(*self._order_by(model, task_filter.sort_by, task_filter.descending))
+        if task_filter.limit:
+            query = query.limit(task_filter.limit)
+        return await self._fetch(query, fields)
 
-        query = query.order_by(Task.created_at.desc())
+    @staticmethod
+    def _merge_newest_first(hot: list, cold: list, skip: int = 0, limit: Optional[int] = None) -> list:
+        return TaskService._merge_sorted(hot, cold, "created_at", True, skip, limit)
+
+    @staticmethod
+    def _sort_key(sort_by: str, descending: bool) -> Callable[[Any], tuple]:
+        priorities = list(TaskPriority)
+
+        def sort_key(task):
+            value = task[sort_by] if isinstance(task, dict) else getattr(task, sort_by)
+            if value is None:
+                # Missing values sort last in either direction, like NULLS LAST
+                return (0,) if descending else (2,)
+            return (1, priorities.index(value) if sort_by == "priority" else value)
+
+        return sort_key
+
+    @staticmethod
+    def _merge_sorted(hot: list, cold: list, sort_by: str, descending: bool, skip: int = 0, limit: Optional[int] = None) -> list:
+        sort_key = TaskService._sort_key(sort_by, descending)
+        merged = heapq.merge(hot, cold, key=sort_key, reverse=descending)
+        stop = skip + limit if limit is not None else None
+        return list(islice(merged, skip, stop))
+
+    async def archive_completed(self, completed_before: datetime, batch_size: int = 500) -> int:
+        """Move one batch of tasks completed before the cutoff to the archive table.
+
+        Completion time is taken from updated_at, which the status change bumps.
+        Returns the number of tasks moved.
+        """
+        child = aliased(Task)
+        query = (
+            select(*Task.__table__.columns)
+            .where(Task.status == TaskStatus.COMPLETED, Task.updated_at < completed_before)
+            # A parent stays while any of its subtasks is still in the hot table
+            .where(~exists().where(child.parent_id == Task.id))
+            .order_by(Task.updated_at)
+            .limit(batch_size)
+        )
+        if self._dialect.name != "sqlite":
+            # SQLite has no row locks; its writer transaction (BEGIN IMMEDIATE) holds the whole file
+            query = query.with_for_update(skip_locked=True)
         result = await self.db.execute(query)
-        return result.scalars().all()
+        records = [dict(row._mapping) for row in result]
+        if not records:
+            return 0
+
+        task_ids = [record["id"] for record in records]
+        await self.db.execute(insert(ArchivedTask), records)
+        await self._delete_dependencies(task_ids)
+        await self.db.execute(delete(Task).where(Task.id.in_(task_ids)))
+        # Archived tasks leave the hot set, which listeners and sync clients see as deletes
+        await self._log_changes(task_ids, ChangeOp.DELETE)
+        await self.db.commit()
+
+        for record in records:
+            self._notify(record, None)
+        return len(records)
 
     async def update_task(self, task_id: int, task_update: TaskUpdate) -> Optional[Task]:
         """Update a task by ID"""
@@ -84,13 +523,7 @@ class TaskService:
         if not task:
             return None
 
-        update_data = task_update.model_dump(exclude_unset=True)
-        for field, value in update_data.items():
-            setattr(task, field, value)
-
-        await self.db.commit()
-        await self.db.refresh(task)
-        return task
+        return await self._apply_update(task, task_update)
 
     async def update_task_by_title(self, title: str, task_update: TaskUpdate) -> Optional[Task]:
         """Update a task by title"""
@@ -98,13 +531,7 @@ class TaskService:
         if not task:
             return None
 
-        update_data = task_update.model_dump(exclude_unset=True)
-        for field, value in update_data.items():
-            setattr(task, field, value)
-
-        await self.db.commit()
-        await self.db.refresh(task)
-        return task
+        return await self._apply_update(task, task_update)
 
     async def delete_task(self, task_id: int) -> bool:
         """Delete a task by ID"""
@@ -112,8 +539,7 @@ class TaskService:
         if not task:
             return False
 
-        await self.db.delete(task)
-        await self.db.commit()
+        await self._delete(task)
         return True
 
     async def delete_task_by_title(self, title: str) -> bool:
@@ -122,8 +548,7 @@ class TaskService:
         if not task:
             return False
 
-        await self.db.delete(task)
-        await self.db.commit()
+        await self._delete(task)
         return True
 
     async def toggle_task_status(self, task_id: int) -> Optional[Task]:
@@ -133,10 +558,201 @@ class TaskService:
             return None
 
         if task.status == TaskStatus.COMPLETED:
-            task.status = TaskStatus.PENDING
+            new_status = TaskStatus.PENDING
         else:
-            task.status = TaskStatus.COMPLETED
+            new_status = TaskStatus.COMPLETED
+
+        return await self._apply_update(task, TaskUpdate(status=new_status))
 
+    async def _materialize(self, series_id: int, occurrence_date: datetime) -> Optional[Task]:
+        """The saved row for one occurrence of a series, created on its first edit"""
+        occurrence_date = recurrence.naive_local(occurrence_date)
+        query = select(Task).where(Task.series_id == series_id, Task.occurrence_date == occurrence_date)
+        task = (await self.db.execute(query)).scalar_one_or_none()
+        if task:
+            return task
+
+        series = await self.get_task_by_id(series_id)
+        if not series or not series.recurrence or series.due_date is None:
+            return None
+        if not recurrence.is_occurrence(recurrence.parse_rule(series.recurrence), series.due_date, occurrence_date):
+            return None
+
+        task = Task(
+            title=series.title,
+            description=series.description,
+            status=series.status,
+            due_date=occurrence_date,
+            priority=series.priority,
+            parent_id=series.parent_id,
+            series_id=series_id,
+            occurrence_date=occurrence_date
+        )
+        self.db.add(task)
+        try:
+            await self.db.flush()
+            await self._log_changes([task.id], ChangeOp.UPSERT)
+            await self.db.commit()
+        except IntegrityError:
+            # Saved concurrently by another request
+            await self.db.rollback()
+            return (await self.db.execute(query)).scalar_one_or_none()
+        await self._refresh(task)
+        self._notify(None, task_record(task))
+        return task
+
+    async def update_occurrence(self, series_id: int, occurrence_date: datetime, task_update: TaskUpdate) -> Optional[Task]:
+        """Update one occurrence of a recurring task, leaving the rest of the series alone"""
+        task = await self._materialize(series_id, occurrence_date)
+        if not task:
+            return None
+        return await self._apply_update(task, task_update)
+
+    async def toggle_occurrence_status(self, series_id: int, occurrence_date: datetime) -> Optional[Task]:
+        """Toggle the status of one occurrence of a recurring task"""
+        task = await self._materialize(series_id, occurrence_date)
+        if not task:
+            return None
+        return await self.toggle_task_status(task.id)
+
+    @staticmethod
+    def _subtree_cte(task_id: int):
+        """Recursive CTE of (id, depth) for a task and all of its subtasks"""
+        tree = (
+            select(Task.id, literal(0).label("depth"))
+            .where(Task.id == task_id)
+            .cte("subtree", recursive=True)
+        )
+        return tree.union_all(
+            select(Task.id, tree.c.depth + 1)
+            .join(tree, Task.parent_id == tree.c.id)
+            .where(tree.c.depth < MAX_TREE_DEPTH)
+        )
+
+    async def _ancestor_ids(self, task_id: int) -> List[int]:
+        """A task's id followed by the ids of its parent, grandparent, ..."""
+        chain = (
+            select(Task.id, Task.parent_id)
+            .where(Task.id == task_id)
+            .cte("ancestors", recursive=True)
+        )
+        chain = chain.union(
+            select(Task.id, Task.parent_id).join(chain, Task.id == chain.c.parent_id)
+        )
+        result = await self.db.execute(select(chain.c.id))
+        return list(result.scalars())
+
+    async def _check_parent(self, task_id: Optional[int], parent_id: int) -> None:
+        ancestors = await self._ancestor_ids(parent_id)
+        if not ancestors:
+            raise TaskGraphError(f"Parent task {parent_id} not found")
+        if task_id is not None and task_id in ancestors:
+            raise TaskGraphError(f"Task {task_id} cannot be a subtask of its own subtask {parent_id}")
+
+    def _closure_cte(self, task_id: int, direction: str):
+        """Recursive CTE of task ids reachable over dependency edges.
+
+        "blocked_by" follows a task to everything it waits on, "blocks" to
+        everything waiting on it. UNION (not UNION ALL) drops revisits.
+        """
+        if direction == "blocked_by":
+            source, target = TaskDependency.task_id, TaskDependency.blocked_by_id
+        else:
+            source, target = TaskDependency.blocked_by_id, TaskDependency.task_id
+        closure = (
+            select(target.label("id"))
+            .where(source == task_id)
+            .cte("closure", recursive=True)
+        )
+        return closure.union(
+            select(target).join(closure, source == closure.c.id)
+        )
+
+    async def get_task_tree(self, task_id: int) -> Optional[Dict[str, Any]]:
+        """A task with its subtasks nested under "children", fetched in one query"""
+        tree = self._subtree_cte(task_id)
+        result = await self.db.execute(
+            select(Task).join(tree, Task.id == tree.c.id).order_by(tree.c.depth, Task.id)
+        )
+        nodes: Dict[int, Dict[str, Any]] = {}
+        root = None
+        for task in result.scalars():
+            node = {**task.to_dict(), "children": []}
+            nodes[task.id] = node
+            if task.id == task_id:
+                root = node
+            else:
+                nodes[task.parent_id]["children"].append(node)
+        return root
+
+    async def get_dependency_closure(self, task_id: int, direction: str = "blocked_by") -> List[Task]:
+        """All tasks a task transitively waits on ("blocked_by") or holds up ("blocks")"""
+        closure = self._closure_cte(task_id, direction)
+        result = await self.db.execute(
+            select(Task).join(closure, Task.id == closure.c.id).order_by(Task.id)
+        )
+        return list(result.scalars())
+
+    async def add_dependency(self, task_id: int, blocked_by_id: int) -> bool:
+        """Record that `task_id` cannot start before `blocked_by_id` is completed.
+
+        Returns False if either task does not exist; raises TaskGraphError if
+        the edge would close a cycle.
+        """
+        if task_id == blocked_by_id:
+            raise TaskGraphError("A task cannot block itself")
+        found = await self.db.execute(select(func.count()).where(Task.id.in_([task_id, blocked_by_id])))
+        if found.scalar_one() < 2:
+            return False
+        # Cycle if the blocker already (transitively) waits on this task
+        closure = self._closure_cte(blocked_by_id, "blocked_by")
+        cycle = await self.db.execute(select(closure.c.id).where(closure.c.id == task_id).limit(1))
+        if cycle.first() is not None:
+            raise TaskGraphError(f"Task {blocked_by_id} already waits on task {task_id}")
+
+        existing = await self.db.get(TaskDependency, (task_id, blocked_by_id))
+        if existing is None:
+            self.db.add(TaskDependency(task_id=task_id, blocked_by_id=blocked_by_id))
+            await self.db.commit()
+        task_graph.add_edge(task_id, blocked_by_id)
+        return True
+
+    async def remove_dependency(self, task_id: int, blocked_by_id: int) -> bool:
+        """Remove a dependency edge; False if there was none"""
+        result = await self.db.execute(
+            delete(TaskDependency).where(
+                TaskDependency.task_id == task_id, TaskDependency.blocked_by_id == blocked_by_id
+            )
+        )
         await self.db.commit()
-        await self.db.refresh(task)
-        return task
\ No newline at end of file
+        task_graph.remove_edge(task_id, blocked_by_id)
+        return result.rowcount > 0
+
+    async def get_ready_tasks(self, limit: int = 20) -> List[Task]:
+        """Open tasks with no open blockers or subtasks, most urgent first"""
+        return await self.get_tasks_by_ids(task_graph.ready(limit))
+
+    async def get_next_tasks(self, limit: int = 5, ready_only: bool = False) -> List[Tuple[Task, float]]:
+        """Open tasks to do next with their ranking scores, best first.
+
+        A recurring task comes back as the occurrence it was ranked by.
+        """
+        ranked = await task_ranker.rank(self.db, limit, ready_only)
+        tasks = {task.id: task for task in await self.get_tasks_by_ids([entry.task_id for entry in ranked])}
+        next_tasks = []
+        for entry in ranked:
+            task = tasks.get(entry.task_id)
+            if task is None:
+                continue
+            if entry.occurrence_date is not None:
+                occurrence_date = entry.occurrence_date
+                task = Task(**{
+                    **task_record(task), "due_date": occurrence_date, "series_id": task.id, "occurrence_date": occurrence_date
+                })
+            next_tasks.append((task, entry.score))
+        return next_tasks
+
+
+TaskService.add_listener(duplicate_index.apply)
+TaskService.add_listener(task_snapshot.apply)
+TaskService.add_listener(task_graph.apply)
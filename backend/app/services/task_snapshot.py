@@ -0,0 +1,437 @@
+import asyncio
+import json
+import logging
+import os
+import shutil
+import sys
+import time
+from datetime import datetime, timedelta, timezone
+from types import SimpleNamespace
+from typing import Any, Dict, List, Optional, Set
+
+import numpy as np
+from sqlalchemy.future import select
+
+from app.database.connection import AsyncSessionLocal
+from app.models.task import Task, TaskColumns, TaskStatus, TaskPriority
+from app.schemas.task import TaskFilter
+
+logger = logging.getLogger(__name__)
+
+# Serve filter_tasks from an in-process columnar copy of the tasks table.
+# Only safe with a single app process, since other processes' writes are not seen.
+TASK_SNAPSHOT_ENABLED = os.getenv("TASK_SNAPSHOT_ENABLED", "false").lower() in ("1", "true", "yes")
+# Directory for the memory-mapped snapshot; empty disables persistence
+TASK_SNAPSHOT_PATH = os.getenv("TASK_SNAPSHOT_PATH", "")
+TASK_SNAPSHOT_SAVE_SECONDS = float(os.getenv("TASK_SNAPSHOT_SAVE_SECONDS", "300"))
+# Rows updated this long before the saved watermark are re-read on restart,
+# covering transactions that committed after the snapshot was taken
+CATCH_UP_MARGIN_SECONDS = 60
+LOAD_CHUNK_SIZE = 5000
+
+_STATUSES = list(TaskStatus)
+_PRIORITIES = list(TaskPriority)
+_STATUS_CODE = {status: code for code, status in enumerate(_STATUSES)}
+_PRIORITY_CODE = {priority: code for code, priority in enumerate(_PRIORITIES)}
+_EPOCH = datetime(1970, 1, 1)
+_TIME_COLUMNS = ("due_date", "created_at", "updated_at", "occurrence_date")
+# parent_id / series_id 0 stands for "none"; task ids start at 1
+_ARRAYS = ("ids", "status", "priority", "due_date", "created_at", "updated_at", "parent_id", "series_id", "occurrence_date")
+_DTYPES = {
+    "ids": np.int64, "status": np.int8, "priority": np.int8, "parent_id": np.int64, "series_id": np.int64,
+    "due_date": np.float64, "created_at": np.float64, "updated_at": np.float64, "occurrence_date": np.float64,
+}
+
+
+def _epoch(value: Optional[datetime]) -> float:
+    if value is None:
+        return np.nan
+    if value.tzinfo is not None:
+        value = value.astimezone(timezone.utc).replace(tzinfo=None)
+    return (value - _EPOCH).total_seconds()
+
+
+class SnapshotTask(SimpleNamespace):
+    """Read-only stand-in for a Task row, built from the snapshot arrays"""
+
+    duplicate_of = None
+    to_dict = TaskColumns.to_dict
+    __repr__ = TaskColumns.__repr__
+
+
+class TaskSnapshot:
+    """Columnar mirror of the tasks table answering TaskFilter queries.
+
+    Status and priority are int8 codes, timestamps float64 epoch seconds (NaN
+    for a missing due date), titles interned strings. Filters are boolean
+    masks over the arrays; sort + limit partition on the key before sorting only
+    the survivors. Rows stay contiguous (a delete moves the last row into the
+    hole) and arrays double when full.
+    """
+
+    def __init__(self, enabled: bool = TASK_SNAPSHOT_ENABLED, path: str = TASK_SNAPSHOT_PATH, capacity: int = 1024):
+        self.enabled = enabled
+        self.path = path
+        self.ready = False
+        self._size = 0
+        self._columns: Dict[str, np.ndarray] = {name: np.zeros(capacity, dtype=_DTYPES[name]) for name in _ARRAYS}
+        self._titles: List[str] = []
+        self._descriptions: List[Optional[str]] = []
+        # Lowercased "title\ndescription" per row for substring search
+        self._search_text: List[str] = []
+        # Recurrence rules of series rows; few tasks have one
+        self._recurrence: Dict[int, str] = {}
+        self._rows: Dict[int, int] = {}
+        # Whether each timestamp column came back timezone-aware from the driver
+        self._aware = {name: False for name in _TIME_COLUMNS}
+        self._loading = False
+        self._touched_during_load: Set[int] = set()
+        self._removed_during_load: Set[int] = set()
+
+    def __len__(self) -> int:
+        return self._size
+
+    def _grow(self) -> None:
+        capacity = len(self._columns["ids"])
+        if self._size < capacity:
+            return
+        capacity = max(capacity * 2, 1024)
+        for name in _ARRAYS:
+            column = np.zeros(capacity, dtype=_DTYPES[name])
+            column[: self._size] = self._columns[name][: self._size]
+            self._columns[name] = column
+
+    def upsert(self, record: Dict[str, Any]) -> None:
+        task_id = record["id"]
+        row = self._rows.get(task_id)
+        if row is None:
+            self._grow()
+            row = self._size
+            self._rows[task_id] = row
+            self._titles.append("")
+            self._descriptions.append(None)
+            self._search_text.append("")
+            self._size += 1
+        columns = self._columns
+        columns["ids"][row] = task_id
+        columns["status"][row] = _STATUS_CODE[TaskStatus(record["status"])]
+        columns["priority"][row] = _PRIORITY_CODE[TaskPriority(record["priority"])]
+        columns["parent_id"][row] = record["parent_id"] or 0
+        columns["series_id"][row] = record["series_id"] or 0
+        if record["recurrence"]:
+            self._recurrence[task_id] = record["recurrence"]
+        else:
+            self._recurrence.pop(task_id, None)
+        for name in _TIME_COLUMNS:
+            value = record[name]
+            if value is not None and value.tzinfo is not None:
+                self._aware[name] = True
+            columns[name][row] = _epoch(value)
+        self._titles[row] = sys.intern(record["title"])
+        self._descriptions[row] = record["description"]
+        self._search_text[row] = f"{record['title']}\n{record['description'] or ''}".lower()
+        if self._loading:
+            self._touched_during_load.add(task_id)
+
+    def remove(self, task_id: int) -> None:
+        if self._loading:
+            self._removed_during_load.add(task_id)
+        row = self._rows.pop(task_id, None)
+        if row is None:
+            return
+        self._recurrence.pop(task_id, None)
+        last = self._size - 1
+        if row != last:
+            for name in _ARRAYS:
+                self._columns[name][row] = self._columns[name][last]
+            self._titles[row] = self._titles[last]
+            self._descriptions[row] = self._descriptions[last]
+            self._search_text[row] = self._search_text[last]
+            self._rows[int(self._columns["ids"][row])] = row
+        self._titles.pop()
+        self._descriptions.pop()
+        self._search_text.pop()
+        self._size = last
+
+    def apply(self, before: Optional[Dict[str, Any]], after: Optional[Dict[str, Any]]) -> None:
+        """TaskService listener: mirror every committed write"""
+        if not self.enabled:
+            return
+        if after is None:
+            self.remove(before["id"])
+        else:
+            self.upsert(after)
+
+    def _datetime(self, name: str, seconds: float) -> Optional[datetime]:
+        if np.isnan(seconds):
+            return None
+        value = _EPOCH + timedelta(microseconds=round(seconds * 1e6))
+        return value.replace(tzinfo=timezone.utc) if self._aware[name] else value
+
+    def _datetimes(self, name: str, seconds: np.ndarray) -> List[Optional[datetime]]:
+        missing = np.isnan(seconds)
+        micros = np.round(np.where(missing, 0, seconds) * 1e6).astype(np.int64)
+        values = micros.astype("datetime64[us]").astype(object).tolist()
+        if self._aware[name]:
+            values = [value.replace(tzinfo=timezone.utc) for value in values]
+        if missing.any():
+            for row in np.flatnonzero(missing):
+                values[row] = None
+        return values
+
+    def _records(self, rows: np.ndarray) -> List[Dict[str, Any]]:
+        columns = self._columns
+        titles, descriptions = self._titles, self._descriptions
+        values = {
+            "id": columns["ids"][rows].tolist(),
+            "title": [titles[row] for row in rows],
+            "description": [descriptions[row] for row in rows],
+            "status": [_STATUSES[code] for code in columns["status"][rows].tolist()],
+            "priority": [_PRIORITIES[code] for code in columns["priority"][rows].tolist()],
+            "parent_id": [parent_id or None for parent_id in columns["parent_id"][rows].tolist()],
+            "series_id": [series_id or None for series_id in columns["series_id"][rows].tolist()],
+        }
+        values["recurrence"] = [self._recurrence.get(task_id) for task_id in values["id"]]
+        for name in _TIME_COLUMNS:
+            values[name] = self._datetimes(name, columns[name][rows])
+        names = list(values)
+        return [dict(zip(names, row)) for row in zip(*values.values())]
+
+    def query(self, task_filter: TaskFilter) -> np.ndarray:
+        """Rows matching the filter, in the filter's sort order"""
+        size = self._size
+        columns = {name: column[:size] for name, column in self._columns.items()}
+        mask = np.ones(size, dtype=bool)
+        if self._recurrence:
+            # Series rows are represented by their occurrences
+            mask &= ~np.isin(columns["ids"], np.fromiter(self._recurrence, dtype=np.int64, count=len(self._recurrence)))
+        if task_filter.status:
+            mask &= columns["status"] == _STATUS_CODE[task_filter.status]
+        if task_filter.priority:
+            mask &= columns["priority"] == _PRIORITY_CODE[task_filter.priority]
+        if task_filter.parent_id is not None:
+            mask &= columns["parent_id"] == task_filter.parent_id
+        # NaN (no due date) compares False, like NULL in SQL
+        if task_filter.due_date_before:
+            mask &= columns["due_date"] <= _epoch(task_filter.due_date_before)
+        if task_filter.due_date_after:
+            mask &= columns["due_date"] >= _epoch(task_filter.due_date_after)
+        rows = np.flatnonzero(mask)
+
+        if task_filter.search:
+            needle = task_filter.search.lower()
+            search_text = self._search_text
+            hits = np.fromiter((needle in search_text[row] for row in rows), dtype=bool, count=len(rows))
+            rows = rows[hits]
+
+        keys = columns[task_filter.sort_by][rows].astype(np.float64)
+        tiebreak = columns["ids"][rows]
+        if task_filter.descending:
+            keys, tiebreak = -keys, -tiebreak
+
+        limit = task_filter.limit
+        if limit and limit < len(rows):
+            # Keep only rows that can make the first `limit`; ties at the cut stay in
+            kth = np.partition(keys, limit - 1)[limit - 1]
+            if not np.isnan(kth):
+                keep = keys <= kth
+                rows, keys, tiebreak = rows[keep], keys[keep], tiebreak[keep]
+
+        # lexsort puts NaN (no due date) last, matching NULLS LAST
+        rows = rows[np.lexsort((tiebreak, keys))]
+        return rows[:limit] if limit else rows
+
+    def open_columns(self) -> Dict[str, np.ndarray]:
+        """Arrays of the open tasks, series rows excluded; priority as its TaskPriority index"""
+        size = self._size
+        columns = {name: self._columns[name][:size] for name in ("ids", "priority", "due_date", "created_at")}
+        mask = self._columns["status"][:size] != _STATUS_CODE[TaskStatus.COMPLETED]
+        if self._recurrence:
+            mask &= ~np.isin(columns["ids"], np.fromiter(self._recurrence, dtype=np.int64, count=len(self._recurrence)))
+        return {name: column[mask] for name, column in columns.items()}
+
+    def open_series(self) -> List[Dict[str, Any]]:
+        """Open series rows of recurring tasks with their rule and first due date"""
+        columns = self._columns
+        series = []
+        for task_id, rule in self._recurrence.items():
+            row = self._rows[task_id]
+            if columns["status"][row] == _STATUS_CODE[TaskStatus.COMPLETED] or np.isnan(columns["due_date"][row]):
+                continue
+            series.append({
+                "id": task_id,
+                "recurrence": rule,
+                "priority": _PRIORITIES[columns["priority"][row]],
+                "due_date": self._datetime("due_date", columns["due_date"][row]),
+                "created_at": self._datetime("created_at", columns["created_at"][row]),
+            })
+        return series
+
+    def saved_occurrences(self, series_ids: List[int], after: datetime) -> Dict[int, Set[datetime]]:
+        """Series id -> dates of its occurrences saved as rows, from `after` on"""
+        size = self._size
+        series_id, occurrence_date = self._columns["series_id"][:size], self._columns["occurrence_date"][:size]
+        mask = np.isin(series_id, np.asarray(series_ids, dtype=np.int64)) & (occurrence_date >= _epoch(after))
+        saved: Dict[int, Set[datetime]] = {}
+        for row in np.flatnonzero(mask):
+            saved.setdefault(int(series_id[row]), set()).add(self._datetime("occurrence_date", occurrence_date[row]))
+        return saved
+
+    def filter(self, task_filter: TaskFilter, fields: Optional[List[str]] = None) -> list:
+        """Same results as TaskService.filter_tasks on the tasks table.
+
+        Returns SnapshotTask objects, or plain dicts when `fields` is given.
+        """
+        records = self._records(self.query(task_filter))
+        if fields:
+            return [{field: record[field] for field in fields} for record in records]
+        return [SnapshotTask(**record) for record in records]
+
+    async def load(self) -> None:
+        """Restore from the snapshot file and catch up, or read the whole table"""
+        if not self.enabled:
+            return
+        self._loading = True
+        started = time.perf_counter()
+        try:
+            watermark = self._restore() if self.path else None
+            async with AsyncSessionLocal() as db:
+                if watermark is None:
+                    await self._read(db, select(*Task.__table__.columns))
+                else:
+                    await self._catch_up(db, watermark)
+            self.ready = True
+            logger.info(f"Task snapshot ready: {self._size} tasks in {time.perf_counter() - started:.2f}s")
+        except Exception as e:
+            logger.error(f"Failed to load task snapshot: {e}")
+        finally:
+            self._loading = False
+            self._touched_during_load.clear()
+            self._removed_during_load.clear()
+
+    async def _read(self, db, query) -> None:
+        result = await db.stream(query.execution_options(yield_per=LOAD_CHUNK_SIZE))
+        async for partition in result.partitions(LOAD_CHUNK_SIZE):
+            for row in partition:
+                record = dict(row._mapping)
+                if record["id"] not in self._removed_during_load and record["id"] not in self._touched_during_load:
+                    self.upsert(record)
+
+    async def _catch_up(self, db, watermark: datetime) -> None:
+        # Rows changed since the snapshot, then drop rows deleted since
+        await self._read(db, select(*Task.__table__.columns).where(Task.updated_at >= watermark))
+        live: Set[int] = set()
+        result = await db.stream(select(Task.id).execution_options(yield_per=LOAD_CHUNK_SIZE))
+        async for task_id in result.scalars():
+            live.add(task_id)
+        for task_id in [task_id for task_id in self._rows if task_id not in live and task_id not in self._touched_during_load]:
+            self.remove(task_id)
+
+    def _copy(self) -> Dict[str, Any]:
+        size = self._size
+        return {
+            "columns": {name: column[:size].copy() for name, column in self._columns.items()},
+            "titles": list(self._titles),
+            "descriptions": list(self._descriptions),
+            "recurrence": dict(self._recurrence),
+            "aware": dict(self._aware),
+        }
+
+    def save(self, data: Optional[Dict[str, Any]] = None) -> None:
+        """Write the snapshot under `path` as .npy files, then switch CURRENT to it"""
+        if not self.path or not self.ready:
+            return
+        data = data or self._copy()
+        os.makedirs(self.path, exist_ok=True)
+        name = f"snapshot-{time.time_ns()}"
+        target = os.path.join(self.path, name)
+        os.makedirs(target)
+
+        for column, values in data["columns"].items():
+            np.save(os.path.join(target, f"{column}.npy"), values)
+        for column in ("titles", "descriptions"):
+            strings = data[column]
+            encoded = [(value or "").encode("utf-8") for value in strings]
+            offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+            np.cumsum([len(value) for value in encoded], out=offsets[1:])
+            np.save(os.path.join(target, f"{column}.offsets.npy"), offsets)
+            np.save(os.path.join(target, f"{column}.nulls.npy"), np.array([value is None for value in strings], dtype=bool))
+            with open(os.path.join(target, f"{column}.bin"), "wb") as handle:
+                handle.write(b"".join(encoded))
+
+        updated = data["columns"]["updated_at"]
+        meta = {
+            "size": len(data["titles"]),
+            "aware": data["aware"],
+            "recurrence": data["recurrence"],
+            "watermark": float(np.nanmax(updated)) if len(updated) else None,
+        }
+        with open(os.path.join(target, "meta.json"), "w") as handle:
+            json.dump(meta, handle)
+
+        # Atomic switch, then drop older snapshots
+        pointer = os.path.join(self.path, "CURRENT")
+        with open(pointer + ".tmp", "w") as handle:
+            handle.write(name)
+        os.replace(pointer + ".tmp", pointer)
+        for entry in os.listdir(self.path):
+            if entry.startswith("snapshot-") and entry != name:
+                shutil.rmtree(os.path.join(self.path, entry), ignore_errors=True)
+
+    def _restore(self) -> Optional[datetime]:
+        """Map the current snapshot back in; returns its watermark, or None if absent"""
+        try:
+            with open(os.path.join(self.path, "CURRENT")) as handle:
+                target = os.path.join(self.path, handle.read().strip())
+            with open(os.path.join(target, "meta.json")) as handle:
+                meta = json.load(handle)
+            # Copy-on-write maps: pages load lazily, writes stay private until the next grow
+            columns = {name: np.load(os.path.join(target, f"{name}.npy"), mmap_mode="c") for name in _ARRAYS}
+        except (OSError, ValueError):
+            # Missing or from an older layout: fall back to a full read
+            return None
+
+        self._columns = columns
+        strings = {}
+        for column in ("titles", "descriptions"):
+            offsets = np.load(os.path.join(target, f"{column}.offsets.npy"))
+            nulls = np.load(os.path.join(target, f"{column}.nulls.npy"))
+            with open(os.path.join(target, f"{column}.bin"), "rb") as handle:
+                blob = handle.read()
+            strings[column] = [
+                None if nulls[i] else blob[offsets[i]:offsets[i + 1]].decode("utf-8")
+                for i in range(meta["size"])
+            ]
+        self._titles = [sys.intern(title or "") for title in strings["titles"]]
+        self._descriptions = strings["descriptions"]
+        self._search_text = [
+            f"{title}\n{description or ''}".lower()
+            for title, description in zip(self._titles, self._descriptions)
+        ]
+        self._size = meta["size"]
+        self._aware.update(meta["aware"])
+        self._recurrence = {int(task_id): rule for task_id, rule in meta.get("recurrence", {}).items()}
+        self._rows = {int(task_id): row for row, task_id in enumerate(self._columns["ids"][: self._size])}
+
+        if meta["watermark"] is None:
+            return _EPOCH
+        return self._datetime("updated_at", meta["watermark"]) - timedelta(seconds=CATCH_UP_MARGIN_SECONDS)
+
+    async def run(self, interval: float = TASK_SNAPSHOT_SAVE_SECONDS) -> None:
+        """Background loop: load, then save the snapshot every `interval` seconds"""
+        if not self.enabled:
+            return
+        await self.load()
+        if not self.path:
+            return
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                # Copy on the event loop so writes cannot interleave, then write off it
+                await asyncio.to_thread(self.save, self._copy())
+            except Exception as e:
+                logger.error(f"Failed to save task snapshot: {e}")
+
+
+# Global snapshot instance; TaskService registers it as a listener
+task_snapshot = TaskSnapshot()
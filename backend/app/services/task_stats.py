@@ -0,0 +1,173 @@
+import asyncio
+import logging
+import os
+from bisect import bisect_left, bisect_right, insort
+from collections import Counter
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Optional
+
+from sqlalchemy import func
+from sqlalchemy.future import select
+
+from app.database.connection import AsyncSessionLocal
+from app.models.task import Task, TaskStatus, TaskPriority
+from app.services import recurrence
+from app.services.date_resolver import local_now
+from app.services.task_service import TaskService
+
+logger = logging.getLogger(__name__)
+
+# Seconds between full SQL reconciliations of the in-memory counters
+RECONCILE_INTERVAL = float(os.getenv("TASK_STATS_RECONCILE_SECONDS", "300"))
+
+
+class TaskStats:
+    """Task counters kept current by TaskService writes.
+
+    Status and priority counts are plain counters. Overdue / due-today depend
+    on the clock, so open due dates are kept sorted and answered by bisection.
+    A recurring series counts with its next occurrence from today on that is
+    not saved as a row; the reconciler moves it on as days pass.
+    """
+
+    def __init__(self):
+        self._by_status: Counter = Counter()
+        self._by_priority: Counter = Counter()
+        self._open_due: List[datetime] = []
+        self._occurrences = recurrence.OccurrenceTracker()
+        # Series id -> the occurrence it contributes to _open_due
+        self._series_due: Dict[int, datetime] = {}
+        self._version = 0
+        self.reconciled_at: Optional[datetime] = None
+
+    def apply(self, before: Optional[Dict[str, Any]], after: Optional[Dict[str, Any]]) -> None:
+        """TaskService listener: move a task's contribution from before to after"""
+        if before:
+            self._remove(before)
+        series_id = self._occurrences.apply(before, after)
+        if after:
+            self._add(after)
+        if series_id is not None:
+            # An occurrence was saved or dropped, so the series may be due on another date
+            self._discard_due(self._series_due.pop(series_id, None))
+            self._add_series_due(series_id)
+        self._version += 1
+
+    def _add(self, record: Dict[str, Any]) -> None:
+        self._by_status[record["status"]] += 1
+        self._by_priority[record["priority"]] += 1
+        if record["status"] == TaskStatus.COMPLETED:
+            return
+        if record["recurrence"]:
+            self._add_series_due(record["id"])
+        elif record["due_date"]:
+            insort(self._open_due, record["due_date"])
+
+    def _remove(self, record: Dict[str, Any]) -> None:
+        self._by_status[record["status"]] -= 1
+        self._by_priority[record["priority"]] -= 1
+        if record["status"] == TaskStatus.COMPLETED:
+            return
+        if record["recurrence"]:
+            self._discard_due(self._series_due.pop(record["id"], None))
+        else:
+            self._discard_due(record["due_date"])
+
+    def _add_series_due(self, series_id: int) -> None:
+        due_date = self._occurrences.next_due(series_id, recurrence.start_of_day())
+        if due_date:
+            self._series_due[series_id] = due_date
+            insort(self._open_due, due_date)
+
+    def _discard_due(self, due_date: Optional[datetime]) -> None:
+        if due_date:
+            index = bisect_left(self._open_due, due_date)
+            if index < len(self._open_due) and self._open_due[index] == due_date:
+                self._open_due.pop(index)
+
+    def snapshot(self, now: Optional[datetime] = None) -> Dict[str, Any]:
+        """Current statistics; cost is independent of the number of tasks"""
+        now = now or local_now()
+        start_of_day = now.replace(hour=0, minute=0, second=0, microsecond=0)
+        end_of_day = start_of_day + timedelta(days=1)
+        overdue = bisect_left(self._open_due, now)
+        return {
+            "total": sum(self._by_status.values()),
+            "by_status": {status.value: self._by_status[status] for status in TaskStatus},
+            "by_priority": {priority.value: self._by_priority[priority] for priority in TaskPriority},
+            "overdue": overdue,
+            "due_today": bisect_left(self._open_due, end_of_day) - bisect_right(self._open_due, now),
+            "reconciled_at": self.reconciled_at,
+        }
+
+    async def reconcile(self) -> bool:
+        """Rebuild counters from a full SQL aggregate.
+
+        Returns False (keeping the incremental counters) if a write landed while
+        the aggregate was running; the next run will pick it up.
+        """
+        version = self._version
+        async with AsyncSessionLocal() as db:
+            counts = await db.execute(
+                select(Task.status, Task.priority, func.count(Task.id))
+                .group_by(Task.status, Task.priority)
+            )
+            due_dates = await db.execute(
+                select(Task.due_date)
+                .where(Task.status != TaskStatus.COMPLETED, Task.due_date.isnot(None), Task.recurrence.is_(None))
+                .order_by(Task.due_date)
+            )
+            by_status: Counter = Counter()
+            by_priority: Counter = Counter()
+            for status, priority, count in counts:
+                by_status[status] += count
+                by_priority[priority] += count
+            open_due = list(due_dates.scalars())
+
+            # Recurring series count with their next occurrence not saved as a row
+            today = recurrence.start_of_day()
+            occurrences = recurrence.OccurrenceTracker()
+            series = await db.execute(
+                select(Task.id, Task.status, Task.due_date, Task.recurrence)
+                .where(Task.status != TaskStatus.COMPLETED, Task.due_date.isnot(None), Task.recurrence.isnot(None))
+            )
+            for row in series:
+                occurrences.track(dict(row._mapping))
+            saved = await db.execute(
+                select(Task.series_id, Task.occurrence_date)
+                .where(Task.series_id.isnot(None), Task.occurrence_date >= today)
+            )
+            for series_id, occurrence_date in saved:
+                occurrences.save(series_id, occurrence_date)
+
+        series_due = {}
+        for series_id in occurrences.series_ids():
+            due_date = occurrences.next_due(series_id, today)
+            if due_date:
+                series_due[series_id] = due_date
+                insort(open_due, due_date)
+
+        if version != self._version:
+            return False
+
+        self._by_status = by_status
+        self._by_priority = by_priority
+        self._open_due = open_due
+        self._occurrences = occurrences
+        self._series_due = series_due
+        self.reconciled_at = datetime.now()
+        return True
+
+    async def run_reconciler(self, interval: float = RECONCILE_INTERVAL) -> None:
+        """Background loop: reconcile now, then every `interval` seconds"""
+        while True:
+            try:
+                await self.reconcile()
+            except Exception as e:
+                logger.error(f"Task stats reconciliation failed: {e}")
+            await asyncio.sleep(interval)
+
+
+# Global stats instance
+task_stats = TaskStats()
+TaskService.add_listener(task_stats.apply)
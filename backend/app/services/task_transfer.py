@@ -0,0 +1,139 @@
+import codecs
+import csv
+import io
+import json
+import logging
+import os
+from typing import Any, AsyncIterator, Dict, List, Tuple
+
+from pydantic import ValidationError
+
+from app.database.connection import AsyncSessionLocal, read_session
+from app.schemas.task import TaskCreate
+from app.services.task_service import TASK_FIELDS, TaskService, plain_value
+
+logger = logging.getLogger(__name__)
+
+EXPORT_FIELDS = TASK_FIELDS
+# Columns accepted on import; anything else (id, timestamps) is ignored
+IMPORT_FIELDS = ["title", "description", "status", "due_date", "priority"]
+
+EXPORT_CHUNK_SIZE = int(os.getenv("EXPORT_CHUNK_SIZE", "1000"))
+IMPORT_CHUNK_SIZE = int(os.getenv("IMPORT_CHUNK_SIZE", "500"))
+# Per-row errors kept in the import report; later ones are only counted
+MAX_REPORTED_ERRORS = 1000
+
+FORMATS = {"ndjson": "application/x-ndjson", "csv": "text/csv"}
+
+
+async def export_tasks(fmt: str, include_archived: bool = False) -> AsyncIterator[str]:
+    """Stream all tasks as NDJSON or CSV, one chunk of rows at a time"""
+    async with read_session() as db:
+        task_service = TaskService(db)
+        if fmt == "csv":
+            buffer = io.StringIO()
+            writer = csv.writer(buffer)
+            writer.writerow(EXPORT_FIELDS)
+            async for records in task_service.stream_tasks(include_archived, EXPORT_CHUNK_SIZE):
+                writer.writerows([plain_value(record[field]) for field in EXPORT_FIELDS] for record in records)
+                yield buffer.getvalue()
+                buffer.seek(0)
+                buffer.truncate()
+            yield buffer.getvalue()
+        else:
+            async for records in task_service.stream_tasks(include_archived, EXPORT_CHUNK_SIZE):
+                yield "".join(
+                    json.dumps({field: plain_value(record[field]) for field in EXPORT_FIELDS}) + "\n"
+                    for record in records
+                )
+
+
+async def _ndjson_rows(chunks: AsyncIterator[bytes]) -> AsyncIterator[Tuple[int, Any]]:
+    pending = b""
+    row = 0
+    async for chunk in chunks:
+        pending += chunk
+        *lines, pending = pending.split(b"\n")
+        for line in lines:
+            if line.strip():
+                row += 1
+                yield row, line
+    if pending.strip():
+        yield row + 1, pending
+
+
+async def _csv_rows(chunks: AsyncIterator[bytes]) -> AsyncIterator[Tuple[int, Any]]:
+    decoder = codecs.getincrementaldecoder("utf-8-sig")()
+    pending = ""
+    header = None
+    row = 0
+
+    def parse(text: str):
+        nonlocal header, row
+        for values in csv.reader(io.StringIO(text)):
+            if not values:
+                continue
+            if header is None:
+                header = [name.strip() for name in values]
+                continue
+            row += 1
+            yield row, dict(zip(header, values))
+
+    async for chunk in chunks:
+        pending += decoder.decode(chunk)
+        end = pending.rfind("\n") + 1
+        # An odd number of quotes means a quoted field spans the cut; wait for more
+        if end and pending.count('"', 0, end) % 2 == 0:
+            for item in parse(pending[:end]):
+                yield item
+            pending = pending[end:]
+    pending += decoder.decode(b"", final=True)
+    for item in parse(pending):
+        yield item
+
+
+def _to_task_create(fmt: str, raw: Any) -> TaskCreate:
+    data = json.loads(raw) if fmt == "ndjson" else raw
+    if not isinstance(data, dict):
+        raise ValueError("Expected an object per row")
+    # Blank CSV cells mean "use the default", not an empty value
+    fields = {key: data[key] for key in IMPORT_FIELDS if data.get(key) not in (None, "")}
+    return TaskCreate(**fields)
+
+
+async def import_tasks(fmt: str, chunks: AsyncIterator[bytes]) -> Dict[str, Any]:
+    """Parse an upload incrementally and insert it in chunked multi-row INSERTs"""
+    rows = _csv_rows(chunks) if fmt == "csv" else _ndjson_rows(chunks)
+    report: Dict[str, Any] = {"imported": 0, "failed": 0, "errors": []}
+
+    def fail(row: int, error: str) -> None:
+        report["failed"] += 1
+        if len(report["errors"]) < MAX_REPORTED_ERRORS:
+            report["errors"].append({"row": row, "error": error})
+
+    async with AsyncSessionLocal() as db:
+        task_service = TaskService(db)
+        batch: List[Tuple[int, TaskCreate]] = []
+
+        async def flush() -> None:
+            try:
+                report["imported"] += await task_service.create_tasks_bulk([task for _, task in batch])
+            except Exception as e:
+                await db.rollback()
+                for row, _ in batch:
+                    fail(row, f"Insert failed: {e}")
+            batch.clear()
+            logger.info(f"Task import progress: {report['imported']} imported, {report['failed']} failed")
+
+        async for row, raw in rows:
+            try:
+                batch.append((row, _to_task_create(fmt, raw)))
+            except (ValueError, ValidationError) as e:
+                fail(row, str(e))
+                continue
+            if len(batch) >= IMPORT_CHUNK_SIZE:
+                await flush()
+        if batch:
+            await flush()
+
+    return report
@@ -0,0 +1,284 @@
+import atexit
+import contextvars
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import random
+import re
+import sys
+import time
+import uuid
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from typing import Any, Dict, Iterator, List, Optional
+
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO").upper()
+# Per-logger overrides, e.g. "sqlalchemy.engine=WARNING,app.agents=DEBUG"
+LOG_LEVELS = os.getenv("LOG_LEVELS", "")
+# json | text
+LOG_FORMAT = os.getenv("LOG_FORMAT", "json")
+# Share of DEBUG/INFO records kept; warnings and errors are always kept
+LOG_SAMPLE_RATE = float(os.getenv("LOG_SAMPLE_RATE", "1.0"))
+# Records beyond this many waiting to be written are dropped rather than blocking
+LOG_QUEUE_SIZE = int(os.getenv("LOG_QUEUE_SIZE", "10000"))
+
+# JSON-lines file finished traces are appended to; empty disables export
+TRACE_FILE = os.getenv("TRACE_FILE", "")
+TRACE_SAMPLE_RATE = float(os.getenv("TRACE_SAMPLE_RATE", "1.0"))
+# Traces slower than this, or that failed, are exported regardless of sampling
+TRACE_SLOW_MS = float(os.getenv("TRACE_SLOW_MS", "2000"))
+MAX_SPANS_PER_TRACE = 200
+
+_TRACE_ID = re.compile(r"^[A-Za-z0-9-]{1,64}$")
+_TRACE_LOGGER = "app.trace"
+
+_current_trace: contextvars.ContextVar[Optional["Trace"]] = contextvars.ContextVar("current_trace", default=None)
+_current_span: contextvars.ContextVar[Optional[str]] = contextvars.ContextVar("current_span", default=None)
+
+
+class Span:
+    """One timed step of a trace; spans started outside a trace are not recorded"""
+
+    __slots__ = ("trace", "name", "span_id", "parent_id", "started", "duration_ms", "attrs", "error")
+
+    def __init__(self, trace: Optional["Trace"], name: str, parent_id: Optional[str], attrs: Dict[str, Any]):
+        self.trace = trace
+        self.name = name
+        self.span_id = uuid.uuid4().hex[:16] if trace is not None else None
+        self.parent_id = parent_id
+        self.started = time.perf_counter()
+        self.duration_ms: Optional[float] = None
+        self.attrs = attrs
+        self.error: Optional[str] = None
+        if trace is not None:
+            trace.add(self)
+
+    def set(self, **attrs: Any) -> None:
+        self.attrs.update(attrs)
+
+    def finish(self, error: Optional[BaseException] = None) -> None:
+        if self.duration_ms is not None:
+            return
+        self.duration_ms = (time.perf_counter() - self.started) * 1000
+        if error is not None:
+            self.error = f"{type(error).__name__}: {error}"
+
+    def to_dict(self, trace_started: float) -> Dict[str, Any]:
+        entry = {
+            "name": self.name,
+            "span_id": self.span_id,
+            "parent_id": self.parent_id,
+            "start_ms": round((self.started - trace_started) * 1000, 2),
+            "duration_ms": round(self.duration_ms, 2) if self.duration_ms is not None else None,
+        }
+        if self.attrs:
+            entry["attrs"] = self.attrs
+        if self.error:
+            entry["error"] = self.error
+        return entry
+
+
+class Trace:
+    def __init__(self, name: str, trace_id: Optional[str] = None):
+        self.name = name
+        self.trace_id = trace_id if trace_id and _TRACE_ID.match(trace_id) else uuid.uuid4().hex
+        self.started = time.perf_counter()
+        self.started_at = datetime.now(timezone.utc)
+        self.spans: List[Span] = []
+        self.dropped = 0
+
+    def add(self, span: Span) -> None:
+        if len(self.spans) < MAX_SPANS_PER_TRACE:
+            self.spans.append(span)
+        else:
+            self.dropped += 1
+
+    def to_dict(self) -> Dict[str, Any]:
+        root = self.spans[0]
+        return {
+            "trace_id": self.trace_id,
+            "name": self.name,
+            "start": self.started_at.isoformat(),
+            "duration_ms": round(root.duration_ms or 0.0, 2),
+            "error": root.error,
+            "spans": [span.to_dict(self.started) for span in self.spans],
+            "dropped_spans": self.dropped,
+        }
+
+
+def current_trace_id() -> Optional[str]:
+    trace = _current_trace.get()
+    return trace.trace_id if trace is not None else None
+
+
+def start_span(name: str, **attrs: Any) -> Span:
+    """Start a span under the current one without making it current; call finish() on it"""
+    return Span(_current_trace.get(), name, _current_span.get(), attrs)
+
+
+@contextmanager
+def span(name: str, **attrs: Any) -> Iterator[Span]:
+    """Time a block as a child of the current span"""
+    current = start_span(name, **attrs)
+    token = _current_span.set(current.span_id)
+    try:
+        yield current
+    except BaseException as e:
+        current.finish(e)
+        raise
+    finally:
+        current.finish()
+        _current_span.reset(token)
+
+
+@contextmanager
+def trace(name: str, trace_id: Optional[str] = None, **attrs: Any) -> Iterator[Span]:
+    """Start a trace with a root span; it is exported to TRACE_FILE when it ends"""
+    current = Trace(name, trace_id)
+    trace_token = _current_trace.set(current)
+    try:
+        with span(name, **attrs) as root:
+            yield root
+    finally:
+        _current_trace.reset(trace_token)
+        _export(current)
+
+
+def _export(finished: Trace) -> None:
+    if not TRACE_FILE:
+        return
+    root = finished.spans[0]
+    keep = root.error or (root.duration_ms or 0.0) >= TRACE_SLOW_MS or random.random() < TRACE_SAMPLE_RATE
+    if keep:
+        # Written by the log listener thread, like every other record
+        logging.getLogger(_TRACE_LOGGER).info(json.dumps(finished.to_dict(), default=str))
+
+
+class _TraceContext(logging.Filter):
+    """Stamps records with the trace id while still on the calling thread"""
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        record.trace_id = current_trace_id()
+        return True
+
+
+class SamplingFilter(logging.Filter):
+    def __init__(self, rate: float):
+        super().__init__()
+        self.rate = rate
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if record.levelno >= logging.WARNING or record.name == _TRACE_LOGGER or self.rate >= 1:
+            return True
+        return random.random() < self.rate
+
+
+class JsonFormatter(logging.Formatter):
+    _RESERVED = set(vars(logging.LogRecord("", 0, "", 0, "", (), None))) | {"message", "asctime", "trace_id"}
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "ts": datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        if getattr(record, "trace_id", None):
+            entry["trace_id"] = record.trace_id
+        # Fields passed with extra={...}
+        for key, value in record.__dict__.items():
+            if key not in self._RESERVED:
+                entry[key] = value
+        return json.dumps(entry, default=str)
+
+
+class _DroppingQueueHandler(logging.handlers.QueueHandler):
+    """Never blocks the caller: a full queue drops the record and counts it"""
+
+    def __init__(self, log_queue: queue.Queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+
+    def enqueue(self, record: logging.LogRecord) -> None:
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+class _OnlyLogger(logging.Filter):
+    def __init__(self, name: str, include: bool):
+        super().__init__()
+        self.logger_name = name
+        self.include = include
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        return (record.name == self.logger_name) == self.include
+
+
+_queue_handler: Optional[_DroppingQueueHandler] = None
+_listener: Optional[logging.handlers.QueueListener] = None
+
+
+def configure_logging() -> None:
+    """Route all records through a bounded queue to a background writer thread.
+
+    Callers on the event loop only pay for building the record and a
+    non-blocking put; formatting and console/file I/O happen on the
+    listener thread.
+    """
+    global _queue_handler, _listener
+    if _listener is not None:
+        return
+
+    console = logging.StreamHandler(sys.stderr)
+    if LOG_FORMAT == "json":
+        console.setFormatter(JsonFormatter())
+    else:
+        console.setFormatter(logging.Formatter("%(asctime)s %(levelname)s %(name)s [%(trace_id)s] %(message)s"))
+    console.addFilter(_OnlyLogger(_TRACE_LOGGER, include=False))
+    handlers: List[logging.Handler] = [console]
+    if TRACE_FILE:
+        trace_file = logging.FileHandler(TRACE_FILE)
+        trace_file.setFormatter(logging.Formatter("%(message)s"))
+        trace_file.addFilter(_OnlyLogger(_TRACE_LOGGER, include=True))
+        handlers.append(trace_file)
+
+    log_queue: queue.Queue = queue.Queue(LOG_QUEUE_SIZE)
+    _queue_handler = _DroppingQueueHandler(log_queue)
+    _queue_handler.addFilter(SamplingFilter(LOG_SAMPLE_RATE))
+    _queue_handler.addFilter(_TraceContext())
+
+    root = logging.getLogger()
+    root.handlers[:] = [_queue_handler]
+    root.setLevel(LOG_LEVEL)
+    logging.getLogger(_TRACE_LOGGER).setLevel(logging.INFO)
+    for override in filter(None, LOG_LEVELS.split(",")):
+        name, _, level = override.partition("=")
+        if name.strip() and level.strip():
+            logging.getLogger(name.strip()).setLevel(level.strip().upper())
+
+    _listener = logging.handlers.QueueListener(log_queue, *handlers, respect_handler_level=True)
+    _listener.start()
+    atexit.register(shutdown_logging)
+
+
+def shutdown_logging() -> None:
+    """Write out queued records and stop the writer thread"""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        for handler in _listener.handlers:
+            handler.close()
+        _listener = None
+
+
+def metrics() -> Dict[str, Any]:
+    return {
+        "queued": _queue_handler.queue.qsize() if _queue_handler else 0,
+        "dropped": _queue_handler.dropped if _queue_handler else 0,
+        "sample_rate": LOG_SAMPLE_RATE,
+        "trace_file": TRACE_FILE or None,
+    }
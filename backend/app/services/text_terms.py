@@ -0,0 +1,21 @@
+import re
+from typing import List
+
+_TOKEN = re.compile(r"[a-z0-9]+")
+STOPWORDS = frozenset(
+    "a an and are about as at be by do for from has have i in is it me my of on or "
+    "that the this to was what which with".split()
+)
+
+
+def stem(word: str) -> str:
+    """Crude suffix stripping so "reports" / "reporting" land on "report" """
+    for suffix in ("ing", "ies", "es", "ed", "s"):
+        if word.endswith(suffix) and len(word) - len(suffix) >= 3:
+            return word[: -len(suffix)] + ("y" if suffix == "ies" else "")
+    return word
+
+
+def words(text: str) -> List[str]:
+    """Lowercased, stemmed words of a text with stopwords removed"""
+    return [stem(word) for word in _TOKEN.findall(text.lower()) if word not in STOPWORDS]
@@ -1,20 +1,43 @@
 from langchain_core.tools import tool
 from typing import Optional, List, Dict, Any
-from datetime import datetime
 from pydantic import Field
 
-from app.services.task_service import TaskService
+from app.services.task_service import TaskService, parse_fields, plain_value
 from app.schemas.task import TaskCreate, TaskUpdate, TaskFilter
 from app.models.task import TaskStatus, TaskPriority
-from app.database.connection import AsyncSessionLocal
+from app.database.connection import AsyncSessionLocal, read_session
+from app.services.date_resolver import resolve_date, resolve_range
+from app.services.task_dedup import DuplicateTaskError
+from app.services.task_search import task_search
+from app.services.task_ranking import task_ranker
+from app.services.task_graph import TaskGraphError
+from app.services import recurrence
+
+
+def _task_dicts(tasks: list) -> List[Dict[str, Any]]:
+    """Serialize full Task objects or projected rows"""
+    return [
+        {key: plain_value(value) for key, value in task.items()} if isinstance(task, dict) else task.to_dict()
+        for task in tasks
+    ]
+
+
+async def _find_task(task_service: TaskService, identifier: str):
+    """Look a task up by ID, falling back to title"""
+    try:
+        return await task_service.get_task_by_id(int(identifier))
+    except ValueError:
+        return await task_service.get_task_by_title(identifier)
 
 
 @tool
 async def create_task(
     title: str = Field(..., description="The title of the task"),
     description: Optional[str] = Field(None, description="The description of the task"),
-    due_date: Optional[str] = Field(None, description="Due date in ISO format (YYYY-MM-DD or YYYY-MM-DDTHH:MM:SS)"),
-    priority: Optional[str] = Field("medium", description="Priority: low, medium, high, urgent")
+    due_date: Optional[str] = Field(None, description="Due date: ISO format or natural language such as 'tomorrow at 3pm', 'next friday', 'in 3 days'"),
+    priority: Optional[str] = Field("medium", description="Priority: low, medium, high, urgent"),
+    parent: Optional[str] = Field(None, description="ID or title of the task this is a subtask of"),
+    repeat: Optional[str] = Field(None, description="How often the task repeats, e.g. 'every monday', 'daily', 'every 2 weeks'; due_date is then the first occurrence")
 ) -> Dict[str, Any]:
     """Create a new task with the given parameters."""
     async with AsyncSessionLocal() as db:
@@ -23,10 +46,9 @@ async def create_task(
         # Parse due date if provided
         parsed_due_date = None
         if due_date:
-            try:
-                parsed_due_date = datetime.fromisoformat(due_date.replace('Z', '+00:00'))
-            except ValueError:
-                return {"error": f"Invalid date format: {due_date}. Use YYYY-MM-DD or YYYY-MM-DDTHH:MM:SS"}
+            parsed_due_date = resolve_date(due_date)
+            if parsed_due_date is None:
+                return {"error": f"Invalid date: {due_date}. Use YYYY-MM-DD or a phrase like 'tomorrow at 3pm'"}
         
         # Parse priority
         task_priority = TaskPriority.MEDIUM
@@ -35,21 +57,41 @@ async def create_task(
                 task_priority = TaskPriority(priority.lower())
             except ValueError:
                 return {"error": f"Invalid priority: {priority}. Use: low, medium, high, urgent"}
+
+        parent_id = None
+        if parent:
+            parent_task = await _find_task(task_service, parent)
+            if not parent_task:
+                return {"error": f"Parent task not found: {parent}"}
+            parent_id = parent_task.id
         
         task_data = TaskCreate(
             title=title,
             description=description,
             due_date=parsed_due_date,
-            priority=task_priority
+            priority=task_priority,
+            parent_id=parent_id,
+            recurrence=repeat
         )
         
         try:
             task = await task_service.create_task(task_data)
+            if task.duplicate_of == task.id:
+                message = f"A similar task '{task.title}' already exists; merged into it"
+            elif task.duplicate_of:
+                message = f"Task '{title}' created, but it looks like a duplicate of task #{task.duplicate_of}"
+            else:
+                message = f"Task '{title}' created successfully!"
             return {
                 "success": True,
-                "task": task.to_dict(),
-                "message": f"Task '{title}' created successfully!"
+                "task": {**task.to_dict(), "duplicate_of": task.duplicate_of},
+                "message": message
             }
+        except DuplicateTaskError as e:
+            return {"error": str(e), "duplicate_of": e.match.task_id}
+        except ValueError as e:
+            # Bad parent or repeat rule
+            return {"error": str(e)}
         except Exception as e:
             return {"error": f"Failed to create task: {str(e)}"}
 
@@ -60,8 +102,9 @@ async def update_task(
     title: Optional[str] = Field(None, description="New title for the task"),
     description: Optional[str] = Field(None, description="New description for the task"),
     status: Optional[str] = Field(None, description="New status: pending, in_progress, completed"),
-    due_date: Optional[str] = Field(None, description="New due date in ISO format"),
-    priority: Optional[str] = Field(None, description="New priority: low, medium, high, urgent")
+    due_date: Optional[str] = Field(None, description="New due date: ISO format or natural language such as 'tomorrow', 'next monday 9am'"),
+    priority: Optional[str] = Field(None, description="New priority: low, medium, high, urgent"),
+    occurrence: Optional[str] = Field(None, description="For a repeating task, the date of the one occurrence to change (e.g. 'today', 'next monday'); the rest of the series is left alone")
 ) -> Dict[str, Any]:
     """Update an existing task by ID or title."""
     async with AsyncSessionLocal() as db:
@@ -70,10 +113,9 @@ async def update_task(
         # Parse due date if provided
         parsed_due_date = None
         if due_date:
-            try:
-                parsed_due_date = datetime.fromisoformat(due_date.replace('Z', '+00:00'))
-            except ValueError:
-                return {"error": f"Invalid date format: {due_date}"}
+            parsed_due_date = resolve_date(due_date)
+            if parsed_due_date is None:
+                return {"error": f"Invalid date: {due_date}"}
         
         # Parse status
         task_status = None
@@ -91,15 +133,36 @@ async def update_task(
             except ValueError:
                 return {"error": f"Invalid priority: {priority}. Use: low, medium, high, urgent"}
         
-        update_data = TaskUpdate(
-            title=title,
-            description=description,
-            status=task_status,
-            due_date=parsed_due_date,
-            priority=task_priority
-        )
+        # Only fields that were given count as set, so the rest are left alone
+        changes = {
+            "title": title,
+            "description": description,
+            "status": task_status,
+            "due_date": parsed_due_date,
+            "priority": task_priority
+        }
+        update_data = TaskUpdate(**{field: value for field, value in changes.items() if value is not None})
         
         try:
+            if occurrence:
+                series = await _find_task(task_service, identifier)
+                if not series or not series.recurrence:
+                    return {"error": f"Repeating task not found: {identifier}"}
+                day = resolve_date(occurrence)
+                occurrence_date = day and recurrence.occurrence_on(
+                    recurrence.parse_rule(series.recurrence), series.due_date, day.date()
+                )
+                if not occurrence_date:
+                    return {"error": f"'{series.title}' has no occurrence on {occurrence}"}
+                task = await task_service.update_occurrence(series.id, occurrence_date, update_data)
+                if not task:
+                    return {"error": f"No occurrence of '{series.title}' on {occurrence_date:%Y-%m-%d}"}
+                return {
+                    "success": True,
+                    "task": task.to_dict(),
+                    "message": f"Task '{task.title}' on {occurrence_date:%Y-%m-%d} updated successfully!"
+                }
+
             # Try to parse as ID first
             try:
                 task_id = int(identifier)
@@ -150,17 +213,18 @@ async def delete_task(
 
 @tool
 async def list_tasks(
-    limit: int = Field(50, description="Maximum number of tasks to return")
+    limit: int = Field(50, description="Maximum number of tasks to return"),
+    fields: Optional[str] = Field(None, description="Comma-separated fields to return, e.g. 'title,status,priority'")
 ) -> Dict[str, Any]:
     """List all tasks."""
-    async with AsyncSessionLocal() as db:
+    async with read_session() as db:
         task_service = TaskService(db)
         
         try:
-            tasks = await task_service.get_tasks(limit=limit)
+            tasks = await task_service.get_tasks(limit=limit, fields=parse_fields(fields))
             return {
                 "success": True,
-                "tasks": [task.to_dict() for task in tasks],
+                "tasks": _task_dicts(tasks),
                 "count": len(tasks),
                 "message": f"Found {len(tasks)} tasks"
             }
@@ -173,11 +237,14 @@ async def filter_tasks(
     status: Optional[str] = Field(None, description="Filter by status: pending, in_progress, completed"),
     priority: Optional[str] = Field(None, description="Filter by priority: low, medium, high, urgent"),
     search: Optional[str] = Field(None, description="Search in title and description"),
-    due_before: Optional[str] = Field(None, description="Tasks due before this date (ISO format)"),
-    due_after: Optional[str] = Field(None, description="Tasks due after this date (ISO format)")
+    due: Optional[str] = Field(None, description="Due window in natural language, e.g. 'today', 'this week', 'next month'"),
+    due_before: Optional[str] = Field(None, description="Tasks due before this date (ISO format or natural language)"),
+    due_after: Optional[str] = Field(None, description="Tasks due after this date (ISO format or natural language)"),
+    include_archived: bool = Field(False, description="Also search old completed tasks that have been archived"),
+    fields: Optional[str] = Field(None, description="Comma-separated fields to return, e.g. 'title,status,priority'")
 ) -> Dict[str, Any]:
     """Filter tasks based on various criteria."""
-    async with AsyncSessionLocal() as db:
+    async with read_session() as db:
         task_service = TaskService(db)
         
         # Parse status
@@ -198,34 +265,157 @@ async def filter_tasks(
         
         # Parse dates
         due_before_date = None
+        due_after_date = None
+        if due:
+            window = resolve_range(due)
+            if window is None:
+                return {"error": f"Invalid due window: {due}"}
+            due_after_date, due_before_date = window
+
         if due_before:
-            try:
-                due_before_date = datetime.fromisoformat(due_before.replace('Z', '+00:00'))
-            except ValueError:
-                return {"error": f"Invalid due_before date format: {due_before}"}
+            due_before_date = resolve_date(due_before)
+            if due_before_date is None:
+                return {"error": f"Invalid due_before date: {due_before}"}
         
-        due_after_date = None
         if due_after:
-            try:
-                due_after_date = datetime.fromisoformat(due_after.replace('Z', '+00:00'))
-            except ValueError:
-                return {"error": f"Invalid due_after date format: {due_after}"}
+            due_after_date = resolve_date(due_after)
+            if due_after_date is None:
+                return {"error": f"Invalid due_after date: {due_after}"}
         
         filter_criteria = TaskFilter(
             status=task_status,
             priority=task_priority,
             search=search,
             due_date_before=due_before_date,
-            due_date_after=due_after_date
+            due_date_after=due_after_date,
+            include_archived=include_archived
         )
         
         try:
-            tasks = await task_service.filter_tasks(filter_criteria)
+            tasks = await task_service.filter_tasks(filter_criteria, fields=parse_fields(fields))
             return {
                 "success": True,
-                "tasks": [task.to_dict() for task in tasks],
+                "tasks": _task_dicts(tasks),
                 "count": len(tasks),
                 "message": f"Found {len(tasks)} tasks matching criteria"
             }
         except Exception as e:
-            return {"error": f"Failed to filter tasks: {str(e)}"}
\ No newline at end of file
+            return {"error": f"Failed to filter tasks: {str(e)}"}
+
+
+@tool
+async def search_tasks(
+    query: str = Field(..., description="What the tasks are about, e.g. 'quarterly report'"),
+    limit: Optional[int] = Field(10, description="Maximum number of tasks to return")
+) -> Dict[str, Any]:
+    """Find tasks whose title or description is about the given topic, best match first."""
+    async with read_session() as db:
+        task_service = TaskService(db)
+        try:
+            matches = task_search.search(query, limit or 10)
+            scores = dict(matches)
+            tasks = await task_service.get_tasks_by_ids([task_id for task_id, _ in matches])
+            return {
+                "success": True,
+                "tasks": [{**task.to_dict(), "score": round(scores[task.id], 3)} for task in tasks],
+                "count": len(tasks),
+                "message": f"Found {len(tasks)} tasks related to '{query}'"
+            }
+        except Exception as e:
+            return {"error": f"Failed to search tasks: {str(e)}"}
+
+
+@tool
+async def add_dependency(
+    task: str = Field(..., description="ID or title of the task that has to wait"),
+    blocked_by: str = Field(..., description="ID or title of the task that must be completed first")
+) -> Dict[str, Any]:
+    """Mark a task as blocked by another task."""
+    async with AsyncSessionLocal() as db:
+        task_service = TaskService(db)
+        try:
+            waiting = await _find_task(task_service, task)
+            if not waiting:
+                return {"error": f"Task not found: {task}"}
+            blocker = await _find_task(task_service, blocked_by)
+            if not blocker:
+                return {"error": f"Task not found: {blocked_by}"}
+            await task_service.add_dependency(waiting.id, blocker.id)
+            return {
+                "success": True,
+                "tasks": [waiting.to_dict(), blocker.to_dict()],
+                "message": f"Task '{waiting.title}' is now blocked by '{blocker.title}'"
+            }
+        except TaskGraphError as e:
+            return {"error": str(e)}
+        except Exception as e:
+            return {"error": f"Failed to add dependency: {str(e)}"}
+
+
+@tool
+async def get_task_tree(
+    identifier: str = Field(..., description="Task ID (number) or task title (string)")
+) -> Dict[str, Any]:
+    """Show a task together with all of its subtasks."""
+    async with read_session() as db:
+        task_service = TaskService(db)
+        try:
+            root = await _find_task(task_service, identifier)
+            if not root:
+                return {"error": f"Task not found: {identifier}"}
+            tree = await task_service.get_task_tree(root.id)
+            tasks, pending = [], [tree]
+            while pending:
+                node = pending.pop()
+                tasks.append({key: value for key, value in node.items() if key != "children"})
+                pending.extend(reversed(node["children"]))
+            return {
+                "success": True,
+                "tree": tree,
+                "tasks": tasks,
+                "message": f"Task '{root.title}' has {len(tasks) - 1} subtasks"
+            }
+        except Exception as e:
+            return {"error": f"Failed to get task tree: {str(e)}"}
+
+
+@tool
+async def ready_tasks(
+    limit: Optional[int] = Field(10, description="Maximum number of tasks to return")
+) -> Dict[str, Any]:
+    """List open tasks that are ready to work on: nothing blocks them and their subtasks are done."""
+    async with read_session() as db:
+        task_service = TaskService(db)
+        try:
+            tasks = await task_service.get_ready_tasks(limit or 10)
+            return {
+                "success": True,
+                "tasks": _task_dicts(tasks),
+                "count": len(tasks),
+                "message": f"Found {len(tasks)} tasks ready to work on"
+            }
+        except Exception as e:
+            return {"error": f"Failed to get ready tasks: {str(e)}"}
+
+
+@tool
+async def next_tasks(
+    limit: Optional[int] = Field(3, description="Maximum number of tasks to return"),
+    ready_only: Optional[bool] = Field(False, description="Skip tasks still waiting on an open blocker or subtask")
+) -> Dict[str, Any]:
+    """Recommend which open tasks to do next, most pressing first, ranked by priority, due date, overdue status and age."""
+    async with read_session() as db:
+        task_service = TaskService(db)
+        try:
+            ranked = await task_service.get_next_tasks(limit or 3, bool(ready_only))
+            return {
+                "success": True,
+                "tasks": [
+                    {**task.to_dict(), "score": score, "reasons": task_ranker.reasons(task)}
+                    for task, score in ranked
+                ],
+                "count": len(ranked),
+                "message": f"Ranked the top {len(ranked)} tasks to do next"
+            }
+        except Exception as e:
+            return {"error": f"Failed to rank tasks: {str(e)}"}
@@ -0,0 +1,88 @@
+"""Compare filter_tasks latency: SQL path vs the in-memory task snapshot.
+
+Run from the backend directory against DATABASE_URL:
+
+    python -m scripts.benchmark_snapshot            # use the existing rows
+    python -m scripts.benchmark_snapshot --seed 100000
+
+--seed inserts that many synthetic tasks first; only use it on a scratch database.
+"""
+import argparse
+import asyncio
+import random
+import statistics
+import time
+from datetime import datetime, timedelta
+
+from app.database.connection import AsyncSessionLocal, init_db
+from app.models.task import Task, TaskStatus, TaskPriority
+from app.schemas.task import TaskCreate, TaskFilter
+from app.services.task_service import TaskService
+from app.services.task_snapshot import TaskSnapshot
+
+WORDS = "report budget deck meeting email call plan review design invoice client launch groceries dentist".split()
+
+FILTERS = {
+    "all, newest 50": TaskFilter(limit=50),
+    "pending + high": TaskFilter(status=TaskStatus.PENDING, priority=TaskPriority.HIGH),
+    "due next 7 days by due date": TaskFilter(
+        due_date_after=datetime.now(), due_date_before=datetime.now() + timedelta(days=7),
+        sort_by="due_date", descending=False,
+    ),
+    "urgent first, top 20": TaskFilter(sort_by="priority", limit=20),
+    "search 'invoice', top 100": TaskFilter(search="invoice", limit=100),
+}
+
+
+async def seed(count: int) -> None:
+    now = datetime.now()
+    async with AsyncSessionLocal() as db:
+        service = TaskService(db)
+        for start in range(0, count, 1000):
+            await service.create_tasks_bulk([
+                TaskCreate(
+                    title=" ".join(random.sample(WORDS, 3)),
+                    status=random.choice(list(TaskStatus)),
+                    priority=random.choice(list(TaskPriority)),
+                    due_date=now + timedelta(hours=random.randint(-500, 500)) if random.random() < 0.7 else None,
+                )
+                for _ in range(min(1000, count - start))
+            ])
+
+
+def _ms(samples):
+    return f"{statistics.median(samples) * 1000:8.3f} ms"
+
+
+async def main(seed_count: int, repeat: int) -> None:
+    await init_db()
+    if seed_count:
+        await seed(seed_count)
+
+    snapshot = TaskSnapshot(enabled=True, path="")
+    started = time.perf_counter()
+    await snapshot.load()
+    print(f"Snapshot of {len(snapshot)} tasks loaded in {time.perf_counter() - started:.2f}s\n")
+    print(f"{'filter':32} {'sql':>11} {'snapshot':>11}  rows  same")
+
+    async with AsyncSessionLocal() as db:
+        service = TaskService(db)
+        for name, task_filter in FILTERS.items():
+            sql_times, snapshot_times = [], []
+            for _ in range(repeat):
+                started = time.perf_counter()
+                sql_rows = await service._filter_model(Task, task_filter)
+                sql_times.append(time.perf_counter() - started)
+                started = time.perf_counter()
+                snapshot_rows = snapshot.filter(task_filter)
+                snapshot_times.append(time.perf_counter() - started)
+            same = [task.id for task in sql_rows] == [task.id for task in snapshot_rows]
+            print(f"{name:32} {_ms(sql_times)} {_ms(snapshot_times)}  {len(sql_rows):4}  {same}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--seed", type=int, default=0, help="insert this many synthetic tasks first")
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+    asyncio.run(main(args.seed, args.repeat))